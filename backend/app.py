@@ -1,34 +1,56 @@
-from flask import Flask, jsonify, request, session
+from flask import Flask, Response, jsonify, request, session, g
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS
 from flask_login import LoginManager, login_required, current_user
 from flask_wtf.csrf import CSRFProtect, generate_csrf
 from functools import wraps
 import os
+import hmac
+import atexit
 import logging
+import time
+import uuid
 from datetime import timedelta
 
 from config import config
 from database.connection import db_connection
-from repositories.user_repository import UserRepository
-from repositories.conversation_repository import ConversationRepository
+from repositories.factory import create_repositories
+from repositories.message_buffer import MessageWriteBuffer
+from repositories.usage_repository import UsageRepository
 from services.user_service import UserService
+from services.password_hasher import PasswordHasher
 from services.conversation_service import ConversationService
+from services.usage_service import UsageService
 from controllers.user_controller import UserController
 from controllers.conversation_controller import ConversationController
+from controllers.usage_controller import UsageController
 from controllers.socket_controller import SocketController
+from controllers.socket_transport import FlaskSocketTransport
 from security import configure_security, handle_csrf_error, handle_security_error
+from json_provider import FastJSONProvider
+from socketio_queue import socketio_queue_options
+from http_caching import configure_compression
+from repetition import RepetitionDetector
+from cache_invalidation import create_invalidation_bus, USER
+from metrics import REGISTRY, DB_QUERIES_PER_REQUEST
+from database.monitoring import start_query_tracking, stop_query_tracking, current_query_stats
+from tracing import configure_tracing
+from logging_config import (
+    configure_logging, bind_log_context, clear_log_context, get_log_context,
+    parse_sample_rates, should_sample
+)
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),  # Log to stdout for Cloud Run
-        logging.FileHandler('app.log')  # Also log to file
-    ]
+configure_logging(
+    level=config.LOG_LEVEL,
+    log_format=config.LOG_FORMAT,
+    log_file=config.LOG_FILE or None,
+    queue_size=config.LOG_QUEUE_SIZE
 )
 logger = logging.getLogger(__name__)
+LOG_ROUTE_SAMPLE_RATES = parse_sample_rates(config.LOG_ROUTE_SAMPLE_RATES)
+
+configure_tracing(config.TRACE_EXPORTER, config.TRACE_SAMPLE_RATE, config.TRACE_FILE)
 
 try:
     config.validate()
@@ -39,6 +61,7 @@ except ValueError as e:
 os.environ['FLASK_ENV'] = 'development'  # Explicitly set for development
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 app.config["SECRET_KEY"] = config.FLASK_SECRET_KEY
 
 # Session configuration for cross-origin support
@@ -59,29 +82,96 @@ csrf = CSRFProtect(app)
 
 configure_security(app, csrf)
 
+if config.COMPRESSION_MIN_SIZE > 0:
+    configure_compression(app, min_size=config.COMPRESSION_MIN_SIZE, level=config.COMPRESSION_LEVEL)
+
 CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:5874,http://127.0.0.1:5874,http://localhost:5001').split(',')
 logger.info(f"CORS Origins configured: {CORS_ORIGINS}")
 
 CORS(app, 
      resources={r"/*": {"origins": CORS_ORIGINS}}, 
      supports_credentials=True,
-     allow_headers=["Content-Type", "Authorization", "X-CSRFToken", "Cookie"],
-     expose_headers=["Set-Cookie"],
+     allow_headers=["Content-Type", "Authorization", "X-CSRFToken", "Cookie", "If-None-Match", "If-Modified-Since", "X-Request-ID"],
+     expose_headers=["Set-Cookie", "ETag", "Last-Modified", "X-Request-ID"],
      vary_header=False)  # Disable Vary header for development
 
-socketio = SocketIO(app, cors_allowed_origins=CORS_ORIGINS)
+# In ASGI mode asgi.py runs its own Socket.IO server, so only that one subscribes to the queue
+socketio = SocketIO(
+    app,
+    cors_allowed_origins=CORS_ORIGINS,
+    **(socketio_queue_options(config.SOCKETIO_MESSAGE_QUEUE, config.SOCKETIO_CHANNEL) if config.SERVER_MODE == 'wsgi' else {})
+)
+if config.SOCKETIO_MESSAGE_QUEUE and config.SERVER_MODE == 'wsgi':
+    logger.info(f"Socket.IO message queue enabled on channel '{config.SOCKETIO_CHANNEL}'")
 
 db = db_connection.db
 
-user_repository = UserRepository(db)
-conversation_repository = ConversationRepository(db)
+message_buffer = None
+if config.MESSAGE_BUFFER_ENABLED:
+    message_buffer = MessageWriteBuffer(
+        db.messages,
+        max_size=config.MESSAGE_BUFFER_MAX_SIZE,
+        flush_interval=config.MESSAGE_BUFFER_FLUSH_INTERVAL,
+        max_pending=config.MESSAGE_BUFFER_MAX_PENDING,
+        max_attempts=config.MESSAGE_BUFFER_MAX_ATTEMPTS,
+        dead_letter=db.messages_dead_letter
+    )
+    # Flush buffered messages when the worker shuts down
+    atexit.register(message_buffer.close)
+    logger.info(f"Message write-behind buffer enabled (max_size={config.MESSAGE_BUFFER_MAX_SIZE}, flush_interval={config.MESSAGE_BUFFER_FLUSH_INTERVAL}s)")
+
+if config.LLM_MOCK_MODE:
+    logger.warning("LLM_MOCK_MODE is on: every provider is replaced by the mock client")
+
+# Per-worker caches must hear about changes made on other workers; without a bus to carry that, turn them off
+invalidation_bus = create_invalidation_bus(config.SOCKETIO_MESSAGE_QUEUE, config.CACHE_INVALIDATION_CHANNEL)
+caches_enabled = invalidation_bus is not None or (config.GUNICORN_WORKERS <= 1 and not config.SOCKETIO_MESSAGE_QUEUE)
+if invalidation_bus:
+    atexit.register(invalidation_bus.close)
+    logger.info(f"Cache invalidation enabled on channel '{config.CACHE_INVALIDATION_CHANNEL}'")
+elif not caches_enabled:
+    logger.warning("Several workers and no redis:// SOCKETIO_MESSAGE_QUEUE for cache invalidation: per-worker caches are disabled")
+
+user_repository, conversation_repository = create_repositories(
+    db_connection, message_buffer=message_buffer, invalidation_bus=invalidation_bus, cache_enabled=caches_enabled
+)
 
-user_service = UserService(user_repository)
-conversation_service = ConversationService(conversation_repository, user_service)
+user_service = UserService(
+    user_repository,
+    cache_size=config.USER_CACHE_SIZE if caches_enabled else 0,
+    cache_ttl=config.USER_CACHE_TTL,
+    api_key_cache_size=config.API_KEY_CACHE_SIZE if caches_enabled else 0,
+    api_key_cache_ttl=config.API_KEY_CACHE_TTL,
+    password_hasher=PasswordHasher(
+        rounds=config.BCRYPT_ROUNDS,
+        max_workers=config.PASSWORD_HASH_WORKERS,
+        max_pending=config.PASSWORD_HASH_MAX_PENDING,
+        queue_timeout=config.PASSWORD_HASH_QUEUE_TIMEOUT
+    ),
+    invalidation_hook=(lambda user_id: invalidation_bus.publish(USER, user_id)) if invalidation_bus else None
+)
+if invalidation_bus:
+    invalidation_bus.subscribe(USER, user_service.invalidate_cached_user, user_service.clear_cached_users)
+usage_service = UsageService(UsageRepository(db))
+conversation_service = ConversationService(
+    conversation_repository,
+    user_service,
+    usage_service,
+    speculative_generation=config.SPECULATIVE_GENERATION,
+    speculation_ttl=config.SPECULATION_TTL,
+    speculation_workers=config.SPECULATION_WORKERS,
+    repetition_detection=config.REPETITION_DETECTION,
+    repetition_detector=RepetitionDetector(
+        threshold=config.REPETITION_THRESHOLD,
+        window=config.REPETITION_WINDOW,
+        consecutive=config.REPETITION_CONSECUTIVE
+    )
+)
 
 user_controller = UserController(user_service)
 conversation_controller = ConversationController(conversation_service)
-socket_controller = SocketController(conversation_service, user_service)
+usage_controller = UsageController(usage_service)
+socket_controller = SocketController(conversation_service, user_service, transport=FlaskSocketTransport(socketio))
 
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -97,10 +187,9 @@ from models.user import User
 
 @login_manager.user_loader
 def load_user(user_id):
-    logger.info(f"Loading user with ID: {user_id}")
     try:
         user = user_service.get_user_by_id(user_id)
-        logger.info(f"Loaded user: {user.email if user else 'None'}")
+        logger.debug(f"Loaded user {user_id}: {user.email if user else 'None'}")
         return user
     except Exception as e:
         logger.error(f"Error loading user {user_id}: {e}")
@@ -116,48 +205,87 @@ def socket_auth_required(f):
     return wrapped
 
 @app.before_request
-def debug_session():
-    """Debug session information"""
-    logger.info(f"=== SESSION DEBUG for {request.method} {request.path} ===")
-    logger.info(f"Session ID: {session.get('_id', 'No session ID')}")
-    logger.info(f"Session permanent: {session.permanent}")
-    logger.info(f"Session contents: {dict(session)}")
-    logger.info(f"User ID from session: {session.get('_user_id', 'No user ID')}")
-    logger.info(f"Current user: {current_user}")
-    logger.info(f"Current user authenticated: {current_user.is_authenticated}")
-    logger.info(f"Current user ID: {getattr(current_user, 'id', 'No ID')}")
-    
-    # Check cookies
-    cookies = request.cookies
-    logger.info(f"Cookies received: {list(cookies.keys())}")
-    session_cookie = cookies.get('session')
-    if session_cookie:
-        logger.info(f"Session cookie present: {session_cookie[:20]}...")
-    else:
-        logger.info("No session cookie received")
-    
-    logger.info("=== END SESSION DEBUG ===")
-
-@app.before_request
-def log_request_info():
-    """Log all incoming requests for debugging"""
-    logger.info(f"Request: {request.method} {request.path}")
-    logger.info(f"Headers: {dict(request.headers)}")
-    logger.info(f"Origin: {request.headers.get('Origin', 'No Origin')}")
-    logger.info(f"User-Agent: {request.headers.get('User-Agent', 'No User-Agent')}")
-    
-    # Log CSRF token info
-    csrf_token = request.headers.get('X-CSRFToken') or request.form.get('csrf_token')
-    if csrf_token:
-        logger.info(f"CSRF Token present: {csrf_token[:10]}...")
-    else:
-        logger.warning("No CSRF token found in request")
+def bind_request_log_context():
+    """Tag every record logged while handling this request"""
+    g.request_started_at = time.perf_counter()
+    g.query_tracking_token = start_query_tracking()
+    route = request.url_rule.rule if request.url_rule else request.path
+    bind_log_context(
+        request_id=(request.headers.get('X-Request-ID') or uuid.uuid4().hex)[:64],
+        method=request.method,
+        route=route,
+        sampled=should_sample(route, config.LOG_SAMPLE_RATE, LOG_ROUTE_SAMPLE_RATES)
+    )
+
+@app.after_request
+def log_request_completed(response):
+    request_id = get_log_context().get('request_id')
+    if request_id:
+        response.headers['X-Request-ID'] = request_id
+    started_at = g.get('request_started_at')
+    duration_ms = round((time.perf_counter() - started_at) * 1000, 1) if started_at else None
+    query_stats = current_query_stats()
+    query_fields = query_stats.to_dict() if query_stats else {}
+    if query_stats:
+        DB_QUERIES_PER_REQUEST.observe(query_stats.count, route=get_log_context().get('route', '-'))
+    logger.info("Request completed", extra={"status": response.status_code, "duration_ms": duration_ms, **query_fields})
+    return response
+
+@app.teardown_request
+def clear_request_log_context(exc):
+    token = g.pop('query_tracking_token', None)
+    if token is not None:
+        stop_query_tracking(token)
+    clear_log_context()
+
+if config.DEBUG_REQUEST_LOGGING:
+    REDACTED_HEADERS = {'authorization', 'cookie', 'x-csrftoken'}
+
+    @app.before_request
+    def debug_session():
+        """Debug session information"""
+        session_cookie = request.cookies.get('session')
+        logger.info("Session debug", extra={
+            "session_id": session.get('_id', 'No session ID'),
+            "session_permanent": session.permanent,
+            "session_keys": list(session.keys()),
+            "session_user_id": session.get('_user_id', 'No user ID'),
+            "current_user_authenticated": current_user.is_authenticated,
+            "current_user_id": getattr(current_user, 'id', 'No ID'),
+            "cookies": list(request.cookies.keys()),
+            "session_cookie": f"{session_cookie[:20]}..." if session_cookie else None
+        })
+
+    @app.before_request
+    def log_request_info():
+        """Log all incoming requests for debugging"""
+        headers = {
+            name: ('<redacted>' if name.lower() in REDACTED_HEADERS else value)
+            for name, value in request.headers.items()
+        }
+        csrf_token = request.headers.get('X-CSRFToken') or request.form.get('csrf_token')
+        logger.info("Request debug", extra={
+            "headers": headers,
+            "origin": request.headers.get('Origin', 'No Origin'),
+            "user_agent": request.headers.get('User-Agent', 'No User-Agent'),
+            "csrf_token": f"{csrf_token[:10]}..." if csrf_token else None
+        })
+        if not csrf_token:
+            logger.warning("No CSRF token found in request")
 
 @app.route("/")
 def index():
     logger.info("Index route accessed")
     return jsonify({"message": "LLM Chat App Backend Running"})
 
+if config.METRICS_ENABLED:
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied, f"Bearer {config.METRICS_TOKEN}"):
+            return jsonify({"error": "Unauthorized"}), 401
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route("/api/csrf-token", methods=["GET"])
 def get_csrf_token():
     logger.info("CSRF token requested")
@@ -178,23 +306,66 @@ def get_csrf_token():
     
     return jsonify({"csrf_token": token})
 
+def socket_log_context(event):
+    """Tag records logged while handling a socket event with the event name and sid, and count its queries"""
+    def decorator(f):
+        @wraps(f)
+        def wrapped(*args, **kwargs):
+            bind_log_context(request_id=uuid.uuid4().hex, socket_event=event, sid=request.sid)
+            started_at = time.perf_counter()
+            token = start_query_tracking()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                query_stats = stop_query_tracking(token)
+                DB_QUERIES_PER_REQUEST.observe(query_stats.count, route=f"socket:{event}")
+                logger.info("Socket event completed", extra={
+                    "duration_ms": round((time.perf_counter() - started_at) * 1000, 1),
+                    **query_stats.to_dict()
+                })
+                clear_log_context()
+        return wrapped
+    return decorator
+
 # Socket event handlers
 @socketio.on('connect')
-def handle_connect():
+@socket_log_context('connect')
+def handle_connect(auth=None):
     logger.info("Socket connection established")
     socket_controller.handle_connect()
 
 @socketio.on('disconnect')
+@socket_log_context('disconnect')
 def handle_disconnect():
     logger.info("Socket disconnected")
     socket_controller.handle_disconnect()
 
+@socketio.on('join_conversation')
+@socket_log_context('join_conversation')
+def handle_join_conversation(data):
+    logger.info(f"Join conversation event: {data}")
+    socket_controller.handle_join_conversation(data)
+
+@socketio.on('sync_conversation')
+@socket_log_context('sync_conversation')
+def handle_sync_conversation(data):
+    logger.info(f"Sync conversation event: {data}")
+    socket_controller.handle_sync_conversation(data)
+
+@socketio.on('leave_conversation')
+@socket_log_context('leave_conversation')
+def handle_leave_conversation(data):
+    logger.info(f"Leave conversation event: {data}")
+    socket_controller.handle_leave_conversation(data)
+
 @socketio.on('trigger_next_llm')
+@socket_log_context('trigger_next_llm')
 def handle_trigger_next_llm(data):
     logger.info(f"Trigger next LLM event: {data}")
     socket_controller.handle_trigger_next_llm(data)
 
 @socketio.on('set_system_prompt')
+@socket_log_context('set_system_prompt')
 def handle_set_system_prompt(data):
     logger.info(f"Set system prompt event: {data}")
     socket_controller.handle_set_system_prompt(data)
@@ -210,8 +381,6 @@ def register():
 @csrf.exempt
 def login():
     logger.info(f"Login endpoint accessed with method: {request.method}")
-    logger.info(f"Request headers: {dict(request.headers)}")
-    
     return user_controller.login()
 
 @app.route("/api/auth/logout", methods=["POST"])
@@ -249,12 +418,25 @@ def get_conversation_details(conversation_id: str):
     logger.info(f"Get conversation details endpoint accessed for ID: {conversation_id}")
     return conversation_controller.get_conversation_details(conversation_id)
 
+@app.route("/api/conversations/<conversation_id>/fork", methods=["POST"])
+@login_required
+def fork_conversation(conversation_id: str):
+    logger.info(f"Fork conversation endpoint accessed for ID: {conversation_id}")
+    return conversation_controller.fork_conversation(conversation_id)
+
 @app.route("/api/conversations/<conversation_id>", methods=["DELETE"])
 @login_required
 def delete_conversation(conversation_id: str):
     logger.info(f"Delete conversation endpoint accessed for ID: {conversation_id}")
     return conversation_controller.delete_conversation(conversation_id)
 
+# Usage routes
+@app.route("/api/usage", methods=["GET"])
+@login_required
+def get_usage():
+    logger.info("Usage endpoint accessed")
+    return usage_controller.get_usage()
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 8080))
     debug = os.getenv('FLASK_ENV') == 'development'
@@ -262,4 +444,10 @@ if __name__ == '__main__':
     logger.info(f"Starting Flask app on port {port}, debug={debug}")
     logger.info(f"Environment: {os.getenv('FLASK_ENV', 'development')}")
     
-    socketio.run(app, debug=debug, host='0.0.0.0', port=port, allow_unsafe_werkzeug=True)
\ No newline at end of file
+    if config.SERVER_MODE == 'asgi':
+        import uvicorn
+        from asgi import build_application
+        # Pass this module's objects; "asgi:create_app" would import app.py again as a second module
+        uvicorn.run(build_application(app, conversation_service, user_service, CORS_ORIGINS), host='0.0.0.0', port=port)
+    else:
+        socketio.run(app, debug=debug, host='0.0.0.0', port=port, allow_unsafe_werkzeug=True)
\ No newline at end of file
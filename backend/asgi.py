@@ -0,0 +1,247 @@
+"""
+ASGI entry point.
+
+Serves the same HTTP routes and Socket.IO events as app.py, but on an asyncio
+server (uvicorn) with python-socketio's AsyncServer instead of Flask-SocketIO on
+eventlet. The Flask app handles HTTP through WsgiToAsgi and socket events are
+dispatched to the existing SocketController, so both modes share controllers
+and services. Controllers and services are synchronous, so each socket event
+runs in a worker thread and the event loop stays free for socket I/O. With
+DB_DRIVER=async the read-only events (token connects, join_conversation,
+sync_conversation) instead run on the event loop through AsyncSocketController
+and the motor repositories.
+
+Sockets authenticate like in WSGI mode: with a JWT, or else with the Flask
+session cookie sent on the handshake.
+
+``create_app`` imports app.py to build the services; ``build_application``
+takes them as arguments, so ``python app.py`` can serve itself without
+importing app.py a second time.
+
+    SERVER_MODE=asgi uvicorn --factory asgi:create_app --host 0.0.0.0 --port 8080
+"""
+import asyncio
+import contextvars
+import inspect
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Optional, Tuple
+from urllib.parse import parse_qs
+import socketio
+from asgiref.wsgi import WsgiToAsgi
+from flask import Flask
+from flask_login import AnonymousUserMixin, current_user
+
+from config import config
+from controllers.socket_controller import SocketController
+from controllers.async_socket_controller import AsyncSocketController
+from socketio_queue import async_client_manager
+from logging_config import bind_log_context
+from database.monitoring import start_query_tracking, stop_query_tracking
+from metrics import DB_QUERIES_PER_REQUEST
+
+logger = logging.getLogger(__name__)
+
+# Set for each dispatched event and copied into the worker thread by asyncio.to_thread
+_current_sid: contextvars.ContextVar[str] = contextvars.ContextVar('socket_sid')
+_current_auth_token: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('socket_auth_token', default=None)
+
+
+class AsgiSocketTransport:
+    """SocketController transport for python-socketio's AsyncServer.
+
+    Controller methods run in worker threads, so every server call is scheduled
+    on the event loop and waited for, which keeps emits in order.
+    """
+
+    def __init__(self, sio: socketio.AsyncServer):
+        self.sio = sio
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._users = {}
+
+    @property
+    def sid(self) -> str:
+        return _current_sid.get()
+
+    @property
+    def current_user(self):
+        return self._users.get(self.sid) or AnonymousUserMixin()
+
+    def auth_token(self) -> Optional[str]:
+        return _current_auth_token.get()
+
+    def login(self, user) -> None:
+        self._users[self.sid] = user
+
+    def forget(self, sid: str) -> None:
+        self._users.pop(sid, None)
+
+    def emit(self, event: str, data: Any, to: Optional[str] = None) -> None:
+        self._run(self.sio.emit, event, data, to=to or self.sid)
+
+    def emit_to_client(self, event: str, data: Any, to: str, callback: Optional[Callable] = None) -> None:
+        self._run(self.sio.emit, event, data, to=to, callback=callback)
+
+    def join_room(self, room: str) -> None:
+        self._run(self.sio.enter_room, self.sid, room)
+
+    def leave_room(self, room: str) -> None:
+        self._run(self.sio.leave_room, self.sid, room)
+
+    def room_members(self, room: str) -> Iterable[str]:
+        participants = lambda: [sid for sid, _ in self.sio.manager.get_participants('/', room)]
+        return self._run(participants)
+
+    def _run(self, fn: Callable, *args, **kwargs):
+        async def call():
+            result = fn(*args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        return asyncio.run_coroutine_threadsafe(call(), self.loop).result()
+
+
+async def _dispatch(sid: str, handler: Callable, *args, auth_token: Optional[str] = None):
+    _current_sid.set(sid)
+    _current_auth_token.set(auth_token)
+    bind_log_context(request_id=uuid.uuid4().hex, socket_event=handler.__name__, sid=sid)
+    await asyncio.to_thread(_run_tracked, handler.__name__, handler, *args)
+
+
+async def _dispatch_async(sid: str, handler: Callable, *args):
+    """Run an AsyncSocketController handler on the event loop and return its result"""
+    _current_sid.set(sid)
+    bind_log_context(request_id=uuid.uuid4().hex, socket_event=handler.__name__, sid=sid)
+    # Not query-tracked: motor runs commands in its own threads, outside this task's context
+    return await handler(*args)
+
+
+def _run_tracked(event: str, handler: Callable, *args):
+    """Run a controller handler and log how many queries it issued"""
+    token = start_query_tracking()
+    try:
+        handler(*args)
+    finally:
+        query_stats = stop_query_tracking(token)
+        DB_QUERIES_PER_REQUEST.observe(query_stats.count, route=f"socket:{event}")
+        logger.info("Socket event completed", extra=query_stats.to_dict())
+
+
+def _connect_token(environ: dict, auth: Optional[dict]) -> Optional[str]:
+    if auth and auth.get('token'):
+        return auth['token']
+    query = parse_qs(environ.get('QUERY_STRING', ''))
+    if query.get('token'):
+        return query['token'][0]
+    return environ.get('HTTP_AUTHORIZATION')
+
+
+def _session_user(flask_app: Flask, environ: dict):
+    """The user logged in through the Flask session cookie of the handshake, if any"""
+    headers = {key[5:].replace('_', '-').title(): value for key, value in environ.items() if key.startswith('HTTP_')}
+    if 'Cookie' not in headers:
+        return None
+    # Flask-Login's strong session protection hashes the client address, which the ASGI environ does not carry
+    client = (environ.get('asgi.scope') or {}).get('client')
+    remote_addr = client[0] if client else environ.get('REMOTE_ADDR')
+    with flask_app.test_request_context(environ.get('PATH_INFO', '/'), headers=headers,
+                                        environ_base={'REMOTE_ADDR': remote_addr}):
+        user = current_user._get_current_object()
+        return user if user.is_authenticated else None
+
+
+def build_application(flask_app: Flask, conversation_service, user_service, cors_origins,
+                      async_repositories: Optional[Tuple] = None) -> socketio.ASGIApp:
+    """ASGI app serving ``flask_app`` over HTTP and the socket events on an AsyncServer.
+
+    ``async_repositories`` is the motor (user, conversation) repository pair for
+    the read-only events; by default it is built when DB_DRIVER=async.
+    """
+    sio = socketio.AsyncServer(
+        async_mode='asgi',
+        cors_allowed_origins=cors_origins,
+        client_manager=async_client_manager(config.SOCKETIO_MESSAGE_QUEUE, config.SOCKETIO_CHANNEL)
+    )
+    transport = AsgiSocketTransport(sio)
+    socket_controller = SocketController(conversation_service, user_service, transport=transport)
+    if async_repositories is None and config.DB_DRIVER == 'async':
+        from database.connection import db_connection
+        from repositories.factory import create_async_repositories
+        async_repositories = create_async_repositories(db_connection, conversation_service.conversation_repository)
+    async_controller = None
+    if async_repositories:
+        async_user_repository, async_conversation_repository = async_repositories
+        async_controller = AsyncSocketController(
+            async_conversation_repository, async_user_repository, conversation_service, sio, transport
+        )
+
+    def handle_connect(environ: dict):
+        user = _session_user(flask_app, environ)
+        if user:
+            transport.login(user)
+        socket_controller.handle_connect()
+
+    @sio.event
+    async def connect(sid, environ, auth=None):
+        logger.info("Socket connection established")
+        auth_token = _connect_token(environ, auth)
+        if async_controller and await _dispatch_async(sid, async_controller.handle_connect, auth_token):
+            return
+        # Session cookies need Flask-Login's user loader, which is synchronous
+        await _dispatch(sid, handle_connect, environ, auth_token=auth_token)
+
+    @sio.event
+    async def disconnect(sid, *args):
+        logger.info("Socket disconnected")
+        await _dispatch(sid, socket_controller.handle_disconnect)
+        transport.forget(sid)
+
+    @sio.event
+    async def join_conversation(sid, data):
+        if async_controller:
+            await _dispatch_async(sid, async_controller.handle_join_conversation, data)
+        else:
+            await _dispatch(sid, socket_controller.handle_join_conversation, data)
+
+    @sio.event
+    async def sync_conversation(sid, data):
+        if async_controller:
+            await _dispatch_async(sid, async_controller.handle_sync_conversation, data)
+        else:
+            await _dispatch(sid, socket_controller.handle_sync_conversation, data)
+
+    @sio.event
+    async def leave_conversation(sid, data):
+        await _dispatch(sid, socket_controller.handle_leave_conversation, data)
+
+    @sio.event
+    async def trigger_next_llm(sid, data):
+        logger.info(f"Trigger next LLM event: {data}")
+        await _dispatch(sid, socket_controller.handle_trigger_next_llm, data)
+
+    @sio.event
+    async def set_system_prompt(sid, data):
+        logger.info(f"Set system prompt event: {data}")
+        await _dispatch(sid, socket_controller.handle_set_system_prompt, data)
+
+    async def on_startup():
+        loop = asyncio.get_running_loop()
+        # LLM calls hold a worker thread for the whole generation, so size the pool for that
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=config.ASGI_THREADPOOL_SIZE))
+        transport.loop = loop
+        logger.info(f"ASGI server started with {config.ASGI_THREADPOOL_SIZE} worker threads")
+
+    return socketio.ASGIApp(sio, other_asgi_app=WsgiToAsgi(flask_app), on_startup=on_startup)
+
+
+def create_app() -> socketio.ASGIApp:
+    """Factory for ``uvicorn --factory asgi:create_app``"""
+    from app import app, CORS_ORIGINS, conversation_service, user_service
+    return build_application(app, conversation_service, user_service, CORS_ORIGINS)
+
+
+if __name__ == '__main__':
+    import os
+    import uvicorn
+    uvicorn.run(create_app(), host='0.0.0.0', port=int(os.getenv('PORT', 8080)))
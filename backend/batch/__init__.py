@@ -0,0 +1 @@
+# Offline batch runs of self-chat conversations: ``python -m batch.run --help`` (from the backend directory)
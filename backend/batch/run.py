@@ -0,0 +1,138 @@
+"""
+Run a batch spec of self-chat conversations (see batch/spec.py for the format).
+
+Usage (from the backend directory, with the same environment as the app):
+    python -m batch.run spec.json --output results.jsonl
+    python -m batch.run spec.json --output results.jsonl --concurrency 16 --limit claude=2
+    python -m batch.run spec.json --output results.jsonl --mode provider-batch
+
+--mode provider-batch submits each round of turns through the providers'
+batch APIs (OpenAI, Anthropic; other providers and LLM_MOCK_MODE use an
+in-process stand-in, as does --local-batch for trial runs). Batch jobs take
+minutes to hours but are billed at a discount and are not bound by
+interactive rate limits.
+
+Re-running with the same --output resumes: completed and halted jobs are skipped and
+interrupted ones continue in their conversation. --fresh ignores the file's
+previous contents (new lines are still appended).
+"""
+import argparse
+import json
+import logging
+import sys
+from typing import Dict, List
+
+from config import config
+from logging_config import configure_logging
+from database.connection import db_connection
+from repositories.factory import create_repositories
+from repositories.usage_repository import UsageRepository
+from services.user_service import UserService
+from services.usage_service import UsageService
+from services.conversation_service import ConversationService, ALL_LLMS
+from repetition import RepetitionDetector
+from cache_invalidation import create_invalidation_bus, USER
+from batch.spec import load_spec
+from batch.runner import BatchRunner, ProviderBatchRunner, limit_providers
+
+logger = logging.getLogger(__name__)
+
+def parse_limits(values: List[str]) -> Dict[str, int]:
+    limits = {}
+    for value in values:
+        name, _, limit = value.partition("=")
+        if not name or not limit.isdigit() or int(limit) < 1:
+            raise argparse.ArgumentTypeError(f"Invalid --limit '{value}', expected NAME=N")
+        limits[name] = int(limit)
+    return limits
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a grid of self-chat conversations and stream results to JSONL")
+    parser.add_argument("spec", help="batch spec file (JSON)")
+    parser.add_argument("--output", required=True, help="JSONL results file, also used as the resume checkpoint")
+    parser.add_argument("--concurrency", type=int, help="conversations running at once (overrides the spec)")
+    parser.add_argument("--limit", action="append", default=[], metavar="NAME=N",
+                        help="max calls in flight to one provider (overrides the spec; repeatable)")
+    parser.add_argument("--mode", choices=["direct", "provider-batch"], default="direct",
+                        help="call providers turn by turn (default) or through their batch APIs")
+    parser.add_argument("--poll-interval", type=float, default=30, help="max seconds between batch status checks")
+    parser.add_argument("--max-wait", type=float, default=24 * 3600, help="seconds to wait for one round of batch jobs")
+    parser.add_argument("--local-batch", action="store_true", help="use the in-process batch stand-in for every provider")
+    parser.add_argument("--fresh", action="store_true", help="do not resume from the output file")
+    parser.add_argument("--dry-run", action="store_true", help="print the expanded jobs and exit")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    configure_logging(level=config.LOG_LEVEL, log_format=config.LOG_FORMAT, log_file=None,
+                      queue_size=config.LOG_QUEUE_SIZE)
+    try:
+        spec = load_spec(args.spec, supported_llms=list(ALL_LLMS))
+        provider_limits = {**spec.provider_limits, **parse_limits(args.limit)}
+    except (OSError, ValueError, argparse.ArgumentTypeError) as e:
+        print(f"Invalid batch spec: {e}", file=sys.stderr)
+        return 2
+
+    if args.dry_run:
+        for job in spec.jobs:
+            print(job.job_id)
+        print(f"{len(spec.jobs)} jobs", file=sys.stderr)
+        return 0
+
+    # The batch runs beside the web workers, so its caches need their invalidations (or must stay off)
+    invalidation_bus = create_invalidation_bus(config.SOCKETIO_MESSAGE_QUEUE, config.CACHE_INVALIDATION_CHANNEL)
+    user_repository, conversation_repository = create_repositories(
+        db_connection, invalidation_bus=invalidation_bus, cache_enabled=invalidation_bus is not None
+    )
+    user = user_repository.find_by_email(spec.user_email)
+    if not user:
+        print(f"No user with email {spec.user_email}", file=sys.stderr)
+        return 2
+
+    user_service = UserService(
+        user_repository,
+        api_key_cache_size=config.API_KEY_CACHE_SIZE if invalidation_bus else 0,
+        api_key_cache_ttl=config.API_KEY_CACHE_TTL
+    )
+    if invalidation_bus:
+        invalidation_bus.subscribe(USER, user_service.invalidate_cached_user, user_service.clear_cached_users)
+
+    conversation_service = ConversationService(
+        conversation_repository,
+        user_service,
+        UsageService(UsageRepository(db_connection.db)),
+        # Batch turns are not streamed, so only the call clients need limits
+        llms=limit_providers(ALL_LLMS, provider_limits),
+        # Loops are what long unattended runs waste the most tokens on
+        repetition_detection=config.REPETITION_DETECTION,
+        repetition_detector=RepetitionDetector(
+            threshold=config.REPETITION_THRESHOLD,
+            window=config.REPETITION_WINDOW,
+            consecutive=config.REPETITION_CONSECUTIVE
+        )
+    )
+    if args.mode == "provider-batch":
+        runner = ProviderBatchRunner(
+            conversation_service,
+            user.id,
+            args.output,
+            concurrency=args.concurrency or spec.concurrency,
+            batch_name=spec.name,
+            poll_interval=args.poll_interval,
+            max_wait=args.max_wait,
+            local=args.local_batch or config.LLM_MOCK_MODE
+        )
+    else:
+        runner = BatchRunner(
+            conversation_service,
+            user.id,
+            args.output,
+            concurrency=args.concurrency or spec.concurrency,
+            batch_name=spec.name
+        )
+    stats = runner.run(spec.jobs, resume=not args.fresh)
+    print(json.dumps({"batch": spec.name, "jobs": len(spec.jobs), **stats}))
+    return 1 if stats["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
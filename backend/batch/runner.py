@@ -0,0 +1,337 @@
+"""
+Runs batch jobs through ConversationService.
+
+Each job creates a conversation and triggers its LLM turns one after another.
+BatchRunner runs jobs concurrently on a bounded thread pool with provider
+calls capped per provider; ProviderBatchRunner instead submits the same turn
+of every job as provider batch jobs (see llm_clients.batch_api). Every event is appended to a JSONL file as it happens, and that
+file is also the checkpoint: on resume, finished jobs are skipped and started
+ones continue in their existing conversation from the number of messages it
+already has.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from batch.spec import BatchJob
+from llm_clients.batch_api import BatchBackend, BatchRequest, LocalBatchBackend, COMPLETED, FAILED, get_batch_backend
+from services.conversation_service import ConversationService, PreparedTurn
+
+logger = logging.getLogger(__name__)
+
+
+def limit_providers(llms: Dict[str, Callable], limits: Dict[str, int]) -> Dict[str, Callable]:
+    """Wrap provider clients so at most ``limits[name]`` calls to each run at once"""
+    limited = dict(llms)
+    for name, limit in limits.items():
+        if name in llms:
+            limited[name] = _limited_call(llms[name], threading.BoundedSemaphore(limit))
+    return limited
+
+def _limited_call(fn: Callable, semaphore: threading.BoundedSemaphore) -> Callable:
+    def call(*args, **kwargs):
+        with semaphore:
+            return fn(*args, **kwargs)
+    return call
+
+
+class JsonlWriter:
+    """Appends one JSON object per line and flushes it, so a crash loses at most the line being written"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, record: Dict) -> None:
+        record = {"at": datetime.now(timezone.utc).isoformat(), **record}
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def load_checkpoint(path: str) -> Tuple[Set[str], Dict[str, str]]:
+    """Finished job ids and the conversation id of every started job, from a previous run's output.
+
+    Halted jobs count as finished: their conversation refuses further turns until its prompt changes.
+    """
+    finished: Set[str] = set()
+    conversations: Dict[str, str] = {}
+    if not os.path.exists(path):
+        return finished, conversations
+    with open(path, encoding="utf-8") as output:
+        for line in output:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash
+                continue
+            if record.get("type") == "job_started":
+                conversations[record["job_id"]] = record["conversation_id"]
+            elif record.get("type") == "job_finished" and record.get("status") in ("completed", "halted"):
+                finished.add(record["job_id"])
+    return finished, conversations
+
+
+class BatchRunner:
+    def __init__(self, conversation_service: ConversationService, user_id: str, output_path: str,
+                 concurrency: int = 4, batch_name: str = "batch"):
+        self.conversation_service = conversation_service
+        self.user_id = user_id
+        self.output_path = output_path
+        self.concurrency = concurrency
+        self.batch_name = batch_name
+        self._stats_lock = threading.Lock()
+        self._stats = {"completed": 0, "halted": 0, "failed": 0, "skipped": 0, "turns": 0}
+
+    def run(self, jobs: Iterable[BatchJob], resume: bool = True) -> Dict[str, int]:
+        """Run every job not already finished in the output file; returns counts by outcome"""
+        finished, conversations = load_checkpoint(self.output_path) if resume else (set(), {})
+        pending = []
+        for job in jobs:
+            if job.job_id in finished:
+                self._count("skipped")
+            else:
+                pending.append(job)
+        logger.info(f"Batch '{self.batch_name}': {len(pending)} jobs to run, {self._stats['skipped']} already finished")
+
+        writer = JsonlWriter(self.output_path)
+        try:
+            self._execute(pending, conversations, writer)
+        finally:
+            writer.close()
+        return dict(self._stats)
+
+    def _execute(self, jobs: List[BatchJob], conversations: Dict[str, str], writer: JsonlWriter) -> None:
+        """Run each job's turns one after another, jobs in parallel on the pool"""
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as pool:
+            for job in jobs:
+                pool.submit(self._run_job, job, conversations.get(job.job_id), writer)
+
+    def _count(self, outcome: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[outcome] += amount
+
+    def _open_job(self, job: BatchJob, conversation_id: Optional[str], writer: JsonlWriter) -> Tuple[Optional[str], int]:
+        """Resume the job's conversation or create it; returns (conversation id or None on failure, turns done)"""
+        if conversation_id:
+            version = self.conversation_service.get_conversation_version(conversation_id)
+            if version is not None:
+                return conversation_id, version["message_count"]
+            # Deleted since the checkpoint was written; start over
+        
+        success, message, conversation_id = self.conversation_service.create_conversation(self.user_id, {
+            "name": f"{self.batch_name}: {job.job_id}",
+            "system_prompt": job.system_prompt,
+            "llm_participants": list(job.participants),
+        })
+        if not success:
+            self._finish(writer, job, None, "failed", 0, message)
+            return None, 0
+        writer.write({"type": "job_started", "job_id": job.job_id, "conversation_id": conversation_id,
+                      "prompt_name": job.prompt_name, "participants": list(job.participants),
+                      "turns": job.turns, "repeat": job.repeat})
+        return conversation_id, 0
+
+    def _halted_reason(self, conversation_id: str) -> Optional[str]:
+        """Set once loop detection has stopped the conversation"""
+        conversation = self.conversation_service.get_conversation(conversation_id)
+        return conversation.halted_reason if conversation else None
+
+    def _write_turn(self, writer: JsonlWriter, job: BatchJob, conversation_id: str, turn: int,
+                    llm_message, latency_ms: float) -> None:
+        self._count("turns")
+        writer.write({
+            "type": "turn",
+            "job_id": job.job_id,
+            "conversation_id": conversation_id,
+            "turn": turn,
+            "latency_ms": round(latency_ms, 1),
+            **llm_message.model_dump(mode="json", include={
+                "id", "llm_name", "content", "input_tokens", "output_tokens", "cached_tokens", "cost_usd"
+            }),
+        })
+
+    def _run_job(self, job: BatchJob, conversation_id: Optional[str], writer: JsonlWriter) -> None:
+        try:
+            conversation_id, turns_done = self._open_job(job, conversation_id, writer)
+            if not conversation_id:
+                return
+            
+            while turns_done < job.turns:
+                started = time.perf_counter()
+                success, message, llm_message = self.conversation_service.trigger_next_llm(conversation_id, self.user_id)
+                if not success:
+                    self._finish(writer, job, conversation_id, "failed", turns_done, message)
+                    return
+                turns_done += 1
+                self._write_turn(writer, job, conversation_id, turns_done, llm_message,
+                                 (time.perf_counter() - started) * 1000)
+                halted_reason = self._halted_reason(conversation_id)
+                if halted_reason:
+                    self._finish(writer, job, conversation_id, "halted", turns_done, halted_reason)
+                    return
+            self._finish(writer, job, conversation_id, "completed", turns_done)
+        except Exception as e:
+            logger.exception(f"Batch job {job.job_id} failed")
+            self._finish(writer, job, conversation_id, "failed", None, str(e))
+
+    def _finish(self, writer: JsonlWriter, job: BatchJob, conversation_id: Optional[str], status: str,
+                turns_done: Optional[int], error: Optional[str] = None) -> None:
+        self._count(status)
+        writer.write({"type": "job_finished", "job_id": job.job_id, "conversation_id": conversation_id,
+                      "status": status, "turns": turns_done, "error": error})
+        logger.info(f"Batch job {job.job_id} {status}" + (f": {error}" if error else ""))
+
+
+class _ActiveJob(NamedTuple):
+    job: BatchJob
+    conversation_id: str
+    turns_done: int
+
+class ProviderBatchRunner(BatchRunner):
+    """Runs jobs in rounds through provider batch APIs.
+
+    Each round prepares the next turn of every unfinished job, submits them as
+    one batch job per provider (split at the backend's size limit), waits for
+    all of them and saves the replies in job order. Turns within a conversation
+    stay sequential, so a conversation of N turns takes N rounds.
+    """
+
+    def __init__(self, conversation_service: ConversationService, user_id: str, output_path: str,
+                 concurrency: int = 4, batch_name: str = "batch", poll_interval: float = 30.0,
+                 max_wait: float = 24 * 3600, local: bool = False):
+        super().__init__(conversation_service, user_id, output_path, concurrency=concurrency, batch_name=batch_name)
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        # Use the in-process stand-in for every provider (trial runs, mock mode)
+        self.local = local
+        self._backends: Dict[str, Optional[BatchBackend]] = {}
+
+    def _backend(self, provider: str) -> Optional[BatchBackend]:
+        if provider not in self._backends:
+            self._backends[provider] = get_batch_backend(
+                provider, self.conversation_service.llms.get(provider), local=self.local
+            )
+        return self._backends[provider]
+
+    def _execute(self, jobs: List[BatchJob], conversations: Dict[str, str], writer: JsonlWriter) -> None:
+        # Opening conversations is ordinary database work, so spread it over the pool
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as pool:
+            opened = list(pool.map(lambda job: (job, *self._open_job(job, conversations.get(job.job_id), writer)), jobs))
+
+        active = []
+        for job, conversation_id, turns_done in opened:
+            if not conversation_id:
+                continue
+            if turns_done >= job.turns:
+                self._finish(writer, job, conversation_id, "completed", turns_done)
+            else:
+                active.append(_ActiveJob(job, conversation_id, turns_done))
+
+        round_number = 0
+        while active:
+            round_number += 1
+            logger.info(f"Batch '{self.batch_name}' round {round_number}: {len(active)} turns")
+            active = self._run_round(active, writer, round_number)
+
+    def _run_round(self, active: List[_ActiveJob], writer: JsonlWriter, round_number: int) -> List[_ActiveJob]:
+        """Submit one turn for every active job; returns the jobs that still have turns left"""
+        groups: Dict[Tuple[str, str], List[Tuple[_ActiveJob, PreparedTurn]]] = {}
+        for state in active:
+            success, message, turn = self.conversation_service.prepare_next_turn(state.conversation_id, self.user_id)
+            if not success:
+                self._finish(writer, state.job, state.conversation_id, "failed", state.turns_done, message)
+                continue
+            groups.setdefault((turn.llm_name, turn.api_key), []).append((state, turn))
+
+        submitted = []
+        for (provider, api_key), entries in groups.items():
+            backend = self._backend(provider)
+            if backend is None:
+                self._fail_all(writer, entries, f"No batch backend or client for {provider}")
+                continue
+            for start in range(0, len(entries), backend.max_batch_size):
+                chunk = entries[start:start + backend.max_batch_size]
+                requests = [BatchRequest(turn.message_id, turn.prompt, turn.system_prompt, turn.chat_history)
+                            for _, turn in chunk]
+                try:
+                    batch_id = backend.submit(api_key, requests)
+                except Exception as e:
+                    self._fail_all(writer, chunk, f"Batch submission to {provider} failed: {e}")
+                    continue
+                writer.write({"type": "batch_submitted", "round": round_number, "provider": provider,
+                              "batch_id": batch_id, "requests": len(chunk)})
+                submitted.append((backend, api_key, batch_id, chunk, time.perf_counter()))
+
+        remaining = []
+        for backend, api_key, batch_id, chunk, started, results in self._wait_all(submitted, writer):
+            latency_ms = (time.perf_counter() - started) * 1000
+            batch_priced = not isinstance(backend, LocalBatchBackend)
+            for state, turn in chunk:
+                result = results.get(turn.message_id)
+                if result is None or result.error:
+                    error = result.error if result else f"No result for this turn in batch {batch_id}"
+                    self._finish(writer, state.job, state.conversation_id, "failed", state.turns_done, error)
+                    continue
+                success, message, llm_message = self.conversation_service.complete_turn(
+                    turn, result.text, result.usage, batch=batch_priced
+                )
+                if not success:
+                    self._finish(writer, state.job, state.conversation_id, "failed", state.turns_done, message)
+                    continue
+                state = state._replace(turns_done=state.turns_done + 1)
+                self._write_turn(writer, state.job, state.conversation_id, state.turns_done, llm_message, latency_ms)
+                halted_reason = self._halted_reason(state.conversation_id)
+                if halted_reason:
+                    self._finish(writer, state.job, state.conversation_id, "halted", state.turns_done, halted_reason)
+                elif state.turns_done >= state.job.turns:
+                    self._finish(writer, state.job, state.conversation_id, "completed", state.turns_done)
+                else:
+                    remaining.append(state)
+        return remaining
+
+    def _wait_all(self, submitted: List, writer: JsonlWriter) -> List:
+        """Poll the submitted batch jobs until each finishes; returns the finished ones with results keyed by custom id"""
+        finished = []
+        pending = list(submitted)
+        deadline = time.monotonic() + self.max_wait
+        delay = min(1.0, self.poll_interval)
+        while pending:
+            still_pending = []
+            for entry in pending:
+                backend, api_key, batch_id, chunk, started = entry
+                try:
+                    status = backend.status(api_key, batch_id)
+                    if status == COMPLETED:
+                        results = {result.custom_id: result for result in backend.results(api_key, batch_id)}
+                        finished.append((*entry, results))
+                    elif status == FAILED:
+                        self._fail_all(writer, chunk, f"Batch {batch_id} failed at {backend.provider}")
+                    else:
+                        still_pending.append(entry)
+                except Exception as e:
+                    self._fail_all(writer, chunk, f"Could not read batch {batch_id}: {e}")
+            pending = still_pending
+            if pending and time.monotonic() >= deadline:
+                for _, _, batch_id, chunk, _ in pending:
+                    self._fail_all(writer, chunk, f"Batch {batch_id} did not finish within {self.max_wait:.0f}s")
+                break
+            if pending:
+                time.sleep(delay)
+                # Local jobs finish in seconds, provider jobs in minutes or hours
+                delay = min(delay * 2, self.poll_interval)
+        return finished
+
+    def _fail_all(self, writer: JsonlWriter, entries: List[Tuple[_ActiveJob, PreparedTurn]], error: str) -> None:
+        for state, _ in entries:
+            self._finish(writer, state.job, state.conversation_id, "failed", state.turns_done, error)
@@ -0,0 +1,113 @@
+"""
+Batch spec files.
+
+A spec is a JSON object describing a grid of conversations; every combination
+of system prompt x participant set x turn count (x repeat) becomes one job:
+
+    {
+      "name": "caching-study",
+      "user_email": "researcher@example.com",
+      "system_prompts": [
+        {"name": "debate", "prompt": "Debate whether caching is premature optimization."},
+        "Discuss the trade-offs of eventual consistency."
+      ],
+      "participants": [["claude", "openai"], ["gemini", "deepseek", "claude"]],
+      "turns": [4, 8],
+      "repeats": 2,
+      "concurrency": 8,
+      "provider_limits": {"claude": 2, "openai": 4}
+    }
+
+Conversations are owned by ``user_email``, whose stored API keys are used.
+``concurrency`` bounds the conversations running at once and
+``provider_limits`` the calls in flight per provider; both can be overridden
+on the command line.
+"""
+import json
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+class BatchJob(NamedTuple):
+    job_id: str
+    prompt_name: str
+    system_prompt: str
+    participants: Tuple[str, ...]
+    turns: int
+    repeat: int
+
+class BatchSpec(NamedTuple):
+    name: str
+    user_email: str
+    jobs: List[BatchJob]
+    concurrency: int
+    provider_limits: Dict[str, int]
+
+
+def _prompts(raw) -> List[Tuple[str, str]]:
+    if not isinstance(raw, list) or not raw:
+        raise ValueError("'system_prompts' must be a non-empty list")
+    prompts = []
+    for index, item in enumerate(raw):
+        if isinstance(item, str):
+            prompts.append((f"prompt{index}", item))
+        elif isinstance(item, dict) and isinstance(item.get("prompt"), str):
+            prompts.append((str(item.get("name") or f"prompt{index}"), item["prompt"]))
+        else:
+            raise ValueError(f"system_prompts[{index}] must be a string or an object with a 'prompt'")
+    names = [name for name, _ in prompts]
+    if len(set(names)) != len(names):
+        raise ValueError("System prompt names must be unique")
+    return prompts
+
+def _positive_int(value, field: str) -> int:
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise ValueError(f"'{field}' must be a positive integer")
+    return value
+
+def parse_spec(data: Dict, supported_llms: Optional[List[str]] = None) -> BatchSpec:
+    """Validate a spec and expand its grid into jobs with stable ids"""
+    if not isinstance(data, dict):
+        raise ValueError("A batch spec must be a JSON object")
+    user_email = data.get("user_email")
+    if not user_email:
+        raise ValueError("'user_email' is required")
+
+    prompts = _prompts(data.get("system_prompts"))
+
+    participant_sets = data.get("participants")
+    if not isinstance(participant_sets, list) or not participant_sets:
+        raise ValueError("'participants' must be a non-empty list of LLM name lists")
+    for participants in participant_sets:
+        if not isinstance(participants, list) or not participants:
+            raise ValueError("Each participant set must be a non-empty list of LLM names")
+        for llm_name in participants:
+            if supported_llms is not None and llm_name not in supported_llms:
+                raise ValueError(f"Unsupported LLM: {llm_name}")
+
+    turns = data.get("turns", [4])
+    turns = [_positive_int(count, "turns") for count in (turns if isinstance(turns, list) else [turns])]
+    repeats = _positive_int(data.get("repeats", 1), "repeats")
+
+    provider_limits = data.get("provider_limits") or {}
+    if not isinstance(provider_limits, dict):
+        raise ValueError("'provider_limits' must map LLM names to positive integers")
+    provider_limits = {name: _positive_int(limit, f"provider_limits.{name}") for name, limit in provider_limits.items()}
+
+    jobs = []
+    for prompt_name, system_prompt in prompts:
+        for participants in participant_sets:
+            for turn_count in turns:
+                for repeat in range(repeats):
+                    job_id = f"{prompt_name}|{'+'.join(participants)}|t{turn_count}|r{repeat}"
+                    jobs.append(BatchJob(job_id, prompt_name, system_prompt, tuple(participants), turn_count, repeat))
+
+    return BatchSpec(
+        name=str(data.get("name") or "batch"),
+        user_email=user_email,
+        jobs=jobs,
+        concurrency=_positive_int(data.get("concurrency", 4), "concurrency"),
+        provider_limits=provider_limits,
+    )
+
+def load_spec(path: str, supported_llms: Optional[List[str]] = None) -> BatchSpec:
+    with open(path) as spec_file:
+        return parse_spec(json.load(spec_file), supported_llms)
@@ -0,0 +1 @@
+# Micro-benchmarks for per-turn hot paths: ``python -m benchmarks.run --help`` (from the backend directory)
@@ -0,0 +1,130 @@
+"""
+Run the hot-path micro-benchmarks and compare them with the stored baseline.
+
+Usage (from the backend directory):
+    pip install -r requirements.txt -r loadtest/requirements.txt
+    python -m benchmarks.run                      # compare with benchmarks/baseline.json
+    python -m benchmarks.run --filter message.    # only names containing "message."
+    python -m benchmarks.run --update-baseline    # record this machine's numbers as the baseline
+
+A benchmark regresses when its median time per call exceeds the baseline by
+more than the threshold (the baseline file's ``threshold`` unless --threshold
+is given); the exit status is 1 if any does. Baselines are only comparable on
+the machine and Python version that recorded them, so refresh the file when
+either changes.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+from datetime import datetime, timezone
+from typing import Dict
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_THRESHOLD = 0.25
+
+
+def measure(fn, repeat: int, min_time: float) -> Dict[str, float]:
+    """Median and best time per call over ``repeat`` rounds of at least ``min_time`` seconds"""
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    # autorange stops at 0.2 s; scale up so each round lasts about min_time
+    if elapsed < min_time:
+        number = max(number, int(number * min_time / max(elapsed, 1e-9)))
+    rounds = [seconds / number for seconds in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "ns_per_op": round(statistics.median(rounds) * 1e9, 1),
+        "best_ns_per_op": round(min(rounds) * 1e9, 1),
+        "calls_per_round": number,
+    }
+
+def load_baseline(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {"threshold": DEFAULT_THRESHOLD, "benchmarks": {}}
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+def compare(results: Dict[str, Dict], baseline: Dict, threshold: float) -> Dict[str, Dict]:
+    """Attach the baseline and change ratio to each result and flag regressions"""
+    recorded = baseline.get("benchmarks", {})
+    for name, result in results.items():
+        previous = recorded.get(name)
+        if not previous:
+            result["status"] = "new"
+            continue
+        change = result["ns_per_op"] / previous["ns_per_op"] - 1
+        result["baseline_ns_per_op"] = previous["ns_per_op"]
+        result["change"] = round(change, 4)
+        result["status"] = "regressed" if change > threshold else "improved" if change < -threshold else "ok"
+    return results
+
+def environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time per-turn hot paths against a stored baseline")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=7, help="timing rounds per benchmark (default 7)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per round (default 0.2)")
+    parser.add_argument("--threshold", type=float, help=f"allowed slowdown as a fraction (default from baseline, else {DEFAULT_THRESHOLD})")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline file")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--output", help="also write the JSON report here")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    from benchmarks.suite import BENCHMARKS
+
+    baseline = load_baseline(args.baseline)
+    threshold = args.threshold if args.threshold is not None else baseline.get("threshold", DEFAULT_THRESHOLD)
+
+    results: Dict[str, Dict] = {}
+    for name, setup in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        results[name] = measure(setup(), args.repeat, args.min_time)
+        print(f"{name:<60} {results[name]['ns_per_op'] / 1000:>12.2f} us/op", file=sys.stderr)
+
+    if args.update_baseline:
+        recorded = dict(baseline.get("benchmarks", {}))
+        recorded.update({name: {"ns_per_op": result["ns_per_op"]} for name, result in results.items()})
+        baseline = {
+            "threshold": threshold,
+            "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "environment": environment(),
+            "benchmarks": dict(sorted(recorded.items())),
+        }
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=2)
+            baseline_file.write("\n")
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return 0
+
+    compare(results, baseline, threshold)
+    regressions = sorted(name for name, result in results.items() if result["status"] == "regressed")
+    report = {
+        "threshold": threshold,
+        "environment": environment(),
+        "baseline_environment": baseline.get("environment"),
+        "regressions": regressions,
+        "benchmarks": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
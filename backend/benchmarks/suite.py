@@ -0,0 +1,172 @@
+"""
+Benchmarked hot paths. Each ``@benchmark`` function does its setup and returns
+the zero-argument callable that is timed; everything here runs on every
+conversation turn or socket connect.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+# The app reads its settings at import time: use an in-memory Mongo, a real Fernet key and no file logging
+os.environ.setdefault('FLASK_ENV', 'development')
+os.environ.setdefault('MONGODB_URI', 'mongomock://')
+os.environ.setdefault('LOG_FILE', '')
+if 'ENCRYPTION_KEY' not in os.environ:
+    from cryptography.fernet import Fernet
+    os.environ['ENCRYPTION_KEY'] = Fernet.generate_key().decode()
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+HISTORY_SIZES = (10, 100, 1000)
+PARTICIPANTS = ["claude", "openai", "gemini"]
+
+def benchmark(name: str):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def _messages(count: int, conversation_id: str = "bench-conversation") -> List:
+    from models import Message
+    started = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    messages = []
+    for index in range(count):
+        llm_name = PARTICIPANTS[index % len(PARTICIPANTS)]
+        messages.append(Message(
+            conversation_id=conversation_id,
+            sender_type="llm",
+            sender_id=llm_name,
+            llm_name=llm_name,
+            content=f"Reply {index}: " + "lorem ipsum dolor sit amet " * 20,
+            created_at=started + timedelta(seconds=index),
+            input_tokens=1200, output_tokens=180, cached_tokens=0, cost_usd=0.0063
+        ))
+    return messages
+
+def _conversation():
+    from models import Conversation
+    return Conversation(name="Benchmark", user_id="bench-user",
+                        system_prompt="Discuss the trade-offs of caching. " * 10,
+                        llm_participants=PARTICIPANTS)
+
+def _conversation_service():
+    from services.conversation_service import ConversationService
+    # The helpers under test only use their arguments
+    return ConversationService(conversation_repository=None, user_service=None)
+
+
+@benchmark("conversation_service.determine_next_llm")
+def determine_next_llm():
+    service = _conversation_service()
+    messages = _messages(100)
+    return lambda: service._determine_next_llm(PARTICIPANTS, messages)
+
+def _prepare_chat_history(size: int, llm_name: str):
+    def setup():
+        service = _conversation_service()
+        messages = _messages(size)
+        return lambda: service._prepare_chat_history(messages, llm_name)
+    return setup
+
+for _size in HISTORY_SIZES:
+    benchmark(f"conversation_service.prepare_chat_history[{_size}]")(_prepare_chat_history(_size, "claude"))
+benchmark("conversation_service.prepare_chat_history[100,gemini]")(_prepare_chat_history(100, "gemini"))
+
+
+@benchmark("message.to_db_document")
+def message_to_db_document():
+    message = _messages(1)[0]
+    return message.to_db_document
+
+@benchmark("message.from_db_document")
+def message_from_db_document():
+    from models import Message
+    doc = _messages(1)[0].to_db_document()
+    # from_db_document pops '_id', so hand it a fresh copy each time as the repository does
+    return lambda: Message.from_db_document(dict(doc))
+
+@benchmark("message.model_dump_json")
+def message_model_dump():
+    message = _messages(1)[0]
+    return lambda: message.model_dump(mode='json')
+
+@benchmark("conversation.to_db_document")
+def conversation_to_db_document():
+    return _conversation().to_db_document
+
+@benchmark("conversation.from_db_document")
+def conversation_from_db_document():
+    from models import Conversation
+    doc = _conversation().to_db_document()
+    return lambda: Conversation.from_db_document(dict(doc))
+
+@benchmark("conversation.model_dump_json")
+def conversation_model_dump():
+    conversation = _conversation()
+    return lambda: conversation.model_dump(mode='json')
+
+
+@benchmark("user.encrypt_api_key")
+def encrypt_api_key():
+    from models.user import User
+    return lambda: User.encrypt_api_key("sk-bench-" + "x" * 48)
+
+@benchmark("user.decrypt_api_key")
+def decrypt_api_key():
+    from models.user import User
+    encrypted = User.encrypt_api_key("sk-bench-" + "x" * 48)
+    return lambda: User.decrypt_api_key(encrypted)
+
+
+@benchmark("auth_service.verify_token")
+def verify_token():
+    from models.user import User
+    from services.auth_service import AuthService
+    auth_service = AuthService()
+    token = auth_service.create_access_token(User(email="bench@example.com", password_hash="x"))
+    return lambda: auth_service.get_user_id_from_token(token)
+
+
+def _seeded_db(message_count: int):
+    import mongomock
+    from models.user import User
+    db = mongomock.MongoClient().bench
+    conversation = _conversation()
+    db.conversations.insert_one(conversation.to_db_document())
+    if message_count:
+        # insert_many rejects an empty list
+        db.messages.insert_many([message.to_db_document() for message in _messages(message_count, conversation.id)])
+    user = User(id="bench-user", email="bench@example.com", password_hash="x",
+                claude_api_key=User.encrypt_api_key("sk-bench"))
+    db.users.insert_one(user.to_db_document())
+    return db, conversation.id
+
+@benchmark("user_repository.find_by_id")
+def user_find_by_id():
+    from repositories.user_repository import UserRepository
+    db, _ = _seeded_db(0)
+    repository = UserRepository(db)
+    return lambda: repository.find_by_id("bench-user")
+
+@benchmark("conversation_repository.find_by_id")
+def conversation_find_by_id():
+    from repositories.conversation_repository import ConversationRepository
+    db, conversation_id = _seeded_db(0)
+    # Uncached, so every call reads and validates the document
+    repository = ConversationRepository(db)
+    return lambda: repository.find_by_id(conversation_id)
+
+@benchmark("conversation_repository.get_messages[100]")
+def get_messages():
+    from repositories.conversation_repository import ConversationRepository
+    db, conversation_id = _seeded_db(100)
+    repository = ConversationRepository(db)
+    return lambda: repository.get_messages(conversation_id)
+
+@benchmark("conversation_repository.get_conversation_with_messages[100]")
+def get_conversation_with_messages():
+    from repositories.conversation_repository import ConversationRepository
+    db, conversation_id = _seeded_db(100)
+    repository = ConversationRepository(db)
+    return lambda: repository.get_conversation_with_messages(conversation_id)
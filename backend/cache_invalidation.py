@@ -0,0 +1,142 @@
+"""
+Cross-worker invalidation for the in-process caches.
+
+Each worker keeps its own TTL caches (conversations, users, decrypted API
+keys). When one worker changes something it drops its own copy and publishes
+``(kind, key)`` on a shared channel; every other worker drops its copy when the
+message arrives, so nobody serves stale data until the TTL runs out.
+
+The channel rides on the Socket.IO message queue: ``redis://``/``rediss://``
+use Redis pub/sub and ``local://`` an in-process bus for tests. Pub/sub does
+not replay missed messages, so a worker clears its caches whenever its
+subscription (re)starts.
+"""
+import json
+import logging
+import threading
+import uuid
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Kinds of cached data
+CONVERSATION = "conversation"
+USER = "user"
+
+# invalidate(key) drops one entry; clear() drops everything of that kind
+Subscriber = Tuple[Callable[[str], None], Callable[[], None]]
+
+
+class CacheInvalidationBus:
+    """Publishes local changes and applies the ones other workers publish"""
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        # Identifies this worker's own messages, which it has already applied
+        self.origin = uuid.uuid4().hex
+        self._subscribers: Dict[str, List[Subscriber]] = defaultdict(list)
+
+    def subscribe(self, kind: str, invalidate: Callable[[str], None], clear: Callable[[], None]) -> None:
+        self._subscribers[kind].append((invalidate, clear))
+
+    def publish(self, kind: str, key: str) -> None:
+        """Tell the other workers that ``key`` changed; never raises"""
+        try:
+            self._publish(json.dumps({"origin": self.origin, "kind": kind, "key": key}))
+        except Exception as e:
+            logger.warning(f"Publishing {kind} cache invalidation for {key} failed: {e}")
+
+    def close(self) -> None:
+        pass
+
+    def _publish(self, payload: str) -> None:
+        raise NotImplementedError
+
+    def _deliver(self, payload) -> None:
+        try:
+            message = json.loads(payload)
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring malformed cache invalidation message: {payload!r}")
+            return
+        if message.get("origin") == self.origin:
+            return
+        for invalidate, _ in self._subscribers.get(message.get("kind"), []):
+            invalidate(message.get("key"))
+
+    def _clear_all(self) -> None:
+        for subscribers in self._subscribers.values():
+            for _, clear in subscribers:
+                clear()
+
+
+class LocalInvalidationBus(CacheInvalidationBus):
+    """In-process bus; buses created with the same channel reach each other, like workers sharing Redis"""
+
+    _buses: Dict[str, List["LocalInvalidationBus"]] = defaultdict(list)
+    _buses_lock = threading.Lock()
+
+    def __init__(self, channel: str):
+        super().__init__(channel)
+        with self._buses_lock:
+            self._buses[channel].append(self)
+
+    def _publish(self, payload: str) -> None:
+        with self._buses_lock:
+            buses = list(self._buses[self.channel])
+        for bus in buses:
+            bus._deliver(payload)
+
+    def close(self) -> None:
+        with self._buses_lock:
+            if self in self._buses[self.channel]:
+                self._buses[self.channel].remove(self)
+
+
+class RedisInvalidationBus(CacheInvalidationBus):
+    """Redis pub/sub bus with a background listener that resubscribes after connection errors"""
+
+    def __init__(self, url: str, channel: str):
+        super().__init__(channel)
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._closed = threading.Event()
+        self._listener = threading.Thread(target=self._run, name="cache-invalidation", daemon=True)
+        self._listener.start()
+
+    def _publish(self, payload: str) -> None:
+        self._redis.publish(self.channel, payload)
+
+    def close(self) -> None:
+        self._closed.set()
+
+    def _run(self) -> None:
+        retry_delay = 1.0
+        while not self._closed.is_set():
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Whatever was published while unsubscribed is lost, so start over from empty caches
+                self._clear_all()
+                retry_delay = 1.0
+                for message in pubsub.listen():
+                    if self._closed.is_set():
+                        break
+                    if message.get("type") == "message":
+                        self._deliver(message["data"])
+            except Exception as e:
+                logger.warning(f"Cache invalidation subscription lost, retrying in {retry_delay:.0f}s: {e}")
+                self._closed.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, 30.0)
+
+
+def create_invalidation_bus(message_queue: Optional[str], channel: str) -> Optional[CacheInvalidationBus]:
+    """Bus for the configured Socket.IO message queue, or None when there is none or it cannot carry one"""
+    if not message_queue:
+        return None
+    if message_queue == "local://":
+        return LocalInvalidationBus(channel)
+    if message_queue.startswith(("redis://", "rediss://")):
+        return RedisInvalidationBus(message_queue, channel)
+    logger.warning(f"Cache invalidation needs a redis:// message queue, not '{message_queue}'")
+    return None
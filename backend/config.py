@@ -33,12 +33,114 @@ class Config:
     
     MONGODB_URI = None
     
+    # Repositories for the socket read events in ASGI mode: 'sync' (pymongo, in worker threads)
+    # or 'async' (motor, on the event loop); HTTP routes and LLM turns always use pymongo
+    DB_DRIVER = os.getenv('DB_DRIVER', 'sync').lower()
+    # MongoDB connection pool settings, applied to both clients
+    MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', '100'))
+    MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', '0'))
+    MONGODB_MAX_IDLE_TIME_MS = int(os.getenv('MONGODB_MAX_IDLE_TIME_MS')) if os.getenv('MONGODB_MAX_IDLE_TIME_MS') else None
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS')) if os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS') else None
+    # Per-command timing, slow-query log and per-request query counts
+    MONGODB_COMMAND_MONITORING = os.getenv('MONGODB_COMMAND_MONITORING', 'true').lower() == 'true'
+    MONGODB_SLOW_QUERY_MS = float(os.getenv('MONGODB_SLOW_QUERY_MS', '100'))
+    
     ENCRYPTION_KEY = None
     
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:5874').split(',')
     
     PROJECT_ID = ""#os.getenv('PROJECT_ID', 'llm-chat-auditor')
     
+    # Logging; records go through a queue to stdout and LOG_FILE (empty disables the file)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+    LOG_FILE = os.getenv('LOG_FILE', 'app.log')
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    # Fraction of requests whose INFO/DEBUG records are kept, overridable per route ("/api/csrf-token=0.01,...")
+    LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+    LOG_ROUTE_SAMPLE_RATES = os.getenv('LOG_ROUTE_SAMPLE_RATES', '')
+    # Per-request session/header dumps, for debugging auth issues only
+    DEBUG_REQUEST_LOGGING = os.getenv('DEBUG_REQUEST_LOGGING', 'false').lower() == 'true'
+    
+    # Prometheus-format /metrics endpoint; off by default, and scrapers must send METRICS_TOKEN as a Bearer token
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
+    
+    # Tracing of socket-triggered turns; TRACE_EXPORTER is 'none', 'console' or 'file' (JSON Lines in TRACE_FILE)
+    TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'none').lower()
+    TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.1'))
+    TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+    
+    # Replace every LLM provider with a local mock (load tests only); latencies in milliseconds
+    LLM_MOCK_MODE = os.getenv('LLM_MOCK_MODE', 'false').lower() == 'true'
+    LLM_MOCK_TTFT_MS = int(os.getenv('LLM_MOCK_TTFT_MS', '100'))
+    LLM_MOCK_DURATION_MS = int(os.getenv('LLM_MOCK_DURATION_MS', '500'))
+    LLM_MOCK_REPLY_TOKENS = int(os.getenv('LLM_MOCK_REPLY_TOKENS', '60'))
+    
+    # 'wsgi' serves app.py with Flask-SocketIO on eventlet, 'asgi' serves asgi.py on uvicorn
+    SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi').lower()
+    # Worker threads that run controllers and blocking I/O in ASGI mode
+    ASGI_THREADPOOL_SIZE = int(os.getenv('ASGI_THREADPOOL_SIZE', '64'))
+    
+    # Socket.IO message queue for multi-worker deployments (e.g. redis://host:6379/0, local:// for tests)
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE') or None
+    SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'llm-chat-socketio')
+    # Per-worker caches are invalidated across workers over the same (Redis) queue on this channel
+    CACHE_INVALIDATION_CHANNEL = os.getenv('CACHE_INVALIDATION_CHANNEL', 'llm-chat-cache-invalidation')
+    # Worker processes per instance (read by the Dockerfile too); caches need invalidation when > 1
+    GUNICORN_WORKERS = int(os.getenv('GUNICORN_WORKERS', '1'))
+    
+    # Streaming of LLM replies over Socket.IO; deltas are coalesced per client
+    STREAMING_ENABLED = os.getenv('STREAMING_ENABLED', 'true').lower() == 'true'
+    STREAM_FRAME_INTERVAL_MS = int(os.getenv('STREAM_FRAME_INTERVAL_MS', '50'))
+    STREAM_COARSE_INTERVAL_MS = int(os.getenv('STREAM_COARSE_INTERVAL_MS', '1000'))
+    STREAM_MAX_FRAME_BYTES = int(os.getenv('STREAM_MAX_FRAME_BYTES', '4096'))
+    STREAM_CLIENT_SOFT_LIMIT_BYTES = int(os.getenv('STREAM_CLIENT_SOFT_LIMIT_BYTES', '32768'))
+    STREAM_CLIENT_HARD_LIMIT_BYTES = int(os.getenv('STREAM_CLIENT_HARD_LIMIT_BYTES', '131072'))
+    # A final-only client that has not acked for this long is streamed to again
+    STREAM_FINAL_ONLY_TIMEOUT_MS = int(os.getenv('STREAM_FINAL_ONLY_TIMEOUT_MS', '30000'))
+    
+    # Compression of HTTP responses (bytes; 0 disables it)
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+    COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', '6'))
+    
+    # Generate the next speaker's reply as soon as a turn completes and hold it for the next trigger
+    SPECULATIVE_GENERATION = os.getenv('SPECULATIVE_GENERATION', 'false').lower() == 'true'
+    SPECULATION_TTL = float(os.getenv('SPECULATION_TTL', '300'))
+    SPECULATION_WORKERS = int(os.getenv('SPECULATION_WORKERS', '8'))
+    
+    # Loop detection on self-chats: 'off', 'flag' (record it on the conversation) or 'stop' (also halt it)
+    REPETITION_DETECTION = os.getenv('REPETITION_DETECTION', 'off').lower()
+    REPETITION_THRESHOLD = float(os.getenv('REPETITION_THRESHOLD', '0.8'))
+    REPETITION_WINDOW = int(os.getenv('REPETITION_WINDOW', '6'))
+    REPETITION_CONSECUTIVE = int(os.getenv('REPETITION_CONSECUTIVE', '3'))
+    
+    # In-process Conversation metadata cache (size 0 disables it)
+    CONVERSATION_CACHE_SIZE = int(os.getenv('CONVERSATION_CACHE_SIZE', '1024'))
+    CONVERSATION_CACHE_TTL = float(os.getenv('CONVERSATION_CACHE_TTL', '60'))
+    
+    # In-process cache of loaded users for Flask-Login and socket auth (size 0 disables it)
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '1024'))
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '30'))
+    
+    # Decrypted provider API keys, per (user, provider) (size 0 disables it)
+    API_KEY_CACHE_SIZE = int(os.getenv('API_KEY_CACHE_SIZE', '512'))
+    API_KEY_CACHE_TTL = float(os.getenv('API_KEY_CACHE_TTL', '300'))
+    
+    # Password hashing; existing hashes are upgraded on login when BCRYPT_ROUNDS changes
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '4'))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '64'))
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT', '5'))
+    
+    # Write-behind buffer for LLM messages (disabled by default)
+    MESSAGE_BUFFER_ENABLED = os.getenv('MESSAGE_BUFFER_ENABLED', 'false').lower() == 'true'
+    MESSAGE_BUFFER_MAX_SIZE = int(os.getenv('MESSAGE_BUFFER_MAX_SIZE', '50'))
+    MESSAGE_BUFFER_FLUSH_INTERVAL = float(os.getenv('MESSAGE_BUFFER_FLUSH_INTERVAL', '1.0'))
+    # Beyond this many pending messages new ones are written directly; failing ones are dead-lettered after N flushes
+    MESSAGE_BUFFER_MAX_PENDING = int(os.getenv('MESSAGE_BUFFER_MAX_PENDING', '1000'))
+    MESSAGE_BUFFER_MAX_ATTEMPTS = int(os.getenv('MESSAGE_BUFFER_MAX_ATTEMPTS', '5'))
+    
     @classmethod
     def load_secrets(cls):
         """Load secrets from Google Secret Manager with retry logic"""
@@ -87,7 +189,7 @@ class Config:
                             raise ValueError(f"Failed to load secret '{secret_name}': {e}")
         else:
             logger.info("Loading secrets from environment variables (development mode)")
-            cls.MONGODB_URI = "mongodb://localhost:27017/llm-chat-auditor"
+            cls.MONGODB_URI = os.getenv('MONGODB_URI', "mongodb://localhost:27017/llm-chat-auditor")
             cls.FLASK_SECRET_KEY = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-in-production')
             cls.ENCRYPTION_KEY = os.getenv('ENCRYPTION_KEY', 'dev-encryption-key-change-in-production')
     
@@ -107,6 +209,33 @@ class Config:
         if not cls.ENCRYPTION_KEY:
             raise ValueError("ENCRYPTION_KEY is required")
         
+        if cls.SERVER_MODE not in ('wsgi', 'asgi'):
+            raise ValueError(f"SERVER_MODE must be 'wsgi' or 'asgi', got '{cls.SERVER_MODE}'")
+        
+        if cls.DB_DRIVER not in ('sync', 'async'):
+            raise ValueError(f"DB_DRIVER must be 'sync' or 'async', got '{cls.DB_DRIVER}'")
+        
+        if cls.DB_DRIVER == 'async' and cls.SERVER_MODE != 'asgi':
+            raise ValueError("DB_DRIVER=async needs SERVER_MODE=asgi; the eventlet server has no event loop to run motor on")
+        
+        if cls.DB_DRIVER == 'async' and cls.MONGODB_URI.startswith('mongomock://'):
+            raise ValueError("DB_DRIVER=async needs a real MongoDB; mongomock has no async client")
+        
+        if cls.LOG_FORMAT not in ('json', 'text'):
+            raise ValueError(f"LOG_FORMAT must be 'json' or 'text', got '{cls.LOG_FORMAT}'")
+        
+        if cls.TRACE_EXPORTER not in ('none', 'console', 'file'):
+            raise ValueError(f"TRACE_EXPORTER must be 'none', 'console' or 'file', got '{cls.TRACE_EXPORTER}'")
+        
+        if cls.REPETITION_DETECTION not in ('off', 'flag', 'stop'):
+            raise ValueError(f"REPETITION_DETECTION must be 'off', 'flag' or 'stop', got '{cls.REPETITION_DETECTION}'")
+        
+        if cls.METRICS_ENABLED and not cls.METRICS_TOKEN:
+            raise ValueError("METRICS_TOKEN is required when METRICS_ENABLED is true")
+        
+        if not 4 <= cls.BCRYPT_ROUNDS <= 31:
+            raise ValueError(f"BCRYPT_ROUNDS must be between 4 and 31, got {cls.BCRYPT_ROUNDS}")
+        
         logger.info("Configuration validation passed")
         return True
 
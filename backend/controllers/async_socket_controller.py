@@ -0,0 +1,96 @@
+import logging
+from typing import Optional
+from services.auth_service import AuthService
+from controllers.socket_controller import conversation_room
+from json_provider import to_jsonable
+from metrics import SOCKET_CONNECTIONS, SOCKET_EMITS
+
+logger = logging.getLogger(__name__)
+
+class AsyncSocketController:
+    """The read-only socket events of SocketController, served on the event loop (ASGI mode, DB_DRIVER=async).
+    
+    Token connects, join_conversation and sync_conversation only read from
+    MongoDB, so with the motor repositories they need no worker thread and
+    reconnect storms do not compete with LLM turns for the thread pool. Events
+    and payloads are the same as SocketController's.
+    """
+    
+    def __init__(self, conversation_repository, user_repository, conversation_service, sio, transport):
+        # conversation_repository and user_repository are the motor-backed ones
+        self.conversation_repository = conversation_repository
+        self.user_repository = user_repository
+        # Only for in-progress replies, which live in this worker's memory
+        self.conversation_service = conversation_service
+        self.auth_service = AuthService()
+        self.sio = sio
+        self.transport = transport
+    
+    async def _emit(self, event: str, data, to: Optional[str] = None):
+        SOCKET_EMITS.inc(event=event)
+        await self.sio.emit(event, data, to=to or self.transport.sid)
+    
+    async def handle_connect(self, auth_token: Optional[str]) -> bool:
+        """Log the client in from its JWT; False if it has none that resolves to a user"""
+        if auth_token and auth_token.startswith('Bearer '):
+            auth_token = auth_token[7:]
+        user_id = self.auth_service.get_user_id_from_token(auth_token) if auth_token else None
+        user = await self.user_repository.find_by_id(user_id) if user_id else None
+        if not user:
+            return False
+        SOCKET_CONNECTIONS.inc()
+        self.transport.login(user)
+        logger.info(f'Client connected: {user.email}')
+        await self._emit('response', {'data': 'Connected to backend', 'authenticated': True})
+        return True
+    
+    async def _conversation_id(self, data, event: str) -> Optional[str]:
+        """The requested conversation if the client is logged in and owns it; otherwise reports why and returns None"""
+        if not self.transport.current_user.is_authenticated:
+            await self._emit('error', {'message': 'Authentication required'})
+            return None
+        if not isinstance(data, dict):
+            await self._emit('error', {'message': f'Invalid payload for {event} event'})
+            return None
+        conversation_id = data.get('conversation_id')
+        if not conversation_id:
+            await self._emit('error', {'message': f'Missing conversation_id in {event} event'})
+            return None
+        conversation = await self.conversation_repository.find_by_id(conversation_id)
+        if not conversation or conversation.user_id != self.transport.current_user.id:
+            await self._emit('error', {'message': f'Conversation {conversation_id} not found'})
+            return None
+        return conversation_id
+    
+    async def handle_join_conversation(self, data):
+        """Subscribe the client to updates for one conversation"""
+        try:
+            conversation_id = await self._conversation_id(data, 'join_conversation')
+            if not conversation_id:
+                return
+            await self.sio.enter_room(self.transport.sid, conversation_room(conversation_id))
+            await self._emit('joined_conversation', {'conversation_id': conversation_id})
+        except Exception as e:
+            await self._emit('error', {'message': f'Failed to join conversation: {str(e)}'})
+    
+    async def handle_sync_conversation(self, data):
+        """Rejoin a conversation after a reconnect and send what the client missed"""
+        try:
+            conversation_id = await self._conversation_id(data, 'sync_conversation')
+            if not conversation_id:
+                return
+            await self.sio.enter_room(self.transport.sid, conversation_room(conversation_id))
+    
+            last_message_id = data.get('last_message_id')
+            if last_message_id:
+                conversation_data = await self.conversation_repository.get_conversation_with_messages_since(
+                    conversation_id, last_message_id
+                )
+            else:
+                conversation_data = await self.conversation_repository.get_conversation_with_messages(conversation_id)
+                conversation_data['since'] = None
+            conversation_data['partial'] = self.conversation_service.get_partial_generation(conversation_id)
+    
+            await self._emit('conversation_sync', to_jsonable(conversation_data))
+        except Exception as e:
+            await self._emit('error', {'message': f'Failed to sync conversation: {str(e)}'})
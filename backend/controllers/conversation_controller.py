@@ -1,6 +1,7 @@
 from flask import jsonify, request
 from flask_login import current_user
 from services.conversation_service import ConversationService
+from http_caching import make_etag, as_utc, is_not_modified, add_validators, not_modified_response
 
 class ConversationController:
     def __init__(self, conversation_service: ConversationService):
@@ -22,25 +23,71 @@ class ConversationController:
         except Exception as e:
             return jsonify({"error": f"Failed to create conversation: {str(e)}"}), 500
     
+    def fork_conversation(self, conversation_id: str):
+        """Fork a conversation at one of its messages"""
+        try:
+            conversation = self.conversation_service.get_conversation(conversation_id)
+            if not conversation or conversation.user_id != current_user.id:
+                return jsonify({"error": "Conversation not found"}), 404
+            
+            data = request.json or {}
+            success, message, fork_id = self.conversation_service.fork_conversation(
+                conversation_id, current_user.id, data
+            )
+            
+            if success:
+                return jsonify({"id": fork_id, "message": message}), 201
+            else:
+                return jsonify({"error": message}), 400
+                
+        except Exception as e:
+            return jsonify({"error": f"Failed to fork conversation: {str(e)}"}), 500
+    
     def get_conversations(self):
         """Get all conversations for the current user"""
         try:
+            version = self.conversation_service.get_conversations_version(current_user.id)
+            etag = make_etag("conversations", current_user.id, version["count"], version["last_modified"])
+            last_modified = as_utc(version["last_modified"])
+            if is_not_modified(etag, last_modified):
+                return not_modified_response(etag, last_modified)
+            
             conversations = self.conversation_service.get_conversations(current_user.id)
-            return jsonify(conversations)
+            return add_validators(jsonify(conversations), etag, last_modified)
         except Exception as e:
             return jsonify({"error": f"Failed to fetch conversations: {str(e)}"}), 500
     
     def get_conversation_details(self, conversation_id: str):
-        """Get conversation details with messages"""
+        """Get conversation details with messages, or only newer ones with ?since=<message_id>"""
         try:
             if not conversation_id or not isinstance(conversation_id, str):
                 return jsonify({"error": "Invalid conversation_id format, must be a string."}), 400
             
-            conversation_data = self.conversation_service.get_conversation_details(conversation_id)
+            version = self.conversation_service.get_conversation_version(conversation_id)
+            if not version:
+                return jsonify({"error": "Conversation not found"}), 404
+            
+            since_message_id = request.args.get('since')
+            # A ?since= response carries any in-progress reply, which changes without a new version
+            partial = self.conversation_service.get_partial_generation(conversation_id) if since_message_id else None
+            etag = make_etag(
+                "conversation", conversation_id, version["updated_at"], version["message_count"], since_message_id
+            )
+            last_modified = as_utc(version["last_modified"])
+            if partial is None and is_not_modified(etag, last_modified):
+                return not_modified_response(etag, last_modified)
+            
+            if since_message_id:
+                conversation_data = self.conversation_service.get_conversation_details_since(
+                    conversation_id, since_message_id
+                )
+            else:
+                conversation_data = self.conversation_service.get_conversation_details(conversation_id)
             if not conversation_data:
                 return jsonify({"error": "Conversation not found"}), 404
             
-            return jsonify(conversation_data)
+            response = jsonify(conversation_data)
+            return response if partial else add_validators(response, etag, last_modified)
             
         except Exception as e:
             return jsonify({"error": f"An unexpected error occurred while fetching conversation details: {str(e)}"}), 500
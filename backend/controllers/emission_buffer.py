@@ -0,0 +1,234 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Delivery levels for a client, from finest to coarsest
+LEVEL_STREAM = "stream"
+LEVEL_COARSE = "coarse"
+LEVEL_FINAL_ONLY = "final_only"
+
+class _ClientStream:
+    """Emission state for one client watching one generated message"""
+
+    def __init__(self, conversation_id: str, message_id: str, llm_name: str):
+        self.conversation_id = conversation_id
+        self.message_id = message_id
+        self.llm_name = llm_name
+        self.pending = []
+        self.pending_bytes = 0
+        self.seq = 0
+        self.last_flush = time.monotonic()
+        # Deltas were dropped while the client was final-only; the rest of this message waits for the final update
+        self.gapped = False
+
+
+class StreamEmissionBuffer:
+    """Per-client buffer that coalesces streamed deltas into frames.
+
+    Deltas for a client are merged and sent as one ``message_delta`` frame every
+    ``frame_interval`` seconds or once ``max_frame_bytes`` are pending; a
+    background flusher sends what is pending when the provider pauses. Every
+    frame asks the client for an ack, and bytes sent but not yet acknowledged
+    count against that client. Past ``soft_limit_bytes`` the client is switched
+    to coarse frames (``coarse_interval``); past ``hard_limit_bytes`` deltas are
+    dropped and the client only gets the final ``message_update``. A client
+    returns to full streaming once its unacknowledged bytes fall below half the
+    soft limit, so per-client memory and socket writes stay bounded. A
+    final-only client goes back to coarse frames on its next ack, or after
+    ``final_only_timeout`` seconds if no ack ever arrives (the frames it still
+    owes acks for are then written off as lost); a message that already lost
+    deltas is not resumed, only the next one is.
+    """
+
+    def __init__(self, emit_fn: Callable[..., None], frame_interval: float = 0.05,
+                 coarse_interval: float = 1.0, max_frame_bytes: int = 4096,
+                 soft_limit_bytes: int = 32768, hard_limit_bytes: int = 131072,
+                 final_only_timeout: float = 30.0, background_flush: bool = True):
+        # emit_fn(event, data, to=sid, callback=ack)
+        self.emit_fn = emit_fn
+        self.frame_interval = frame_interval
+        self.coarse_interval = coarse_interval
+        self.max_frame_bytes = max_frame_bytes
+        self.soft_limit_bytes = soft_limit_bytes
+        self.hard_limit_bytes = hard_limit_bytes
+        self.final_only_timeout = final_only_timeout
+        self._streams: Dict[tuple, _ClientStream] = {}
+        self._unacked_bytes: Dict[str, int] = {}
+        self._levels: Dict[str, str] = {}
+        # When each final-only client was downgraded
+        self._final_only_since: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        # Started with the first stream; sends pending deltas whose window has passed
+        self.background_flush = background_flush
+        self._flusher: Optional[threading.Thread] = None
+        self._streams_added = threading.Event()
+
+    def push(self, sid: str, conversation_id: str, message_id: str, llm_name: str, delta: str) -> None:
+        """Queue a delta for a client, sending a frame if the window is due"""
+        if not delta:
+            return
+        with self._lock:
+            level = self._level(sid)
+            stream = self._streams.get((sid, message_id))
+            if stream is None:
+                stream = self._streams[(sid, message_id)] = _ClientStream(conversation_id, message_id, llm_name)
+                self._start_flusher()
+            if level == LEVEL_FINAL_ONLY:
+                stream.gapped = True
+            if stream.gapped:
+                return
+            stream.pending.append(delta)
+            stream.pending_bytes += len(delta.encode('utf-8'))
+
+            interval = self.coarse_interval if level == LEVEL_COARSE else self.frame_interval
+            due = (
+                stream.pending_bytes >= self.max_frame_bytes
+                or time.monotonic() - stream.last_flush >= interval
+            )
+            frame = self._take_frame(sid, stream) if due else None
+        if frame:
+            self._send(sid, *frame)
+
+    def flush_due(self) -> None:
+        """Send every stream whose window has passed since its last frame, even without a new delta"""
+        frames = []
+        with self._lock:
+            now = time.monotonic()
+            for (sid, _), stream in self._streams.items():
+                level = self._level(sid)
+                if level == LEVEL_FINAL_ONLY or not stream.pending:
+                    continue
+                interval = self.coarse_interval if level == LEVEL_COARSE else self.frame_interval
+                if now - stream.last_flush >= interval:
+                    frame = self._take_frame(sid, stream)
+                    if frame:
+                        frames.append((sid, frame))
+        for sid, frame in frames:
+            self._send(sid, *frame)
+
+    def _start_flusher(self) -> None:
+        """Call with the lock held"""
+        self._streams_added.set()
+        if self.background_flush and self._flusher is None:
+            self._flusher = threading.Thread(target=self._run_flusher, name="stream-emission-flush", daemon=True)
+            self._flusher.start()
+
+    def _run_flusher(self) -> None:
+        while True:
+            try:
+                with self._lock:
+                    idle = not self._streams
+                    if idle:
+                        self._streams_added.clear()
+                if idle:
+                    self._streams_added.wait()
+                    continue
+                time.sleep(self.frame_interval)
+                self.flush_due()
+            except Exception:
+                # Keep flushing; a dead flusher would stall every paused stream
+                logger.exception("Background flush of streamed deltas failed")
+
+    def finish(self, sid: str, message_id: str) -> None:
+        """Send whatever is left for a message and forget its stream state"""
+        with self._lock:
+            stream = self._streams.pop((sid, message_id), None)
+            if stream is None or self._level(sid) == LEVEL_FINAL_ONLY:
+                return
+            frame = self._take_frame(sid, stream)
+        if frame:
+            self._send(sid, *frame)
+
+    def remove_client(self, sid: str) -> None:
+        """Drop all state for a disconnected client"""
+        with self._lock:
+            for key in [key for key in self._streams if key[0] == sid]:
+                del self._streams[key]
+            self._unacked_bytes.pop(sid, None)
+            self._levels.pop(sid, None)
+            self._final_only_since.pop(sid, None)
+
+    def level(self, sid: str) -> str:
+        with self._lock:
+            return self._level(sid)
+
+    def unacked_bytes(self, sid: str) -> int:
+        with self._lock:
+            return self._unacked_bytes.get(sid, 0)
+
+    def _level(self, sid: str) -> str:
+        level = self._levels.get(sid, LEVEL_STREAM)
+        if level == LEVEL_FINAL_ONLY and time.monotonic() - self._final_only_since.get(sid, 0) >= self.final_only_timeout:
+            # No ack for too long: treat what is outstanding as lost and try again, coarsely
+            self._unacked_bytes[sid] = 0
+            level = self._set_level(sid, LEVEL_COARSE)
+        return level
+
+    def _set_level(self, sid: str, level: str) -> str:
+        if level == LEVEL_FINAL_ONLY:
+            if self._levels.get(sid) != LEVEL_FINAL_ONLY:
+                self._final_only_since[sid] = time.monotonic()
+        else:
+            self._final_only_since.pop(sid, None)
+        if level == LEVEL_STREAM:
+            self._levels.pop(sid, None)
+        else:
+            self._levels[sid] = level
+        return level
+
+    def _take_frame(self, sid: str, stream: _ClientStream) -> Optional[tuple]:
+        """Turn pending deltas into a frame and account for it; call with the lock held"""
+        if not stream.pending:
+            return None
+        frame = {
+            'conversation_id': stream.conversation_id,
+            'message_id': stream.message_id,
+            'llm_name': stream.llm_name,
+            'seq': stream.seq,
+            'delta': ''.join(stream.pending)
+        }
+        size = stream.pending_bytes
+        stream.seq += 1
+        stream.pending = []
+        stream.pending_bytes = 0
+        stream.last_flush = time.monotonic()
+
+        unacked = self._unacked_bytes.get(sid, 0) + size
+        self._unacked_bytes[sid] = unacked
+        self._update_level(sid, unacked)
+        return frame, size
+
+    def _update_level(self, sid: str, unacked: int, acked: bool = False) -> None:
+        if unacked > self.hard_limit_bytes and not acked:
+            self._set_level(sid, LEVEL_FINAL_ONLY)
+        elif unacked < self.soft_limit_bytes // 2:
+            self._set_level(sid, LEVEL_STREAM)
+        elif unacked > self.soft_limit_bytes or self._levels.get(sid) == LEVEL_FINAL_ONLY:
+            # An ack shows a final-only client is reading again, so it steps back up to coarse frames
+            self._set_level(sid, LEVEL_COARSE)
+
+    def _send(self, sid: str, frame: dict, size: int) -> None:
+        def ack(*args):
+            with self._lock:
+                if sid not in self._unacked_bytes:
+                    return
+                unacked = max(0, self._unacked_bytes[sid] - size)
+                self._unacked_bytes[sid] = unacked
+                self._update_level(sid, unacked, acked=True)
+
+        try:
+            self.emit_fn('message_delta', frame, to=sid, callback=ack)
+        except Exception:
+            logger.exception(f"Failed to send message_delta to {sid}")
+            # No ack will come for a frame that was never sent, and the client
+            # would append the next frames after a gap, so the rest of the message waits for the final update
+            with self._lock:
+                stream = self._streams.get((sid, frame['message_id']))
+                if stream is not None:
+                    stream.gapped = True
+                    stream.pending = []
+                    stream.pending_bytes = 0
+            ack()
@@ -1,20 +1,50 @@
-from flask_socketio import emit, disconnect
-from flask_login import current_user, login_user
+import logging
+from typing import Optional
 from services.conversation_service import ConversationService
 from services.user_service import UserService
 from services.auth_service import AuthService
-from flask import session, request
+from controllers.emission_buffer import StreamEmissionBuffer
+from controllers.socket_transport import FlaskSocketTransport
+from config import config
+from json_provider import to_jsonable
+from metrics import SOCKET_CONNECTIONS, SOCKET_EMITS, GENERATIONS_IN_FLIGHT
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+def conversation_room(conversation_id: str) -> str:
+    """Socket.IO room that receives updates for a single conversation"""
+    return f"conversation:{conversation_id}"
 
 class SocketController:
-    def __init__(self, conversation_service: ConversationService, user_service: UserService):
+    def __init__(self, conversation_service: ConversationService, user_service: UserService, transport=None):
         self.conversation_service = conversation_service
         self.user_service = user_service
         self.auth_service = AuthService()
+        self.transport = transport or FlaskSocketTransport()
+        self.emission_buffer = StreamEmissionBuffer(
+            self._emit_to_client,
+            frame_interval=config.STREAM_FRAME_INTERVAL_MS / 1000,
+            coarse_interval=config.STREAM_COARSE_INTERVAL_MS / 1000,
+            max_frame_bytes=config.STREAM_MAX_FRAME_BYTES,
+            soft_limit_bytes=config.STREAM_CLIENT_SOFT_LIMIT_BYTES,
+            hard_limit_bytes=config.STREAM_CLIENT_HARD_LIMIT_BYTES,
+            final_only_timeout=config.STREAM_FINAL_ONLY_TIMEOUT_MS / 1000
+        )
+    
+    def _emit(self, event: str, data, to=None):
+        SOCKET_EMITS.inc(event=event)
+        self.transport.emit(event, data, to=to)
+    
+    def _emit_to_client(self, event: str, data, to: str, callback=None):
+        SOCKET_EMITS.inc(event=event)
+        self.transport.emit_to_client(event, data, to=to, callback=callback)
     
     def handle_connect(self):
         """Handle client connection with authentication"""
+        SOCKET_CONNECTIONS.inc()
         try:
-            auth_token = request.args.get('token') or request.headers.get('Authorization')
+            auth_token = self.transport.auth_token()
             
             if auth_token and auth_token.startswith('Bearer '):
                 auth_token = auth_token[7:]
@@ -24,60 +54,195 @@ class SocketController:
                 if user_id:
                     user = self.user_service.get_user_by_id(user_id)
                     if user:
-                        login_user(user, remember=True)
-                        print(f'Client connected: {user.email}')
-                        emit('response', {'data': 'Connected to backend', 'authenticated': True})
+                        self.transport.login(user)
+                        logger.info(f'Client connected: {user.email}')
+                        self._emit('response', {'data': 'Connected to backend', 'authenticated': True})
                         return
             
             # Fallback: try to get user from session
+            current_user = self.transport.current_user
             if current_user.is_authenticated:
-                print(f'Client connected: {current_user.email}')
-                emit('response', {'data': 'Connected to backend', 'authenticated': True})
+                logger.info(f'Client connected: {current_user.email}')
+                self._emit('response', {'data': 'Connected to backend', 'authenticated': True})
                 return
             
-            print('Client connected: unauthenticated')
-            emit('response', {'data': 'Connected to backend', 'authenticated': False})
+            logger.info('Client connected: unauthenticated')
+            self._emit('response', {'data': 'Connected to backend', 'authenticated': False})
             
         except Exception as e:
-            print(f'Connection error: {e}')
-            emit('response', {'data': 'Connection error', 'authenticated': False})
+            logger.error(f'Connection error: {e}')
+            self._emit('response', {'data': 'Connection error', 'authenticated': False})
     
     def handle_disconnect(self):
         """Handle client disconnection"""
+        SOCKET_CONNECTIONS.dec()
+        self.emission_buffer.remove_client(self.transport.sid)
+        current_user = self.transport.current_user
         if current_user.is_authenticated:
-            print(f'Client disconnected: {current_user.email}')
+            logger.info(f'Client disconnected: {current_user.email}')
         else:
-            print('Client disconnected: unauthenticated')
+            logger.info('Client disconnected: unauthenticated')
     
     def _ensure_authenticated(self):
         """Ensure user is authenticated for socket operations"""
-        if not current_user.is_authenticated:
-            emit('error', {'message': 'Authentication required'})
+        if not self.transport.current_user.is_authenticated:
+            self._emit('error', {'message': 'Authentication required'})
+            return False
+        return True
+    
+    def _stream_to_room(self, conversation_id: str):
+        """Build an on_delta callback that feeds the room's clients on this worker, plus its cleanup"""
+        room = conversation_room(conversation_id)
+        streamed = {}
+        
+        def on_delta(message_id, llm_name, delta):
+            sids = streamed.setdefault(message_id, set())
+            # Only clients on this worker are known here; others still get the final message_update.
+            for sid in self.transport.room_members(room):
+                sids.add(sid)
+                self.emission_buffer.push(sid, conversation_id, message_id, llm_name, delta)
+        
+        def finish():
+            for message_id, sids in streamed.items():
+                for sid in sids:
+                    self.emission_buffer.finish(sid, message_id)
+        
+        return on_delta, finish
+    
+    def _payload(self, data, event: str) -> Optional[dict]:
+        """The event's payload if it is an object; otherwise reports the error and returns None"""
+        if not isinstance(data, dict):
+            self._emit('error', {'message': f'Invalid payload for {event} event'})
+            return None
+        return data
+    
+    def _authorize_conversation(self, conversation_id: str) -> bool:
+        """Ensure the conversation exists and belongs to the current user"""
+        conversation = self.conversation_service.get_conversation(conversation_id)
+        if not conversation or conversation.user_id != self.transport.current_user.id:
+            self._emit('error', {'message': f'Conversation {conversation_id} not found'})
             return False
         return True
     
+    def handle_join_conversation(self, data):
+        """Subscribe the client to updates for one conversation"""
+        try:
+            if not self._ensure_authenticated():
+                return
+            
+            data = self._payload(data, 'join_conversation')
+            if data is None:
+                return
+            conversation_id = data.get('conversation_id')
+            if not conversation_id:
+                self._emit('error', {'message': 'Missing conversation_id in join_conversation event'})
+                return
+            
+            if not self._authorize_conversation(conversation_id):
+                return
+            
+            self.transport.join_room(conversation_room(conversation_id))
+            self._emit('joined_conversation', {'conversation_id': conversation_id})
+            
+        except Exception as e:
+            self._emit('error', {'message': f'Failed to join conversation: {str(e)}'})
+    
+    def handle_sync_conversation(self, data):
+        """Rejoin a conversation after a reconnect and send what the client missed"""
+        try:
+            if not self._ensure_authenticated():
+                return
+            
+            data = self._payload(data, 'sync_conversation')
+            if data is None:
+                return
+            conversation_id = data.get('conversation_id')
+            if not conversation_id:
+                self._emit('error', {'message': 'Missing conversation_id in sync_conversation event'})
+                return
+            
+            if not self._authorize_conversation(conversation_id):
+                return
+            
+            self.transport.join_room(conversation_room(conversation_id))
+            
+            last_message_id = data.get('last_message_id')
+            if last_message_id:
+                conversation_data = self.conversation_service.get_conversation_details_since(
+                    conversation_id, last_message_id
+                )
+            else:
+                conversation_data = self.conversation_service.get_conversation_details(conversation_id)
+                conversation_data['since'] = None
+                conversation_data['partial'] = self.conversation_service.get_partial_generation(conversation_id)
+            
+            self._emit('conversation_sync', to_jsonable(conversation_data))
+            
+        except Exception as e:
+            self._emit('error', {'message': f'Failed to sync conversation: {str(e)}'})
+    
+    def handle_leave_conversation(self, data):
+        """Unsubscribe the client from a conversation"""
+        try:
+            data = self._payload(data, 'leave_conversation')
+            if data is None:
+                return
+            conversation_id = data.get('conversation_id')
+            if not conversation_id:
+                self._emit('error', {'message': 'Missing conversation_id in leave_conversation event'})
+                return
+            self.transport.leave_room(conversation_room(conversation_id))
+        except Exception as e:
+            self._emit('error', {'message': f'Failed to leave conversation: {str(e)}'})
+    
     def handle_trigger_next_llm(self, data):
         """Handle trigger_next_llm event"""
+        conversation_id = data.get('conversation_id') if isinstance(data, dict) else None
+        with tracer.start_trace("SocketController.handle_trigger_next_llm", conversation_id=conversation_id):
+            self._trigger_next_llm(data)
+    
+    def _trigger_next_llm(self, data):
         try:
             if not self._ensure_authenticated():
                 return
             
+            data = self._payload(data, 'trigger_next_llm')
+            if data is None:
+                return
             conversation_id = data.get('conversation_id')
             if not conversation_id:
-                emit('error', {'message': 'Missing conversation_id in trigger_next_llm event'})
+                self._emit('error', {'message': 'Missing conversation_id in trigger_next_llm event'})
+                return
+            
+            if not self._authorize_conversation(conversation_id):
                 return
+            # The requester always gets the reply, even if it never joined the room.
+            self.transport.join_room(conversation_room(conversation_id))
             
-            success, message, llm_message = self.conversation_service.trigger_next_llm(
-                conversation_id, current_user.id
-            )
+            on_delta, finish_stream = self._stream_to_room(conversation_id) if config.STREAMING_ENABLED else (None, None)
+            GENERATIONS_IN_FLIGHT.inc()
+            try:
+                success, message, llm_message = self.conversation_service.trigger_next_llm(
+                    conversation_id, self.transport.current_user.id, on_delta=on_delta
+                )
+            finally:
+                GENERATIONS_IN_FLIGHT.dec()
+                if finish_stream:
+                    finish_stream()
             
             if success and llm_message:
-                emit('message_update', llm_message.model_dump(mode='json'), broadcast=True)
+                self._emit('message_update', llm_message.model_dump(mode='json'), to=conversation_room(conversation_id))
+                conversation = self.conversation_service.get_conversation(conversation_id)
+                if conversation and conversation.halted_reason:
+                    self._emit('conversation_halted', {
+                        'conversation_id': conversation_id,
+                        'reason': conversation.halted_reason
+                    }, to=conversation_room(conversation_id))
             else:
-                emit('error', {'message': message})
+                self._emit('error', {'message': message})
                 
         except Exception as e:
-            emit('error', {'message': f'An unexpected error occurred while triggering the next LLM: {str(e)}'})
+            self._emit('error', {'message': f'An unexpected error occurred while triggering the next LLM: {str(e)}'})
     
     def handle_set_system_prompt(self, data):
         """Handle set_system_prompt event"""
@@ -85,22 +250,29 @@ class SocketController:
             if not self._ensure_authenticated():
                 return
             
+            data = self._payload(data, 'set_system_prompt')
+            if data is None:
+                return
             conversation_id = data.get('conversation_id')
             new_prompt = data.get('prompt')
 
             if not conversation_id or new_prompt is None:
-                emit('error', {'message': 'Missing conversation_id or prompt for set_system_prompt'})
+                self._emit('error', {'message': 'Missing conversation_id or prompt for set_system_prompt'})
+                return
+            
+            if not self._authorize_conversation(conversation_id):
                 return
+            self.transport.join_room(conversation_room(conversation_id))
 
             success = self.conversation_service.update_system_prompt(conversation_id, new_prompt)
             
             if success:
-                emit('system_prompt_updated', {
+                self._emit('system_prompt_updated', {
                     'conversation_id': conversation_id, 
                     'prompt': new_prompt
-                }, broadcast=True)
+                }, to=conversation_room(conversation_id))
             else:
-                emit('error', {'message': f'Conversation {conversation_id} not found for updating system prompt.'})
+                self._emit('error', {'message': f'Conversation {conversation_id} not found for updating system prompt.'})
 
         except Exception as e:
-            emit('error', {'message': f'Failed to set system prompt: {str(e)}'}) 
\ No newline at end of file
+            self._emit('error', {'message': f'Failed to set system prompt: {str(e)}'}) 
\ No newline at end of file
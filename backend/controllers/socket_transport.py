@@ -0,0 +1,56 @@
+from typing import Any, Callable, Iterable, Optional
+from flask import request, current_app
+from flask_login import current_user, login_user
+from flask_socketio import emit, join_room, leave_room
+
+class FlaskSocketTransport:
+    """Socket operations for SocketController when served by Flask-SocketIO.
+
+    SocketController only talks to the socket server through this interface, so
+    the same controller can run under another server (see asgi.py).
+    ``socketio`` is the Flask-SocketIO instance; emits outside a socket event
+    (the emission buffer's flusher thread) have no app context to look it up in.
+    """
+
+    def __init__(self, socketio=None):
+        self._socketio = socketio
+
+    @property
+    def socketio(self):
+        return self._socketio or current_app.extensions['socketio']
+
+    @property
+    def sid(self) -> str:
+        return request.sid
+
+    @property
+    def current_user(self):
+        return current_user
+
+    def auth_token(self) -> Optional[str]:
+        return request.args.get('token') or request.headers.get('Authorization')
+
+    def login(self, user) -> None:
+        login_user(user, remember=True)
+
+    def emit(self, event: str, data: Any, to: Optional[str] = None) -> None:
+        """Emit to the calling client, or to ``to`` (a room or sid) when given"""
+        if to is None:
+            emit(event, data)
+        else:
+            emit(event, data, to=to)
+
+    def emit_to_client(self, event: str, data: Any, to: str, callback: Optional[Callable] = None) -> None:
+        """Emit to one client from any context, optionally asking it for an ack"""
+        self.socketio.emit(event, data, to=to, callback=callback)
+
+    def join_room(self, room: str) -> None:
+        join_room(room)
+
+    def leave_room(self, room: str) -> None:
+        leave_room(room)
+
+    def room_members(self, room: str) -> Iterable[str]:
+        """Sids of the room's clients connected to this worker"""
+        manager = self.socketio.server.manager
+        return [sid for sid, _ in list(manager.get_participants('/', room))]
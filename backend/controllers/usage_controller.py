@@ -0,0 +1,20 @@
+from flask import jsonify, request
+from flask_login import current_user
+from services.usage_service import UsageService
+
+MAX_USAGE_DAYS = 366
+
+class UsageController:
+    def __init__(self, usage_service: UsageService):
+        self.usage_service = usage_service
+    
+    def get_usage(self):
+        """Token and cost totals for the current user, with ?days=N of daily aggregates"""
+        try:
+            days = request.args.get('days', default=30, type=int)
+            if days is None or not 1 <= days <= MAX_USAGE_DAYS:
+                return jsonify({"error": f"days must be between 1 and {MAX_USAGE_DAYS}"}), 400
+            
+            return jsonify(self.usage_service.get_usage_report(current_user.id, days=days))
+        except Exception as e:
+            return jsonify({"error": f"Failed to fetch usage: {str(e)}"}), 500
@@ -2,16 +2,9 @@ from flask import jsonify, request, session
 from flask_login import login_user, logout_user, login_required, current_user
 from services.user_service import UserService
 from services.auth_service import AuthService
+from services.password_hasher import PasswordHasherBusy
 import logging
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),  # Log to stdout for Cloud Run
-        logging.FileHandler('app.log')  # Also log to file
-    ]
-)
 logger = logging.getLogger(__name__)
 class UserController:
     def __init__(self, user_service: UserService):
@@ -35,16 +28,15 @@ class UserController:
             else:
                 return jsonify({"error": message}), 400
 
+        except PasswordHasherBusy as e:
+            return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     
     def login(self):
         """Handle user login"""
         if request.method == "GET":
-            logger.info(f"Current user: {current_user}")
-            logger.info(f"Session contents: {dict(session)}")
-            logger.info(f"User ID in session: {session.get('user_id')}")
-            logger.info(f"Session ID: {session.get('_id')}")
+            logger.debug(f"Login check: authenticated={current_user.is_authenticated}, session user={session.get('user_id')}")
             
             if current_user.is_authenticated:
                 return jsonify({
@@ -77,8 +69,6 @@ class UserController:
                 session['user_id'] = user.id
                 
                 logger.info(f"User logged in successfully: {user.id}")
-                logger.info(f"Session after login: {dict(session)}")
-                logger.info(f"Current user authenticated: {current_user.is_authenticated}")
                 
                 # Generate JWT token for WebSocket authentication
                 access_token = self.auth_service.create_access_token(user)
@@ -95,6 +85,8 @@ class UserController:
             else:
                 return jsonify({"error": message}), 401
 
+        except PasswordHasherBusy as e:
+            return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     
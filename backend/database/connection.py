@@ -1,10 +1,37 @@
 from pymongo import MongoClient
 from config import config
+from database.monitoring import CommandMonitor
+
+def _pool_options() -> dict:
+    """Connection pool options shared by the pymongo and motor clients"""
+    options = {
+        "maxPoolSize": config.MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": config.MONGODB_MIN_POOL_SIZE,
+    }
+    if config.MONGODB_MAX_IDLE_TIME_MS is not None:
+        options["maxIdleTimeMS"] = config.MONGODB_MAX_IDLE_TIME_MS
+    if config.MONGODB_WAIT_QUEUE_TIMEOUT_MS is not None:
+        options["waitQueueTimeoutMS"] = config.MONGODB_WAIT_QUEUE_TIMEOUT_MS
+    if config.MONGODB_COMMAND_MONITORING:
+        options["event_listeners"] = [CommandMonitor(slow_query_ms=config.MONGODB_SLOW_QUERY_MS)]
+    return options
+
+MONGOMOCK_SCHEME = 'mongomock://'
+
+def _mongomock_client():
+    """In-memory stand-in for MongoDB (load tests and local experiments), one store per process"""
+    try:
+        import mongomock
+    except ImportError:
+        raise RuntimeError("MONGODB_URI=mongomock:// needs the mongomock package (pip install -r loadtest/requirements.txt)")
+    return mongomock.MongoClient()
 
 class DatabaseConnection:
     _instance = None
     _client = None
     _db = None
+    _async_client = None
+    _async_db = None
     
     def __new__(cls):
         if cls._instance is None:
@@ -13,7 +40,10 @@ class DatabaseConnection:
     
     def __init__(self):
         if not self._client:
-            self._client = MongoClient(config.MONGODB_URI)
+            if config.MONGODB_URI.startswith(MONGOMOCK_SCHEME):
+                self._client = _mongomock_client()
+            else:
+                self._client = MongoClient(config.MONGODB_URI, **_pool_options())
             self._db = self._client.llm_chat_app
     
     @property
@@ -24,11 +54,33 @@ class DatabaseConnection:
     def db(self):
         return self._db
     
+    @property
+    def async_client(self):
+        """Motor client for DB_DRIVER=async, created on first use so sync deployments never import motor.
+
+        Call it from the event loop that will use it.
+        """
+        if self._async_client is None:
+            from motor.motor_asyncio import AsyncIOMotorClient
+            self._async_client = AsyncIOMotorClient(config.MONGODB_URI, **_pool_options())
+            self._async_db = self._async_client.llm_chat_app
+        return self._async_client
+    
+    @property
+    def async_db(self):
+        if self._async_db is None:
+            self.async_client
+        return self._async_db
+    
     def close(self):
         if self._client:
             self._client.close()
             self._client = None
             self._db = None
+        if self._async_client:
+            self._async_client.close()
+            self._async_client = None
+            self._async_db = None
 
 # Global database instance
 db_connection = DatabaseConnection() 
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""
+pymongo command monitoring.
+
+Every command the driver sends is timed per command name and collection,
+commands slower than the configured threshold are logged, and the commands
+issued while a request or socket event is being handled are counted so
+repeated lookups against the same collection show up in its log line.
+"""
+import contextvars
+import logging
+import threading
+from typing import Dict, Optional
+from pymongo import monitoring
+
+from metrics import DB_COMMAND_LATENCY, DB_COMMAND_FAILURES
+
+logger = logging.getLogger("database.slow_queries")
+
+# Commands that are not user queries and would only add noise to per-request counts
+IGNORED_COMMANDS = {'hello', 'ismaster', 'isMaster', 'ping', 'saslStart', 'saslContinue', 'endSessions', 'buildInfo'}
+
+class QueryStats:
+    """Commands issued while one request or socket event was handled"""
+
+    __slots__ = ('count', 'duration_ms', 'by_collection')
+
+    def __init__(self):
+        self.count = 0
+        self.duration_ms = 0.0
+        self.by_collection: Dict[str, int] = {}
+
+    def record(self, collection: str, duration_ms: float) -> None:
+        self.count += 1
+        self.duration_ms += duration_ms
+        self.by_collection[collection] = self.by_collection.get(collection, 0) + 1
+
+    def to_dict(self) -> Dict:
+        return {
+            "query_count": self.count,
+            "query_ms": round(self.duration_ms, 2),
+            "queries_by_collection": dict(self.by_collection),
+        }
+
+_query_stats: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar('query_stats', default=None)
+
+def start_query_tracking() -> contextvars.Token:
+    """Count the commands issued from the current request or event from now on"""
+    return _query_stats.set(QueryStats())
+
+def stop_query_tracking(token: contextvars.Token) -> Optional[QueryStats]:
+    stats = _query_stats.get()
+    _query_stats.reset(token)
+    return stats
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _query_stats.get()
+
+
+def _collection_name(command_name: str, command: dict) -> str:
+    value = command.get(command_name)
+    if command_name == 'getMore':
+        value = command.get('collection')
+    return value if isinstance(value, str) else '-'
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """Records duration per command and collection and logs slow commands"""
+
+    def __init__(self, slow_query_ms: float = 100):
+        self.slow_query_ms = slow_query_ms
+        self._started: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        # The succeeded/failed events do not carry the command, so remember its collection
+        with self._lock:
+            self._started[(event.connection_id, event.request_id)] = _collection_name(event.command_name, event.command)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finished(event, failed=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finished(event, failed=True)
+
+    def _finished(self, event, failed: bool) -> None:
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        with self._lock:
+            collection = self._started.pop((event.connection_id, event.request_id), '-')
+        duration_ms = event.duration_micros / 1000
+        command = event.command_name
+
+        DB_COMMAND_LATENCY.observe(duration_ms / 1000, command=command, collection=collection)
+        if failed:
+            DB_COMMAND_FAILURES.inc(command=command, collection=collection)
+
+        stats = _query_stats.get()
+        if stats is not None:
+            stats.record(collection, duration_ms)
+
+        if duration_ms >= self.slow_query_ms:
+            logger.warning(
+                f"Slow MongoDB command: {command} on {collection} took {duration_ms:.1f} ms",
+                extra={"command": command, "collection": collection, "duration_ms": round(duration_ms, 2), "failed": failed}
+            )
@@ -0,0 +1,82 @@
+"""
+HTTP validators (ETag / Last-Modified) and response compression.
+"""
+import gzip
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+from flask import request, Response
+from werkzeug.http import is_resource_modified
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript'}
+
+def make_etag(*parts) -> str:
+    """Opaque validator built from the values that identify a representation"""
+    raw = "|".join("" if part is None else str(part) for part in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:32]
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """MongoDB hands back naive UTC datetimes; HTTP dates need them timezone-aware"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def is_not_modified(etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """True when the request's If-None-Match / If-Modified-Since still match"""
+    return not is_resource_modified(request.environ, etag=etag, last_modified=last_modified)
+
+def add_validators(response: Response, etag: str, last_modified: Optional[datetime] = None) -> Response:
+    """Attach validators and ask clients to revalidate before reusing the body"""
+    # Weak because the body may be re-encoded by compression
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def not_modified_response(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    return add_validators(Response(status=304), etag, last_modified)
+
+def configure_compression(app, min_size: int = 1024, level: int = 6):
+    """Compress responses above ``min_size`` bytes with brotli or gzip, per Accept-Encoding"""
+    encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+    logger.info(f"Response compression enabled for bodies >= {min_size} bytes ({', '.join(encodings)})")
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        ):
+            return response
+
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        encoding = request.accept_encodings.best_match(encodings)
+        if encoding == 'br':
+            # brotli quality runs 0-11; keep the same relative effort as the gzip level
+            compressed = brotli.compress(data, quality=min(11, max(0, level)))
+        elif encoding == 'gzip':
+            compressed = gzip.compress(data, compresslevel=level)
+        else:
+            response.vary.add('Accept-Encoding')
+            return response
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
@@ -0,0 +1,71 @@
+"""
+Fast JSON provider for the Flask application.
+
+Uses orjson when it is installed and falls back to the standard library
+encoder otherwise. Unlike Flask's default provider, datetimes are encoded as
+ISO 8601 UTC strings ending in ``Z``, whether they are naive (as pymongo
+returns them) or aware (as new models and buffered messages carry them), so
+every path produces the same timestamp format as ``model_dump(mode='json')``
+on an aware datetime.
+"""
+import json
+import uuid
+from datetime import date, datetime, timezone
+from typing import Any
+from flask.json.provider import JSONProvider
+from pydantic import BaseModel
+
+try:
+    import orjson
+    # Naive datetimes are UTC (pymongo), and UTC is written as "Z" rather than "+00:00"
+    _ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """Encode the types that show up in our responses but are not plain JSON"""
+    if isinstance(obj, datetime):
+        if obj.tzinfo is None:
+            obj = obj.replace(tzinfo=timezone.utc)
+        return obj.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode='json')
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def to_jsonable(obj: Any) -> Any:
+    """Convert datetimes and other rich values to plain JSON types, e.g. for Socket.IO payloads"""
+    if orjson is not None:
+        return orjson.loads(orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS))
+    return json.loads(json.dumps(obj, default=_default))
+
+
+class FastJSONProvider(JSONProvider):
+    """JSON provider backed by orjson, used for all ``jsonify`` responses"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return self._dump_bytes(obj, **kwargs).decode('utf-8')
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dump_bytes(obj), mimetype='application/json')
+
+    def _dump_bytes(self, obj: Any, **kwargs: Any) -> bytes:
+        if orjson is not None and not kwargs:
+            try:
+                return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+            except TypeError:
+                # e.g. non-string dict keys or integers wider than 64 bits
+                pass
+        kwargs.setdefault('default', _default)
+        return json.dumps(obj, **kwargs).encode('utf-8')
@@ -1,8 +1,11 @@
 # This package will contain the client integrations for different LLMs.
-from .claude_client import get_claude_response
-from .gemini_client import get_gemini_response
-from .chatgpt_client import get_chatgpt_response
-from .deepseek_client import get_deepseek_response
+from .claude_client import get_claude_response, stream_claude_response
+from .gemini_client import get_gemini_response, stream_gemini_response
+from .chatgpt_client import get_chatgpt_response, stream_chatgpt_response
+from .deepseek_client import get_deepseek_response, stream_deepseek_response
+from .mock_client import get_mock_response, stream_mock_response
+from .pricing import compute_cost, MODEL_PRICES, PROVIDER_MODELS
+from .batch_api import BatchRequest, BatchResult, get_batch_backend
 
 # You can also create a unified interface or factory function here if needed
 # For example:
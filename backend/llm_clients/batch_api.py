@@ -0,0 +1,245 @@
+"""
+Asynchronous provider batch APIs.
+
+A backend takes many independent requests for one provider, submits them as
+one batch job, reports whether the job has finished and returns one result
+per request, matched by ``custom_id``. Batch jobs can take minutes to hours
+and are billed at a discount (see pricing.BATCH_DISCOUNT), so they suit
+offline runs only.
+
+OpenAI and Anthropic have batch endpoints; ``LocalBatchBackend`` is an
+in-process stand-in with the same interface that runs the regular client,
+used for providers without one and in LLM_MOCK_MODE.
+"""
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from .usage import record_usage
+from .retries import retry_counting_hooks
+from .chatgpt_client import (
+    MODEL_NAME as OPENAI_MODEL, MAX_TOKENS as OPENAI_MAX_TOKENS, _build_messages as build_openai_messages
+)
+from .claude_client import MODEL_NAME as CLAUDE_MODEL, MAX_TOKENS as CLAUDE_MAX_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Batch job states reported by BatchBackend.status
+PENDING = "pending"
+COMPLETED = "completed"
+FAILED = "failed"
+
+class BatchRequest(NamedTuple):
+    custom_id: str
+    prompt: str
+    system_prompt: Optional[str]
+    chat_history: List[Dict]
+
+class BatchResult(NamedTuple):
+    custom_id: str
+    text: Optional[str]
+    usage: Dict
+    error: Optional[str] = None
+
+
+class BatchBackend:
+    """Submits requests for one provider as a batch job; all methods take the API key to use"""
+    provider: str = ""
+    # Largest number of requests in one job
+    max_batch_size: int = 10000
+
+    def submit(self, api_key: str, requests: List[BatchRequest]) -> str:
+        """Start a batch job and return its id"""
+        raise NotImplementedError
+
+    def status(self, api_key: str, batch_id: str) -> str:
+        """PENDING, COMPLETED or FAILED"""
+        raise NotImplementedError
+
+    def results(self, api_key: str, batch_id: str) -> List[BatchResult]:
+        """One result per submitted request, once the job is COMPLETED"""
+        raise NotImplementedError
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """Chat completions through the OpenAI Batch API (JSONL input file, 24 h completion window)"""
+    provider = "openai"
+    max_batch_size = 50000
+
+    def __init__(self, model: str = OPENAI_MODEL, max_tokens: int = OPENAI_MAX_TOKENS):
+        self.model = model
+        self.max_tokens = max_tokens
+
+    def _client(self, api_key: str):
+        from openai import OpenAI, DefaultHttpxClient
+        return OpenAI(api_key=api_key, http_client=DefaultHttpxClient(event_hooks=retry_counting_hooks(self.provider)))
+
+    def submit(self, api_key: str, requests: List[BatchRequest]) -> str:
+        lines = [json.dumps({
+            "custom_id": request.custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": self.model,
+                "messages": build_openai_messages(request.prompt, request.system_prompt, request.chat_history),
+                "max_tokens": self.max_tokens,
+            },
+        }) for request in requests]
+        client = self._client(api_key)
+        input_file = client.files.create(file=("batch.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch")
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        return batch.id
+
+    def status(self, api_key: str, batch_id: str) -> str:
+        batch = self._client(api_key).batches.retrieve(batch_id)
+        if batch.status == "completed":
+            return COMPLETED
+        if batch.status in ("failed", "expired", "cancelled"):
+            return FAILED
+        return PENDING
+
+    def results(self, api_key: str, batch_id: str) -> List[BatchResult]:
+        client = self._client(api_key)
+        batch = client.batches.retrieve(batch_id)
+        results = []
+        # Successful requests land in the output file, rejected ones in the error file
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in client.files.content(file_id).text.splitlines():
+                if line.strip():
+                    results.append(self._parse_line(json.loads(line)))
+        return results
+
+    @staticmethod
+    def _parse_line(line: Dict) -> BatchResult:
+        custom_id = line["custom_id"]
+        response = line.get("response") or {}
+        body = response.get("body") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            error = line.get("error") or body.get("error") or {"status_code": response.get("status_code")}
+            return BatchResult(custom_id, None, {}, f"Error from ChatGPT: {error}")
+        usage = {}
+        body_usage = body.get("usage") or {}
+        cached = (body_usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        record_usage(usage, body_usage.get("prompt_tokens"), body_usage.get("completion_tokens"), cached)
+        return BatchResult(custom_id, body["choices"][0]["message"]["content"], usage)
+
+
+class AnthropicBatchBackend(BatchBackend):
+    """Messages through the Anthropic Message Batches API"""
+    provider = "claude"
+    max_batch_size = 100000
+
+    def __init__(self, model: str = CLAUDE_MODEL, max_tokens: int = CLAUDE_MAX_TOKENS):
+        self.model = model
+        self.max_tokens = max_tokens
+
+    def _client(self, api_key: str):
+        import anthropic
+        return anthropic.Anthropic(
+            api_key=api_key, http_client=anthropic.DefaultHttpxClient(event_hooks=retry_counting_hooks(self.provider))
+        )
+
+    def submit(self, api_key: str, requests: List[BatchRequest]) -> str:
+        batch = self._client(api_key).messages.batches.create(requests=[{
+            "custom_id": request.custom_id,
+            "params": {
+                "model": self.model,
+                "max_tokens": self.max_tokens,
+                "system": request.system_prompt or "You are a helpful assistant.",
+                "messages": list(request.chat_history or []) + [{"role": "user", "content": request.prompt}],
+            },
+        } for request in requests])
+        return batch.id
+
+    def status(self, api_key: str, batch_id: str) -> str:
+        # 'ended' covers succeeded, errored, canceled and expired requests; results tell them apart
+        batch = self._client(api_key).messages.batches.retrieve(batch_id)
+        return COMPLETED if batch.processing_status == "ended" else PENDING
+
+    def results(self, api_key: str, batch_id: str) -> List[BatchResult]:
+        results = []
+        for entry in self._client(api_key).messages.batches.results(batch_id):
+            result = entry.result
+            if result.type != "succeeded":
+                error = getattr(result, "error", None) or result.type
+                results.append(BatchResult(entry.custom_id, None, {}, f"Error from Claude: {error}"))
+                continue
+            message = result.message
+            usage = {}
+            cache_read = getattr(message.usage, "cache_read_input_tokens", None) or 0
+            cache_write = getattr(message.usage, "cache_creation_input_tokens", None) or 0
+            record_usage(usage, message.usage.input_tokens + cache_read + cache_write, message.usage.output_tokens, cache_read)
+            text = next((block.text for block in message.content if hasattr(block, "text")), None)
+            if text is None:
+                results.append(BatchResult(entry.custom_id, None, usage, "Error: No text content found in Claude's response."))
+            else:
+                results.append(BatchResult(entry.custom_id, text, usage))
+        return results
+
+
+class LocalBatchBackend(BatchBackend):
+    """In-process stand-in: runs each request through a regular client call on a small pool.
+
+    Jobs complete as soon as every request has run, which makes it usable both
+    for providers without a batch API and for exercising the batch path offline.
+    """
+
+    def __init__(self, call: Callable, provider: str = "local", max_workers: int = 4):
+        self.call = call
+        self.provider = provider
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"batch-{provider}")
+        self._jobs: Dict[str, List] = {}
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def submit(self, api_key: str, requests: List[BatchRequest]) -> str:
+        futures = [(request.custom_id, self._pool.submit(self._run, api_key, request)) for request in requests]
+        with self._lock:
+            self._next_id += 1
+            batch_id = f"local-{self.provider}-{self._next_id}"
+            self._jobs[batch_id] = futures
+        return batch_id
+
+    def _run(self, api_key: str, request: BatchRequest) -> BatchResult:
+        usage = {}
+        try:
+            text = self.call(api_key=api_key, prompt=request.prompt, system_prompt=request.system_prompt,
+                             chat_history=request.chat_history, usage=usage)
+        except Exception as e:
+            return BatchResult(request.custom_id, None, usage, str(e))
+        return BatchResult(request.custom_id, text, usage)
+
+    def status(self, api_key: str, batch_id: str) -> str:
+        with self._lock:
+            futures = self._jobs.get(batch_id)
+        if futures is None:
+            return FAILED
+        return COMPLETED if all(future.done() for _, future in futures) else PENDING
+
+    def results(self, api_key: str, batch_id: str) -> List[BatchResult]:
+        with self._lock:
+            futures = self._jobs.pop(batch_id, [])
+        return [future.result() for _, future in futures]
+
+
+BATCH_BACKENDS: Dict[str, Callable[[], BatchBackend]] = {
+    "openai": OpenAIBatchBackend,
+    "claude": AnthropicBatchBackend,
+}
+
+def get_batch_backend(provider: str, fallback_call: Optional[Callable] = None, local: bool = False) -> Optional[BatchBackend]:
+    """The provider's batch backend, or a LocalBatchBackend over ``fallback_call`` when it has none or ``local`` is set"""
+    backend = BATCH_BACKENDS.get(provider)
+    if backend is not None and not local:
+        return backend()
+    if fallback_call is not None:
+        return LocalBatchBackend(fallback_call, provider=provider)
+    return None
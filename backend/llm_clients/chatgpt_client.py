@@ -1,31 +1,70 @@
-from openai import OpenAI
+from openai import OpenAI, DefaultHttpxClient
+from .usage import record_usage
+from .retries import retry_counting_hooks
 
 MODEL_NAME = "gpt-4o-mini-2024-07-18"
+# Reply length cap, shared with the batch backend
+MAX_TOKENS = 5000
 
-def get_chatgpt_response(api_key, prompt, system_prompt="You are a helpful assistant.", chat_history=None, max_tokens=5000):
+def _build_messages(prompt, system_prompt, chat_history):
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    
+    if chat_history:
+        messages.extend(chat_history)
+        
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+def _record_openai_usage(usage, response_usage):
+    details = getattr(response_usage, 'prompt_tokens_details', None)
+    cached = getattr(details, 'cached_tokens', None) if details else None
+    record_usage(usage, response_usage.prompt_tokens, response_usage.completion_tokens, cached)
+
+def get_chatgpt_response(api_key, prompt, system_prompt="You are a helpful assistant.", chat_history=None, max_tokens=MAX_TOKENS, usage=None):
     if not api_key:
         return "OpenAI API key not configured."
     try:
-        client = OpenAI(api_key=api_key)
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        
-        if chat_history:
-            messages.extend(chat_history)
-            
-        messages.append({"role": "user", "content": prompt})
+        client = OpenAI(api_key=api_key, http_client=DefaultHttpxClient(event_hooks=retry_counting_hooks("openai")))
+        messages = _build_messages(prompt, system_prompt, chat_history)
         
         response = client.chat.completions.create(
             model=MODEL_NAME,
             messages=messages,
             max_tokens=max_tokens
         )
+        if response.usage:
+            _record_openai_usage(usage, response.usage)
         return response.choices[0].message.content
     except Exception as e:
         print(f"Error getting ChatGPT response: {e}")
         return f"Error from ChatGPT: {str(e)}"
 
+def stream_chatgpt_response(api_key, prompt, system_prompt="You are a helpful assistant.", chat_history=None, max_tokens=MAX_TOKENS, usage=None):
+    """Same as get_chatgpt_response but yields the reply as text deltas"""
+    if not api_key:
+        yield "OpenAI API key not configured."
+        return
+    try:
+        client = OpenAI(api_key=api_key, http_client=DefaultHttpxClient(event_hooks=retry_counting_hooks("openai")))
+        stream = client.chat.completions.create(
+            model=MODEL_NAME,
+            messages=_build_messages(prompt, system_prompt, chat_history),
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            # The usage chunk comes last and has no choices
+            if getattr(chunk, 'usage', None):
+                _record_openai_usage(usage, chunk.usage)
+    except Exception as e:
+        print(f"Error streaming ChatGPT response: {e}")
+        yield f"Error from ChatGPT: {str(e)}"
+
 if __name__ == '__main__':
     if OPENAI_API_KEY:
         test_prompt = "Hello, ChatGPT! Can you write a short poem about coding?"
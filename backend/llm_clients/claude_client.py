@@ -1,12 +1,24 @@
 import anthropic
+from .usage import record_usage
+from .retries import retry_counting_hooks
 
 MODEL_NAME = "claude-3-5-haiku-20241022"
+# Reply length cap, shared with the batch backend
+MAX_TOKENS = 1024
 
-def get_claude_response(api_key, prompt, system_prompt="You are a helpful assistant.", chat_history=None, max_tokens=1024):
+def _record_claude_usage(usage, response_usage):
+    # Anthropic reports cache reads and writes separately from the uncached input tokens
+    cache_read = getattr(response_usage, 'cache_read_input_tokens', None) or 0
+    cache_write = getattr(response_usage, 'cache_creation_input_tokens', None) or 0
+    record_usage(usage, response_usage.input_tokens + cache_read + cache_write, response_usage.output_tokens, cache_read)
+
+def get_claude_response(api_key, prompt, system_prompt="You are a helpful assistant.", chat_history=None, max_tokens=MAX_TOKENS, usage=None):
     if not api_key:
         return "Claude API key not configured."
     try:
-        client = anthropic.Anthropic(api_key=api_key)
+        client = anthropic.Anthropic(
+            api_key=api_key, http_client=anthropic.DefaultHttpxClient(event_hooks=retry_counting_hooks("claude"))
+        )
         messages_for_api = []
         if chat_history:
             messages_for_api.extend(chat_history)
@@ -19,6 +31,8 @@ def get_claude_response(api_key, prompt, system_prompt="You are a helpful assist
             system=system_prompt,
             messages=messages_for_api
         )
+        if response.usage:
+            _record_claude_usage(usage, response.usage)
         if response.content and isinstance(response.content, list) and len(response.content) > 0:
             if hasattr(response.content[0], 'text'):
                  return response.content[0].text
@@ -27,6 +41,33 @@ def get_claude_response(api_key, prompt, system_prompt="You are a helpful assist
         print(f"Error getting Claude response: {e}")
         return f"Error from Claude: {str(e)}"
 
+def stream_claude_response(api_key, prompt, system_prompt="You are a helpful assistant.", chat_history=None, max_tokens=MAX_TOKENS, usage=None):
+    """Same as get_claude_response but yields the reply as text deltas"""
+    if not api_key:
+        yield "Claude API key not configured."
+        return
+    try:
+        client = anthropic.Anthropic(
+            api_key=api_key, http_client=anthropic.DefaultHttpxClient(event_hooks=retry_counting_hooks("claude"))
+        )
+        messages_for_api = list(chat_history) if chat_history else []
+        messages_for_api.append({"role": "user", "content": prompt})
+
+        with client.messages.stream(
+            model=MODEL_NAME,
+            max_tokens=max_tokens,
+            system=system_prompt,
+            messages=messages_for_api
+        ) as stream:
+            for text in stream.text_stream:
+                yield text
+            final_message = stream.get_final_message()
+            if final_message.usage:
+                _record_claude_usage(usage, final_message.usage)
+    except Exception as e:
+        print(f"Error streaming Claude response: {e}")
+        yield f"Error from Claude: {str(e)}"
+
 if __name__ == '__main__':
     if ANTHROPIC_API_KEY:
         test_prompt = "Hello, Claude! Tell me a fun fact about AI."
@@ -1,12 +1,15 @@
+import json
 import requests
+from .usage import record_usage
+from .retries import retrying_session
 
 DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
 MODEL_NAME = "deepseek-chat"
 
-def get_deepseek_response(api_key, prompt, system_prompt="You are a helpful assistant.", chat_history=None, max_tokens=1024):
-    if not api_key:
-        return "Deepseek API key not configured."
-    
+# Shared so calls reuse connections; retries connection errors and 408/409/429/5xx like the SDKs do
+_session = retrying_session("deepseek")
+
+def _build_request(api_key, prompt, system_prompt, chat_history, max_tokens):
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
@@ -27,12 +30,29 @@ def get_deepseek_response(api_key, prompt, system_prompt="You are a helpful assi
         "messages": messages,
         "max_tokens": max_tokens,
     }
+    return headers, payload
+
+def _record_deepseek_usage(usage, response_usage):
+    record_usage(
+        usage,
+        response_usage.get("prompt_tokens"),
+        response_usage.get("completion_tokens"),
+        response_usage.get("prompt_cache_hit_tokens")
+    )
+
+def get_deepseek_response(api_key, prompt, system_prompt="You are a helpful assistant.", chat_history=None, max_tokens=1024, usage=None):
+    if not api_key:
+        return "Deepseek API key not configured."
+    
+    headers, payload = _build_request(api_key, prompt, system_prompt, chat_history, max_tokens)
 
     try:
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=payload)
+        response = _session.post(DEEPSEEK_API_URL, headers=headers, json=payload)
         response.raise_for_status()
         
         response_json = response.json()
+        if response_json.get("usage"):
+            _record_deepseek_usage(usage, response_json["usage"])
         if response_json.get("choices") and len(response_json["choices"]) > 0:
             return response_json["choices"][0]["message"]["content"]
         else:
@@ -47,6 +67,41 @@ def get_deepseek_response(api_key, prompt, system_prompt="You are a helpful assi
         print(f"Generic error in Deepseek client: {e}")
         return f"Error from Deepseek: {str(e)}"
 
+def stream_deepseek_response(api_key, prompt, system_prompt="You are a helpful assistant.", chat_history=None, max_tokens=1024, usage=None):
+    """Same as get_deepseek_response but yields the reply as text deltas (OpenAI-compatible SSE)"""
+    if not api_key:
+        yield "Deepseek API key not configured."
+        return
+    
+    headers, payload = _build_request(api_key, prompt, system_prompt, chat_history, max_tokens)
+    payload["stream"] = True
+    payload["stream_options"] = {"include_usage": True}
+
+    try:
+        with _session.post(DEEPSEEK_API_URL, headers=headers, json=payload, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                if event.get("usage"):
+                    _record_deepseek_usage(usage, event["usage"])
+                choices = event.get("choices") or []
+                if choices and choices[0].get("delta", {}).get("content"):
+                    yield choices[0]["delta"]["content"]
+    except requests.exceptions.RequestException as e:
+        print(f"Error streaming Deepseek response: {e}")
+        if e.response is not None:
+            yield f"Error from Deepseek: {e.response.status_code} - {e.response.text}"
+        else:
+            yield f"Error from Deepseek: {str(e)}"
+    except Exception as e:
+        print(f"Generic error in Deepseek stream: {e}")
+        yield f"Error from Deepseek: {str(e)}"
+
 if __name__ == '__main__':
     if DEEPSEEK_API_KEY:
         test_prompt = "Hello, Deepseek! Write a python function to sort a list."
@@ -1,43 +1,84 @@
+import logging
 from google import genai
 from google.genai import types
+from .usage import record_usage
 
 MODEL_NAME = "gemini-2.5-flash-preview-05-20" 
 
-def get_gemini_response(api_key, prompt, system_prompt=None, chat_history=None):
+logger = logging.getLogger(__name__)
+
+def _build_prompt_content(prompt, chat_history):
+    # Build the conversation history as a string
+    conversation = []
+    
+    if chat_history:
+        for msg in chat_history:
+            role = msg.get("role", "user")
+            parts = msg.get("parts", [])
+            if isinstance(parts, list):
+                content = " ".join(str(p) for p in parts)
+            else:
+                content = str(parts)
+            conversation.append(f"{role}: {content}")
+
+    # Add the current prompt
+    conversation.append(f"user: {prompt}")
+    
+    # Join all messages with newlines
+    return "\n".join(conversation)
+
+def _record_gemini_usage(usage, metadata):
+    record_usage(
+        usage,
+        metadata.prompt_token_count,
+        metadata.candidates_token_count,
+        getattr(metadata, 'cached_content_token_count', None)
+    )
+
+def get_gemini_response(api_key, prompt, system_prompt=None, chat_history=None, usage=None):
     if not api_key:
         return "Gemini API key not configured."
     try:
         client = genai.Client(api_key=api_key)
-        # Build the conversation history as a string
-        conversation = []
-        
-        if chat_history:
-            for msg in chat_history:
-                role = msg.get("role", "user")
-                parts = msg.get("parts", [])
-                if isinstance(parts, list):
-                    content = " ".join(str(p) for p in parts)
-                else:
-                    content = str(parts)
-                conversation.append(f"{role}: {content}")
-
-        # Add the current prompt
-        conversation.append(f"user: {prompt}")
-        
-        # Join all messages with newlines
-        full_prompt_content = "\n".join(conversation)
+        full_prompt_content = _build_prompt_content(prompt, chat_history)
         
         current_client = client
 
-        print(f"[Gemini Client] Generating content with prompt: {full_prompt_content}")
+        logger.debug(f"Generating Gemini content for a {len(full_prompt_content)} character prompt")
         response = current_client.models.generate_content(
             model=MODEL_NAME,
             contents=full_prompt_content,
             config=types.GenerateContentConfig(system_instruction=system_prompt)
         )
+        if response.usage_metadata:
+            _record_gemini_usage(usage, response.usage_metadata)
         return response.text
     except Exception as e:
         print(f"Error getting Gemini response: {e}")
         if hasattr(e, 'message'):
             return f"Error from Gemini: {e.message}"
         return f"Error from Gemini: {str(e)}"
+
+def stream_gemini_response(api_key, prompt, system_prompt=None, chat_history=None, usage=None):
+    """Same as get_gemini_response but yields the reply as text deltas"""
+    if not api_key:
+        yield "Gemini API key not configured."
+        return
+    try:
+        client = genai.Client(api_key=api_key)
+        for chunk in client.models.generate_content_stream(
+            model=MODEL_NAME,
+            contents=_build_prompt_content(prompt, chat_history),
+            config=types.GenerateContentConfig(system_instruction=system_prompt)
+        ):
+            if chunk.text:
+                yield chunk.text
+            # Each chunk carries the running totals; the last one wins
+            if chunk.usage_metadata:
+                _record_gemini_usage(usage, chunk.usage_metadata)
+    except Exception as e:
+        print(f"Error streaming Gemini response: {e}")
+        if hasattr(e, 'message'):
+            yield f"Error from Gemini: {e.message}"
+        else:
+            yield f"Error from Gemini: {str(e)}"
\ No newline at end of file
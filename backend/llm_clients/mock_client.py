@@ -0,0 +1,38 @@
+import time
+from config import config
+from .usage import record_usage
+
+MODEL_NAME = "mock"
+
+_WORDS = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit",
+          "sed", "do", "eiusmod", "tempor", "incididunt", "ut", "labore", "et", "dolore")
+
+def _reply_tokens(prompt):
+    count = config.LLM_MOCK_REPLY_TOKENS
+    # Deterministic per prompt so runs are comparable
+    offset = len(prompt or "")
+    return [_WORDS[(offset + i) % len(_WORDS)] for i in range(count)]
+
+def _record_mock_usage(usage, prompt, system_prompt, chat_history, output_tokens):
+    history_chars = sum(len(str(msg.get("content") or msg.get("parts") or "")) for msg in chat_history or [])
+    input_chars = len(prompt or "") + len(system_prompt or "") + history_chars
+    record_usage(usage, max(1, input_chars // 4), output_tokens)
+
+def get_mock_response(api_key, prompt, system_prompt=None, chat_history=None, usage=None):
+    """Stand-in for a provider: waits LLM_MOCK_DURATION_MS and returns LLM_MOCK_REPLY_TOKENS words"""
+    tokens = _reply_tokens(prompt)
+    time.sleep(config.LLM_MOCK_DURATION_MS / 1000)
+    _record_mock_usage(usage, prompt, system_prompt, chat_history, len(tokens))
+    return " ".join(tokens)
+
+def stream_mock_response(api_key, prompt, system_prompt=None, chat_history=None, usage=None):
+    """Streams the same reply: first word after LLM_MOCK_TTFT_MS, the rest spread over the remaining time"""
+    tokens = _reply_tokens(prompt)
+    time.sleep(config.LLM_MOCK_TTFT_MS / 1000)
+    remaining = max(0, config.LLM_MOCK_DURATION_MS - config.LLM_MOCK_TTFT_MS) / 1000
+    interval = remaining / max(1, len(tokens) - 1)
+    for index, token in enumerate(tokens):
+        if index:
+            time.sleep(interval)
+        yield token if index == 0 else f" {token}"
+    _record_mock_usage(usage, prompt, system_prompt, chat_history, len(tokens))
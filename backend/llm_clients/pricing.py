@@ -0,0 +1,46 @@
+"""
+List prices used to turn token usage into cost, in USD per million tokens.
+
+Keyed by the model each client calls; update the table when a client's
+MODEL_NAME or the provider's prices change.
+"""
+from typing import Dict, NamedTuple, Optional
+
+from .claude_client import MODEL_NAME as CLAUDE_MODEL
+from .chatgpt_client import MODEL_NAME as OPENAI_MODEL
+from .deepseek_client import MODEL_NAME as DEEPSEEK_MODEL
+from .gemini_client import MODEL_NAME as GEMINI_MODEL
+
+class ModelPrice(NamedTuple):
+    input: float
+    cached_input: float
+    output: float
+
+MODEL_PRICES: Dict[str, ModelPrice] = {
+    "claude-3-5-haiku-20241022": ModelPrice(input=0.80, cached_input=0.08, output=4.00),
+    "gpt-4o-mini-2024-07-18": ModelPrice(input=0.15, cached_input=0.075, output=0.60),
+    "deepseek-chat": ModelPrice(input=0.27, cached_input=0.07, output=1.10),
+    "gemini-2.5-flash-preview-05-20": ModelPrice(input=0.15, cached_input=0.0375, output=0.60),
+}
+
+# OpenAI and Anthropic bill asynchronous batch requests at half the list price
+BATCH_DISCOUNT = 0.5
+
+PROVIDER_MODELS: Dict[str, str] = {
+    "claude": CLAUDE_MODEL,
+    "openai": OPENAI_MODEL,
+    "deepseek": DEEPSEEK_MODEL,
+    "gemini": GEMINI_MODEL,
+}
+
+def compute_cost(provider: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0,
+                 batch: bool = False) -> Optional[float]:
+    """Cost of one call in USD, or None when the provider's model has no price"""
+    price = MODEL_PRICES.get(PROVIDER_MODELS.get(provider, ""))
+    if price is None:
+        return None
+    uncached_input = max(0, input_tokens - cached_tokens)
+    cost = (uncached_input * price.input + cached_tokens * price.cached_input + output_tokens * price.output) / 1_000_000
+    if batch:
+        cost *= BATCH_DISCOUNT
+    return round(cost, 8)
@@ -0,0 +1,64 @@
+"""
+Retry counting for the provider clients.
+
+The OpenAI and Anthropic SDKs retry connection errors, 408/409/429 and 5xx
+responses themselves (twice by default) and number every attempt in the
+``x-stainless-retry-count`` header, so a request hook on their httpx client
+counts the attempts past the first. Deepseek goes through requests, which does
+not retry, so it gets the same policy from urllib3's ``Retry``. The Gemini SDK
+does not retry, so there is nothing to count for it.
+"""
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import LLM_RETRIES
+
+# Same policy as the OpenAI and Anthropic SDKs
+MAX_RETRIES = 2
+RETRY_STATUSES = (408, 409, 429, 500, 502, 503, 504)
+
+
+def retry_counting_hooks(provider: str) -> dict:
+    """``event_hooks`` for an SDK's httpx client that count its retries under ``provider``"""
+    def count_retry(request: httpx.Request) -> None:
+        try:
+            retries_taken = int(request.headers.get("x-stainless-retry-count", "0"))
+        except ValueError:
+            return
+        if retries_taken > 0:
+            LLM_RETRIES.inc(provider=provider)
+    return {"request": [count_retry]}
+
+
+class _CountingRetry(Retry):
+    """urllib3 Retry that counts every retry it allows under ``provider``"""
+
+    def __init__(self, *args, provider: str = "", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.provider = provider
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.provider = self.provider
+        return retry
+
+    def increment(self, *args, **kwargs):
+        # Raises MaxRetryError instead of returning once the retries are used up
+        retry = super().increment(*args, **kwargs)
+        LLM_RETRIES.inc(provider=self.provider)
+        return retry
+
+
+def retrying_session(provider: str) -> requests.Session:
+    """requests session that retries like the SDKs do and counts the retries under ``provider``"""
+    retry = _CountingRetry(
+        total=MAX_RETRIES, connect=MAX_RETRIES, read=0, status=MAX_RETRIES,
+        status_forcelist=RETRY_STATUSES, allowed_methods=None, backoff_factor=0.5,
+        raise_on_status=False, respect_retry_after_header=True, provider=provider
+    )
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(max_retries=retry))
+    session.mount("http://", HTTPAdapter(max_retries=retry))
+    return session
@@ -0,0 +1,11 @@
+def record_usage(usage, input_tokens, output_tokens, cached_tokens=0):
+    """Fill the caller's ``usage`` dict, if one was passed, with normalized token counts.
+
+    ``input_tokens`` counts every prompt token, including the ``cached_tokens``
+    served from the provider's prompt cache.
+    """
+    if usage is None:
+        return
+    usage["input_tokens"] = int(input_tokens or 0)
+    usage["output_tokens"] = int(output_tokens or 0)
+    usage["cached_tokens"] = int(cached_tokens or 0)
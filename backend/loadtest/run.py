@@ -0,0 +1,346 @@
+"""
+Reproducible load test for the backend.
+
+Starts the app on a free local port against an in-memory MongoDB (mongomock)
+with every LLM provider replaced by the mock client, then drives N simulated
+users concurrently through register -> login -> add API keys -> create
+conversation -> join over Socket.IO -> M trigger_next_llm turns. Prints a JSON
+report with per-operation latency percentiles, throughput, errors and the
+server's memory use.
+
+Usage (from the backend directory):
+    pip install -r requirements.txt -r loadtest/requirements.txt
+    python -m loadtest.run --users 20 --turns 5 --concurrency 10 --output report.json
+
+Pass --base-url to drive an already running server instead; it must then be
+started with LLM_MOCK_MODE=true if provider calls should not leave the machine.
+"""
+import argparse
+import json
+import os
+import secrets
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import requests
+import socketio
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PARTICIPANTS = ["claude", "openai"]
+
+
+class Results:
+    """Latency samples and errors collected from every simulated user"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, operation: str, seconds: float) -> None:
+        with self._lock:
+            self.samples.setdefault(operation, []).append(seconds)
+
+    def error(self, operation: str, message: str) -> None:
+        with self._lock:
+            self.errors.setdefault(operation, []).append(message)
+
+    def timed(self, operation: str, fn, *args, **kwargs):
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.add(operation, time.perf_counter() - started)
+        return result
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    to_ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        "count": len(values),
+        "p50_ms": to_ms(percentile(values, 50)),
+        "p95_ms": to_ms(percentile(values, 95)),
+        "p99_ms": to_ms(percentile(values, 99)),
+        "mean_ms": to_ms(statistics.fmean(values)),
+        "max_ms": to_ms(max(values)),
+    }
+
+
+def read_rss_kb(pid: int) -> Optional[int]:
+    """Resident set size of a local process in KiB (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+class MemorySampler(threading.Thread):
+    """Polls the server's RSS while the test runs"""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.start_kb = read_rss_kb(pid)
+        self.peak_kb = self.start_kb
+        self.end_kb = self.start_kb
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = read_rss_kb(self.pid)
+        if rss is not None:
+            self.end_kb = rss
+            self.peak_kb = max(self.peak_kb or 0, rss)
+
+    def stop(self) -> Dict[str, Optional[float]]:
+        self._stopped.set()
+        self._sample()
+        to_mb = lambda kb: round(kb / 1024, 1) if kb is not None else None
+        return {"rss_start_mb": to_mb(self.start_kb), "rss_peak_mb": to_mb(self.peak_kb), "rss_end_mb": to_mb(self.end_kb)}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(args) -> Tuple[subprocess.Popen, str]:
+    """Launch loadtest.server with mongomock and the mock LLM; return the process and its URL"""
+    from cryptography.fernet import Fernet
+
+    port = free_port()
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        FLASK_ENV="development",
+        MONGODB_URI="mongomock://",
+        LLM_MOCK_MODE="true",
+        LLM_MOCK_TTFT_MS=str(args.mock_ttft_ms),
+        LLM_MOCK_DURATION_MS=str(args.mock_duration_ms),
+        LLM_MOCK_REPLY_TOKENS=str(args.mock_reply_tokens),
+        ENCRYPTION_KEY=Fernet.generate_key().decode(),
+        FLASK_SECRET_KEY=secrets.token_hex(32),
+        # Cheap hashing so the run measures the app rather than bcrypt cost
+        BCRYPT_ROUNDS=str(args.bcrypt_rounds),
+        LOG_LEVEL="WARNING",
+        LOG_FILE="",
+        TRACE_EXPORTER="none",
+        # websocket-client sends the server's own URL as the Origin header
+        CORS_ORIGINS=f"http://127.0.0.1:{port}",
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "loadtest.server"],
+        cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=None if args.server_logs else subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited during startup with code {process.returncode}")
+        try:
+            requests.get(base_url + "/", timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Server did not answer on {base_url} within {args.startup_timeout}s")
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def check(response: requests.Response, operation: str) -> dict:
+    if response.status_code >= 400:
+        raise RuntimeError(f"{operation} returned {response.status_code}: {response.text[:200]}")
+    return response.json()
+
+def run_user(index: int, base_url: str, args, results: Results, run_id: str) -> None:
+    """One simulated user: the REST onboarding flow, then M socket turns"""
+    http = requests.Session()
+    timeout = args.timeout
+    email = f"loadtest-{run_id}-{index}@example.com"
+    password = secrets.token_urlsafe(16)
+    operation = "register"
+    client = None
+    turns_left = args.turns
+    try:
+        check(results.timed("register", http.post, f"{base_url}/api/auth/register",
+                            json={"email": email, "password": password}, timeout=timeout), "register")
+        operation = "login"
+        login = check(results.timed("login", http.post, f"{base_url}/api/auth/login",
+                                    json={"email": email, "password": password}, timeout=timeout), "login")
+        operation = "csrf_token"
+        csrf_token = check(results.timed("csrf_token", http.get, f"{base_url}/api/csrf-token", timeout=timeout),
+                           "csrf_token")["csrf_token"]
+        http.headers["X-CSRFToken"] = csrf_token
+
+        operation = "update_api_keys"
+        check(results.timed("update_api_keys", http.post, f"{base_url}/api/auth/api-keys",
+                            json={f"{name}_api_key": f"loadtest-{name}-key" for name in PARTICIPANTS},
+                            timeout=timeout), "update_api_keys")
+        operation = "create_conversation"
+        conversation_id = check(results.timed("create_conversation", http.post, f"{base_url}/api/conversations", json={
+            "name": f"Load test {index}",
+            "system_prompt": "Discuss the trade-offs of caching in web services.",
+            "llm_participants": PARTICIPANTS,
+        }, timeout=timeout), "create_conversation")["id"]
+
+        operation = "socket_connect"
+        client = socketio.Client(reconnection=False)
+        replies: List[dict] = []
+        reply_ready = threading.Event()
+        first_delta = {"at": None}
+
+        @client.on("message_delta")
+        def on_delta(frame):
+            if first_delta["at"] is None:
+                first_delta["at"] = time.perf_counter()
+            return True  # acknowledge so the server keeps streaming to this client
+
+        @client.on("message_update")
+        def on_message(message):
+            replies.append(message)
+            reply_ready.set()
+
+        @client.on("error")
+        def on_error(error):
+            replies.append({"error": (error or {}).get("message", "unknown error")})
+            reply_ready.set()
+
+        results.timed("socket_connect", client.connect, f"{base_url}?token={login['access_token']}",
+                      transports=["websocket"], wait_timeout=timeout)
+        client.emit("join_conversation", {"conversation_id": conversation_id})
+
+        operation = "turn"
+        for _ in range(args.turns):
+            turns_left -= 1
+            reply_ready.clear()
+            replies.clear()
+            first_delta["at"] = None
+            started = time.perf_counter()
+            client.emit("trigger_next_llm", {"conversation_id": conversation_id})
+            if not reply_ready.wait(timeout):
+                results.error("turn", f"no reply within {timeout}s")
+                continue
+            results.add("turn", time.perf_counter() - started)
+            if first_delta["at"] is not None:
+                results.add("turn_first_delta", first_delta["at"] - started)
+            if "error" in replies[0]:
+                results.error("turn", replies[0]["error"])
+
+        operation = "get_conversation"
+        check(results.timed("get_conversation", http.get, f"{base_url}/api/conversations/{conversation_id}",
+                            timeout=timeout), "get_conversation")
+    except Exception as e:
+        results.error(operation, str(e))
+        # Turns that never ran because an earlier step failed still count against the run
+        for _ in range(turns_left):
+            results.error("turn", f"not run: {operation} failed")
+    finally:
+        if client is not None and client.connected:
+            client.disconnect()
+        http.close()
+
+
+def build_report(args, results: Results, elapsed: float, memory: Optional[Dict]) -> Dict:
+    latency = {operation: summarize(values) for operation, values in sorted(results.samples.items())}
+    requests_done = sum(len(values) for operation, values in results.samples.items() if operation != "turn_first_delta")
+    turns_done = len(results.samples.get("turn", []))
+    return {
+        "config": {
+            "users": args.users,
+            "turns": args.turns,
+            "concurrency": args.concurrency,
+            "mock_ttft_ms": args.mock_ttft_ms,
+            "mock_duration_ms": args.mock_duration_ms,
+            "mock_reply_tokens": args.mock_reply_tokens,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "throughput": {
+            "requests_per_s": round(requests_done / elapsed, 2) if elapsed else 0,
+            "turns_per_s": round(turns_done / elapsed, 2) if elapsed else 0,
+        },
+        "latency": latency,
+        "errors": {
+            "total": sum(len(messages) for messages in results.errors.values()),
+            "by_operation": {operation: {"count": len(messages), "samples": messages[:5]}
+                             for operation, messages in sorted(results.errors.items())},
+        },
+        "memory": memory,
+    }
+
+def run(args) -> Dict:
+    process = None
+    base_url = args.base_url
+    if not base_url:
+        process, base_url = start_server(args)
+    sampler = MemorySampler(process.pid) if process else None
+    if sampler:
+        sampler.start()
+
+    results = Results()
+    run_id = secrets.token_hex(4)
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for index in range(args.users):
+                pool.submit(run_user, index, base_url, args, results, run_id)
+    finally:
+        elapsed = time.perf_counter() - started
+        memory = sampler.stop() if sampler else None
+        if process:
+            stop_server(process)
+    return build_report(args, results, elapsed, memory)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Drive simulated users against the backend and report latency")
+    parser.add_argument("--users", type=int, default=10, help="simulated users (default 10)")
+    parser.add_argument("--turns", type=int, default=3, help="trigger_next_llm turns per user (default 3)")
+    parser.add_argument("--concurrency", type=int, default=10, help="users running at once (default 10)")
+    parser.add_argument("--mock-ttft-ms", type=int, default=100, help="mock time to first token")
+    parser.add_argument("--mock-duration-ms", type=int, default=500, help="mock total generation time")
+    parser.add_argument("--mock-reply-tokens", type=int, default=60, help="words per mock reply")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4, help="BCRYPT_ROUNDS for the started server")
+    parser.add_argument("--timeout", type=float, default=30, help="per-request and per-turn timeout in seconds")
+    parser.add_argument("--startup-timeout", type=float, default=30, help="seconds to wait for the server")
+    parser.add_argument("--base-url", help="use a running server instead of starting one")
+    parser.add_argument("--server-logs", action="store_true", help="show the started server's stderr")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+    return 1 if report["errors"]["total"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+"""
+Backend process started by the load-test harness.
+
+Patches the standard library with eventlet the way gunicorn's eventlet worker
+does, so blocking calls behave as in production, and serves without the
+debug reloader. Configuration (mongomock URI, mock LLM, port) comes from the
+environment set by loadtest.run.
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import os
+
+from app import app, socketio
+
+if __name__ == '__main__':
+    socketio.run(app, host='127.0.0.1', port=int(os.environ['PORT']), debug=False, use_reloader=False, log_output=False)
@@ -0,0 +1,156 @@
+"""
+Logging setup: queue-based handlers, JSON records, request context and sampling.
+
+Callers only put records on an in-memory queue; a listener thread formats and
+writes them to stdout and the log file, so request handlers never wait on log
+I/O. Records carry the fields bound with ``bind_log_context`` (request id,
+route, ...) and INFO/DEBUG records from routes with a sample rate below 1 are
+kept for only that fraction of requests. Warnings and errors are always kept.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+_log_context: contextvars.ContextVar[Dict] = contextvars.ContextVar('log_context', default={})
+
+# Attributes every LogRecord has; anything else was passed through ``extra=``
+_RECORD_ATTRIBUTES = set(logging.LogRecord('', 0, '', 0, '', None, None).__dict__) | {'message', 'asctime', 'context'}
+
+def bind_log_context(**fields) -> None:
+    """Add fields to every record logged from the current request or task"""
+    _log_context.set({**_log_context.get(), **fields})
+
+def clear_log_context() -> None:
+    _log_context.set({})
+
+def get_log_context() -> Dict:
+    return _log_context.get()
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """Parse ``"/api/csrf-token=0.01,/api/conversations=0.1"`` into a route -> rate map"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        route, _, rate = item.partition('=')
+        rates[route.strip()] = float(rate)
+    return rates
+
+def should_sample(route: Optional[str], default_rate: float, route_rates: Dict[str, float]) -> bool:
+    """Decide once per request whether its routine records are kept"""
+    rate = route_rates.get(route, default_rate) if route else default_rate
+    return rate >= 1 or random.random() < rate
+
+
+class ContextFilter(logging.Filter):
+    """Attach the request context and drop routine records of unsampled requests.
+
+    Runs on the QueueHandler, i.e. in the thread that logged, where the
+    context variables are still set.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _log_context.get()
+        if not context.get('sampled', True) and record.levelno < logging.WARNING:
+            return False
+        record.context = {key: value for key, value in context.items() if key != 'sampled'}
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with context and ``extra=`` fields at the top level"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, 'context', {}))
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The previous plain-text format, with the request id appended when there is one"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        request_id = getattr(record, 'context', {}).get('request_id')
+        return f"{line} [request_id={request_id}]" if request_id else line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens on the listener thread; only resolve the message here
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def configure_logging(level: str = 'INFO', log_format: str = 'json', log_file: Optional[str] = None,
+                      queue_size: int = 10000) -> DroppingQueueHandler:
+    """Route the root logger through a bounded queue to stdout and, optionally, a file"""
+    global _listener
+
+    formatter = JsonFormatter() if log_format == 'json' else TextFormatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    handlers = [logging.StreamHandler()]  # Log to stdout for Cloud Run
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    if _listener is not None:
+        _listener.stop()
+    else:
+        # Drain what is still queued when the worker exits
+        atexit.register(_stop_listener)
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return queue_handler
+
+def _stop_listener() -> None:
+    if _listener is not None:
+        _listener.stop()
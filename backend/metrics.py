@@ -0,0 +1,355 @@
+"""
+In-process metrics rendered in the Prometheus text format at ``/metrics``.
+
+Counters, gauges and histograms are kept per worker process; with several
+gunicorn workers each scrape sees the worker that answered it.
+"""
+import functools
+import inspect
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+DB_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+THROUGHPUT_BUCKETS = (1, 5, 10, 20, 35, 50, 75, 100, 150, 250, 500)
+
+LabelValues = Tuple[str, ...]
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [bucket counts..., sum, count]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        series = self._values.get(self._key(labels))
+        return int(series[-1]) if series else 0
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._values.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, series):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {_format_value(cumulative)}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(series[-2])}"
+            yield f"{self.name}_count{labels} {_format_value(series[-1])}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# LLM providers, recorded at the ALL_LLMS / ALL_LLM_STREAMS dispatch
+LLM_REQUESTS = REGISTRY.counter(
+    "llm_requests_total", "LLM calls by provider, mode (call/stream) and outcome (ok/error)",
+    ("provider", "mode", "outcome")
+)
+LLM_LATENCY = REGISTRY.histogram(
+    "llm_request_duration_seconds", "Wall time of an LLM call until the full reply is received",
+    ("provider", "mode")
+)
+LLM_TIME_TO_FIRST_TOKEN = REGISTRY.histogram(
+    "llm_time_to_first_token_seconds", "Time until the first streamed delta arrives", ("provider",)
+)
+LLM_RETRIES = REGISTRY.counter(
+    "llm_retries_total", "Provider requests re-sent after a connection error, 408/409/429 or 5xx", ("provider",)
+)
+LLM_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "llm_output_tokens_per_second", "Reply throughput; uses reported usage, else characters / 4",
+    ("provider", "mode"), buckets=THROUGHPUT_BUCKETS
+)
+
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Provider-reported tokens by kind (input/output/cached); input includes cached",
+    ("provider", "kind")
+)
+LLM_COST = REGISTRY.counter("llm_cost_usd_total", "Computed cost of LLM calls in USD", ("provider",))
+LLM_SPECULATIONS = REGISTRY.counter(
+    "llm_speculative_generations_total", "Replies generated ahead of the request, by outcome (used/discarded/failed/expired)",
+    ("outcome",)
+)
+REPETITIONS_DETECTED = REGISTRY.counter(
+    "conversation_repetitions_detected_total", "Self-chats caught looping, by action taken (flag/stop)",
+    ("action",)
+)
+
+# MongoDB, recorded per repository method
+DB_OPERATION_LATENCY = REGISTRY.histogram(
+    "db_operation_duration_seconds", "Wall time of repository methods", ("repository", "method"),
+    buckets=DB_LATENCY_BUCKETS
+)
+DB_OPERATION_ERRORS = REGISTRY.counter(
+    "db_operation_errors_total", "Repository methods that raised", ("repository", "method")
+)
+DB_COMMAND_LATENCY = REGISTRY.histogram(
+    "mongodb_command_duration_seconds", "Driver-reported duration of MongoDB commands", ("command", "collection"),
+    buckets=DB_LATENCY_BUCKETS
+)
+DB_COMMAND_FAILURES = REGISTRY.counter(
+    "mongodb_command_failures_total", "MongoDB commands that failed", ("command", "collection")
+)
+DB_QUERIES_PER_REQUEST = REGISTRY.histogram(
+    "mongodb_queries_per_request", "MongoDB commands issued per HTTP request or socket event", ("route",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34)
+)
+
+# Socket.IO, recorded by SocketController
+SOCKET_CONNECTIONS = REGISTRY.gauge("socket_connections", "Socket.IO clients connected to this worker")
+SOCKET_EMITS = REGISTRY.counter("socket_emits_total", "Socket.IO events emitted, by event name", ("event",))
+GENERATIONS_IN_FLIGHT = REGISTRY.gauge("llm_generations_in_flight", "trigger_next_llm calls currently running")
+
+MESSAGE_BUFFER_PENDING = REGISTRY.gauge("message_buffer_pending", "Messages waiting in the write-behind buffer")
+MESSAGE_BUFFER_FLUSH_FAILURES = REGISTRY.counter(
+    "message_buffer_flush_failures_total", "Buffer flushes that left messages unwritten (retried on the next flush)"
+)
+MESSAGE_BUFFER_DEAD_LETTERS = REGISTRY.counter(
+    "message_buffer_dead_letters_total", "Buffered messages given up on after repeated failed flushes"
+)
+MESSAGE_BUFFER_OVERFLOWS = REGISTRY.counter(
+    "message_buffer_overflows_total", "Messages written directly because the buffer was full"
+)
+
+# bcrypt, recorded by PasswordHasher
+PASSWORD_HASH_QUEUE_DEPTH = REGISTRY.gauge(
+    "password_hash_queue_depth", "Password hash/verify calls waiting for or holding a bcrypt worker"
+)
+PASSWORD_HASH_DURATION = REGISTRY.histogram(
+    "password_hash_duration_seconds", "Time bcrypt spends on one call, by operation (hash/verify)", ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+PASSWORD_HASH_REJECTED = REGISTRY.counter(
+    "password_hash_rejected_total", "Password hash/verify calls refused because the queue was full"
+)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for throughput metrics (about four characters per token)"""
+    return max(1, len(text) // 4) if text else 0
+
+def is_error_reply(text: str) -> bool:
+    """The LLM clients report failures as reply text rather than raising"""
+    return not text or text.startswith("Error") or text.endswith("API key not configured.")
+
+
+def timed_llm_call(provider: str, fn: Callable) -> Callable:
+    """Wrap a blocking LLM client function with latency, throughput and outcome metrics"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            text = fn(*args, **kwargs)
+        except Exception:
+            LLM_REQUESTS.inc(provider=provider, mode="call", outcome="error")
+            raise
+        elapsed = time.perf_counter() - started_at
+        _record_reply(provider, "call", text, elapsed, kwargs.get("usage"))
+        return text
+    return wrapper
+
+def timed_llm_stream(provider: str, fn: Callable) -> Callable:
+    """Wrap a streaming LLM client generator; also records time to first token"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started_at = time.perf_counter()
+        first_delta = True
+        chunks = []
+        try:
+            for delta in fn(*args, **kwargs):
+                if first_delta:
+                    LLM_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - started_at, provider=provider)
+                    first_delta = False
+                chunks.append(delta)
+                yield delta
+        except Exception:
+            LLM_REQUESTS.inc(provider=provider, mode="stream", outcome="error")
+            raise
+        _record_reply(provider, "stream", "".join(chunks), time.perf_counter() - started_at, kwargs.get("usage"))
+    return wrapper
+
+def _record_reply(provider: str, mode: str, text: str, elapsed: float, usage: Optional[dict] = None) -> None:
+    outcome = "error" if is_error_reply(text) else "ok"
+    LLM_REQUESTS.inc(provider=provider, mode=mode, outcome=outcome)
+    LLM_LATENCY.observe(elapsed, provider=provider, mode=mode)
+    if outcome == "ok" and elapsed > 0:
+        # Prefer the provider's count when the client reported usage
+        output_tokens = (usage or {}).get("output_tokens") or estimate_tokens(text)
+        LLM_TOKENS_PER_SECOND.observe(output_tokens / elapsed, provider=provider, mode=mode)
+
+
+def instrument_repository(cls):
+    """Class decorator timing every public method of a repository, sync or async"""
+    repository = cls.__name__
+    for name, method in list(vars(cls).items()):
+        if name.startswith('_') or not inspect.isfunction(method):
+            continue
+        setattr(cls, name, _timed_method(repository, name, method))
+    return cls
+
+def _timed_method(repository: str, name: str, method: Callable) -> Callable:
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            except Exception:
+                DB_OPERATION_ERRORS.inc(repository=repository, method=name)
+                raise
+            finally:
+                DB_OPERATION_LATENCY.observe(time.perf_counter() - started_at, repository=repository, method=name)
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        except Exception:
+            DB_OPERATION_ERRORS.inc(repository=repository, method=name)
+            raise
+        finally:
+            DB_OPERATION_LATENCY.observe(time.perf_counter() - started_at, repository=repository, method=name)
+    return wrapper
@@ -1,5 +1,5 @@
 # This package will contain the Pydantic or MongoEngine models for database interaction.
-from .conversation import Conversation
+from .conversation import Conversation, ConversationUsage
 from .message import Message
 
-__all__ = ["Conversation", "Message"] 
\ No newline at end of file
+__all__ = ["Conversation", "ConversationUsage", "Message"] 
\ No newline at end of file
@@ -4,6 +4,15 @@ from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, Field
 
 
+class ConversationUsage(BaseModel):
+    """Running token and cost totals of a conversation"""
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    cost_usd: float = 0.0
+    message_count: int = 0
+
+
 class Conversation(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -12,6 +21,14 @@ class Conversation(BaseModel):
     system_prompt: str
     llm_participants: List[str]
     auditor_id: Optional[str] = None
+    # Set on forks: the conversation and message whose history this one continues from
+    parent_conversation_id: Optional[str] = None
+    parent_message_id: Optional[str] = None
+    # Set by loop detection: why the conversation looks stuck, and why it refuses further turns
+    flagged_reason: Optional[str] = None
+    halted_reason: Optional[str] = None
+    # Kept with $inc by UsageRepository; copies cached by find_by_id can lag behind by the cache TTL
+    usage: Optional[ConversationUsage] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -31,6 +48,29 @@ class Conversation(BaseModel):
             doc["id"] = str(doc.pop("_id"))
         return cls(**doc)
 
+    @staticmethod
+    def response_from_db_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Builds the API response dict straight from a trusted MongoDB document, skipping model validation.
+
+        Mirrors the shape of ``model_dump(mode='json')``; datetimes are left for the JSON provider to encode.
+        """
+        return {
+            "id": str(doc["_id"]),
+            "name": doc["name"],
+            "title": doc.get("title", "Untitled Conversation"),
+            "user_id": doc.get("user_id"),
+            "system_prompt": doc["system_prompt"],
+            "llm_participants": doc["llm_participants"],
+            "auditor_id": doc.get("auditor_id"),
+            "parent_conversation_id": doc.get("parent_conversation_id"),
+            "parent_message_id": doc.get("parent_message_id"),
+            "flagged_reason": doc.get("flagged_reason"),
+            "halted_reason": doc.get("halted_reason"),
+            "usage": ConversationUsage(**doc["usage"]).model_dump() if doc.get("usage") else None,
+            "created_at": doc["created_at"],
+            "updated_at": doc["updated_at"]
+        }
+
 # Example Usage (for testing this file):
 if __name__ == "__main__":
     conv_data = {
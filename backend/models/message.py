@@ -12,6 +12,11 @@ class Message(BaseModel):
     llm_name: Optional[str] = None
     content: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    # Provider-reported usage for LLM messages; input_tokens includes cached_tokens
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
+    cost_usd: Optional[float] = None
 
     class Config:
         from_attributes = True
@@ -29,6 +34,26 @@ class Message(BaseModel):
             doc["id"] = str(doc.pop("_id"))
         return cls(**doc)
 
+    @staticmethod
+    def response_from_db_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Builds the API response dict straight from a trusted MongoDB document, skipping model validation.
+
+        Mirrors the shape of ``model_dump(mode='json')``; datetimes are left for the JSON provider to encode.
+        """
+        return {
+            "id": str(doc["_id"]),
+            "conversation_id": doc["conversation_id"],
+            "sender_type": doc["sender_type"],
+            "sender_id": doc["sender_id"],
+            "llm_name": doc.get("llm_name"),
+            "content": doc["content"],
+            "created_at": doc["created_at"],
+            "input_tokens": doc.get("input_tokens"),
+            "output_tokens": doc.get("output_tokens"),
+            "cached_tokens": doc.get("cached_tokens"),
+            "cost_usd": doc.get("cost_usd")
+        }
+
 if __name__ == "__main__":
     msg_data = {
         "conversation_id": str(uuid.uuid4()),
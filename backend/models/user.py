@@ -81,6 +81,9 @@ class User(BaseModel, UserMixin):
             return None
         return cipher_suite.decrypt(encrypted_key.encode()).decode()
 
+    def get_encrypted_api_key(self, model_name: str) -> Optional[str]:
+        return getattr(self, f"{model_name}_api_key", None)
+
     def get_available_models(self) -> Dict[str, bool]:
         """Returns a dictionary of available models based on API keys"""
         return {
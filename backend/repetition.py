@@ -0,0 +1,165 @@
+"""
+Loop detection for self-chats.
+
+Each message is reduced to a MinHash signature over its word shingles; the
+fraction of equal slots between two signatures estimates the Jaccard
+similarity of their shingle sets. A reply counts as repetitive when it is at
+least ``threshold`` similar to any of the previous ``window`` messages, and a
+conversation is reported once ``consecutive`` replies in a row are.
+
+Signatures of the recent messages are kept per conversation, so scoring a
+turn costs one signature plus ``window`` comparisons. When a conversation's
+window is missing or stale (restart, another worker took the previous turns,
+history edited) it is rebuilt from the texts the caller supplies.
+"""
+import hashlib
+import heapq
+import random
+import re
+import threading
+from collections import deque
+from typing import Callable, Deque, List, NamedTuple, Optional, Tuple
+
+from cache import TTLCache
+
+_WORD = re.compile(r"\w+")
+# Modulus of the universal hash family applied to the shingle hashes
+_PRIME = (1 << 61) - 1
+
+Signature = Tuple[int, ...]
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class MinHasher:
+    """MinHash signatures of word k-shingles; seeded, so signatures are comparable across processes"""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, max_shingles: int = 512, seed: int = 1):
+        self.shingle_size = shingle_size
+        # Long messages are sampled to their lowest-hashing shingles, which keeps the cost bounded
+        # and, being the same rule for every message, still estimates their overlap
+        self.max_shingles = max_shingles
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def shingles(self, text: str) -> List[int]:
+        words = _WORD.findall(text.lower())
+        if not words:
+            return []
+        k = self.shingle_size
+        hashes = {_hash64(" ".join(words[i:i + k])) for i in range(max(1, len(words) - k + 1))}
+        if len(hashes) > self.max_shingles:
+            return heapq.nsmallest(self.max_shingles, hashes)
+        return list(hashes)
+
+    def signature(self, text: str) -> Signature:
+        """Empty for text without words, which is never similar to anything"""
+        hashes = self.shingles(text)
+        if not hashes:
+            return ()
+        return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in self._perms)
+
+    @staticmethod
+    def similarity(left: Signature, right: Signature) -> float:
+        if not left or not right:
+            return 0.0
+        return sum(1 for x, y in zip(left, right) if x == y) / len(left)
+
+
+class RepetitionResult(NamedTuple):
+    # Highest similarity of the new message to the window before it
+    score: float
+    # Repetitive replies in a row, this one included
+    consecutive: int
+    # Set on the turn that reaches the limit; later turns of the same run are not reported again
+    reason: Optional[str] = None
+
+
+class _Window:
+    __slots__ = ("signatures", "last_digest", "consecutive", "reported")
+
+    def __init__(self, size: int):
+        self.signatures: Deque[Signature] = deque(maxlen=size)
+        # Digest of the newest message, to tell whether the window still ends where the conversation does
+        self.last_digest: Optional[bytes] = None
+        self.consecutive = 0
+        self.reported = False
+
+
+class RepetitionDetector:
+    """Scores each new message of a conversation against its recent ones"""
+
+    def __init__(self, threshold: float = 0.8, window: int = 6, consecutive: int = 3,
+                 hasher: Optional[MinHasher] = None, cache_size: int = 4096, cache_ttl: float = 3600):
+        self.threshold = threshold
+        self.window = window
+        self.consecutive = consecutive
+        self.hasher = hasher or MinHasher()
+        self._windows = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        # Windows are mutated in place, and two worker threads may score the same conversation
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def observe(self, conversation_id: str, previous_text: str, text: str,
+                recent_texts: Callable[[], List[str]]) -> RepetitionResult:
+        """Score ``text``, the reply to ``previous_text``.
+
+        ``recent_texts`` returns the conversation's latest messages before the
+        reply, oldest first and ending with ``previous_text``; it is only called
+        when the cached window has to be rebuilt.
+        """
+        signature = self.hasher.signature(text)
+        previous_digest = self._digest(previous_text)
+        with self._lock:
+            state = self._windows.get(conversation_id)
+            if state is not None and state.last_digest == previous_digest:
+                return self._advance(conversation_id, state, signature, text)
+        # Reading the history is a database call, so rebuild outside the lock
+        rebuilt = self._rebuild(recent_texts()[-self.window:])
+        with self._lock:
+            state = self._windows.get(conversation_id)
+            if state is None or state.last_digest != previous_digest:
+                state = rebuilt
+            return self._advance(conversation_id, state, signature, text)
+
+    def _advance(self, conversation_id: str, state: _Window, signature: Signature, text: str) -> RepetitionResult:
+        """Add the reply to the window; callers hold ``_lock``"""
+        result = self._push(state, signature)
+        state.last_digest = self._digest(text)
+        self._windows.set(conversation_id, state)
+        return result
+
+    def _rebuild(self, texts: List[str]) -> _Window:
+        state = _Window(self.window)
+        for text in texts:
+            self._push(state, self.hasher.signature(text))
+        state.last_digest = self._digest(texts[-1]) if texts else None
+        # Only replies scored from now on may report the conversation
+        state.reported = state.consecutive >= self.consecutive
+        return state
+
+    def _push(self, state: _Window, signature: Signature) -> RepetitionResult:
+        score = max((self.hasher.similarity(signature, earlier) for earlier in state.signatures), default=0.0)
+        state.signatures.append(signature)
+        if score < self.threshold:
+            state.consecutive = 0
+            state.reported = False
+            return RepetitionResult(score, 0)
+        state.consecutive += 1
+        if state.consecutive < self.consecutive or state.reported:
+            return RepetitionResult(score, state.consecutive)
+        state.reported = True
+        return RepetitionResult(score, state.consecutive, (
+            f"repetition: {state.consecutive} replies in a row at least {self.threshold:.0%} similar "
+            f"to one of the previous {self.window} messages (last {score:.0%})"
+        ))
+
+    def reset(self, conversation_id: str) -> None:
+        """Forget a conversation's window, e.g. after its system prompt changed"""
+        with self._lock:
+            self._windows.pop(conversation_id)
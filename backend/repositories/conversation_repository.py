@@ -1,23 +1,117 @@
-from typing import Optional, List, Dict
+import uuid
+from typing import Optional, List, Dict, Callable, Tuple
+from datetime import datetime, timezone
 from pymongo.database import Database
 from models import Conversation, Message
+from repositories.message_buffer import MessageWriteBuffer
+from cache import TTLCache
+from metrics import instrument_repository, MESSAGE_BUFFER_OVERFLOWS
+from tracing import trace_repository
 
+def _naive_utc(value: datetime) -> datetime:
+    """pymongo returns naive UTC datetimes while new models carry tzinfo; compare them as naive UTC"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _stored_at(value: datetime) -> datetime:
+    """``created_at`` as Mongo stores it: naive UTC, truncated to milliseconds"""
+    value = _naive_utc(value)
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+def _message_order(doc: Dict) -> Tuple[datetime, str]:
+    """Position of a message in its conversation; ``_id`` orders messages created in the same millisecond"""
+    return _stored_at(doc["created_at"]), doc["_id"]
+
+# Sort matching _message_order, so stored, buffered and ?since= listings agree
+_MESSAGE_SORT = [("created_at", 1), ("_id", 1)]
+
+def _trim_at(msg_docs: List[Dict], last_message_id: str) -> List[Dict]:
+    """Messages up to and including ``last_message_id`` (none if it is missing)"""
+    for index, doc in enumerate(msg_docs):
+        if doc["_id"] == last_message_id:
+            return msg_docs[:index + 1]
+    return []
+
+@trace_repository
+@instrument_repository
 class ConversationRepository:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, message_buffer: Optional[MessageWriteBuffer] = None,
+                 cache_size: int = 0, cache_ttl: float = 0,
+                 invalidation_hook: Optional[Callable[[str], None]] = None):
         self.db = db
         self.conversations_collection = db.conversations
         self.messages_collection = db.messages
+        self.message_buffer = message_buffer
+        # Read-through cache of Conversation metadata; cache_size=0 disables it.
+        self.conversation_cache = TTLCache(cache_size, cache_ttl)
+        # Called with the conversation id after a local change so other workers can drop their copy.
+        self.invalidation_hook = invalidation_hook
     
     def create_conversation(self, conversation: Conversation) -> str:
         """Create a new conversation"""
         doc = conversation.to_db_document()
-        result = self.conversations_collection.insert_one(doc)
+        self.conversations_collection.insert_one(doc)
+        self.conversation_cache.set(conversation.id, conversation.model_copy(deep=True))
         return str(doc['_id'])
     
     def find_by_id(self, conversation_id: str) -> Optional[Conversation]:
-        """Find conversation by ID"""
+        """Find conversation by ID, served from the metadata cache when possible"""
+        cached = self.conversation_cache.get(conversation_id)
+        if cached is not None:
+            return cached.model_copy(deep=True)
+        
         conv_doc = self.conversations_collection.find_one({"_id": conversation_id})
-        return Conversation.from_db_document(conv_doc) if conv_doc else None
+        if not conv_doc:
+            return None
+        conversation = Conversation.from_db_document(conv_doc)
+        self.conversation_cache.set(conversation_id, conversation.model_copy(deep=True))
+        return conversation
+    
+    def invalidate_cached_conversation(self, conversation_id: str) -> None:
+        """Drop a cached conversation, e.g. when another worker reports a change"""
+        self.conversation_cache.pop(conversation_id)
+    
+    def _conversation_changed(self, conversation_id: str) -> None:
+        self.invalidate_cached_conversation(conversation_id)
+        if self.invalidation_hook:
+            self.invalidation_hook(conversation_id)
+    
+    def get_conversation_version(self, conversation_id: str) -> Optional[Dict]:
+        """Cheap summary of what a conversation response depends on, for HTTP validators"""
+        conv_doc = self.conversations_collection.find_one({"_id": conversation_id}, {"updated_at": 1})
+        if not conv_doc:
+            return None
+        
+        stats = next(self.messages_collection.aggregate([
+            {"$match": {"conversation_id": conversation_id}},
+            {"$group": {"_id": None, "count": {"$sum": 1}, "last_message_at": {"$max": "$created_at"}}}
+        ]), {"count": 0, "last_message_at": None})
+        
+        message_count = stats["count"]
+        last_message_at = stats["last_message_at"]
+        if self.message_buffer:
+            buffered = self.message_buffer.pending_for(conversation_id)
+            message_count += len(buffered)
+            for doc in buffered:
+                created_at = _naive_utc(doc["created_at"])
+                if last_message_at is None or created_at > last_message_at:
+                    last_message_at = created_at
+        
+        updated_at = _naive_utc(conv_doc["updated_at"])
+        return {
+            "updated_at": updated_at,
+            "message_count": message_count,
+            "last_modified": max(updated_at, last_message_at) if last_message_at else updated_at
+        }
+    
+    def get_user_conversations_version(self, user_id: str) -> Dict:
+        """Count and latest update of a user's conversations, for HTTP validators on the list"""
+        stats = next(self.conversations_collection.aggregate([
+            {"$match": {"user_id": user_id}},
+            {"$group": {"_id": None, "count": {"$sum": 1}, "last_modified": {"$max": "$updated_at"}}}
+        ]), {"count": 0, "last_modified": None})
+        return {"count": stats["count"], "last_modified": stats["last_modified"]}
     
     def find_by_user_id(self, user_id: str) -> List[Conversation]:
         """Find all conversations for a user"""
@@ -31,47 +125,244 @@ class ConversationRepository:
         return conversations
     
     def delete_conversation(self, conversation_id: str) -> bool:
-        """Delete a conversation and its messages"""
-        conv_result = self.conversations_collection.delete_one({"_id": conversation_id})
-        if conv_result.deleted_count > 0:
+        """Delete a conversation and its messages, first copying into its forks the history they share"""
+        conv_doc = self.conversations_collection.find_one_and_delete({"_id": conversation_id})
+        self._conversation_changed(conversation_id)
+        if conv_doc:
+            self._materialize_forks(conv_doc)
+            if self.message_buffer:
+                self.message_buffer.discard(conversation_id)
             self.messages_collection.delete_many({"conversation_id": conversation_id})
             return True
         return False
     
+    def _materialize_forks(self, conv_doc: Dict) -> None:
+        """Give each direct fork of a deleted conversation its own copy of the messages it read from it.
+
+        The fork is re-pointed at the deleted conversation's own parent, so
+        history further up the lineage stays shared.
+        """
+        conversation_id = conv_doc["_id"]
+        forks = list(self.conversations_collection.find(
+            {"parent_conversation_id": conversation_id}, {"parent_message_id": 1}
+        ))
+        if not forks:
+            return
+        msg_docs = self._find_message_docs(conversation_id)
+        lineage = {"parent_conversation_id": conv_doc.get("parent_conversation_id"),
+                   "parent_message_id": conv_doc.get("parent_message_id")}
+        for fork in forks:
+            copies = [{**doc, "_id": str(uuid.uuid4()), "conversation_id": fork["_id"]}
+                      for doc in _trim_at(msg_docs, fork.get("parent_message_id"))]
+            if copies:
+                self.messages_collection.insert_many(copies)
+            update = {"$set": {"updated_at": datetime.now(timezone.utc)}}
+            if lineage["parent_conversation_id"]:
+                update["$set"].update(lineage)
+            else:
+                update["$unset"] = {"parent_conversation_id": "", "parent_message_id": ""}
+            self.conversations_collection.update_one({"_id": fork["_id"]}, update)
+            self._conversation_changed(fork["_id"])
+    
     def update_system_prompt(self, conversation_id: str, new_prompt: str) -> bool:
-        """Update system prompt for a conversation"""
-        from datetime import datetime, timezone
+        """Update system prompt for a conversation; a new prompt also lifts any repetition flag or halt"""
         result = self.conversations_collection.update_one(
             {'_id': conversation_id},
-            {'$set': {'system_prompt': new_prompt, 'updated_at': datetime.now(timezone.utc)}}
+            {'$set': {'system_prompt': new_prompt, 'updated_at': datetime.now(timezone.utc)},
+             '$unset': {'flagged_reason': '', 'halted_reason': ''}}
         )
+        self._conversation_changed(conversation_id)
+        return result.matched_count > 0
+    
+    def mark_repetition(self, conversation_id: str, reason: str, halt: bool = False) -> bool:
+        """Record why a conversation looks stuck; with ``halt`` it also refuses further turns"""
+        fields = {'flagged_reason': reason, 'updated_at': datetime.now(timezone.utc)}
+        if halt:
+            fields['halted_reason'] = reason
+        result = self.conversations_collection.update_one({'_id': conversation_id}, {'$set': fields})
+        self._conversation_changed(conversation_id)
         return result.matched_count > 0
     
     def get_messages(self, conversation_id: str) -> List[Message]:
-        """Get all messages for a conversation"""
-        messages_cursor = self.messages_collection.find({"conversation_id": conversation_id}).sort("created_at", 1)
-        messages = []
-        for msg_doc in messages_cursor:
-            messages.append(Message.from_db_document(msg_doc))
-        return messages
+        """Get all messages for a conversation, including those a fork shares with its ancestors"""
+        conversation = self.find_by_id(conversation_id)
+        if conversation and conversation.parent_conversation_id:
+            msg_docs = self._find_lineage_message_docs(
+                conversation_id, conversation.parent_conversation_id, conversation.parent_message_id
+            )
+        else:
+            msg_docs = self._find_message_docs(conversation_id)
+        return [Message.from_db_document(msg_doc) for msg_doc in msg_docs]
+    
+    def _lineage(self, conversation_id: str, parent_conversation_id: Optional[str],
+                 parent_message_id: Optional[str]) -> List[Tuple[str, Optional[str]]]:
+        """(conversation id, last shared message id) for each conversation in a fork's history, root first.
+
+        The conversation itself comes last with None: all of its own messages count.
+        """
+        segments = [(conversation_id, None)]
+        seen = {conversation_id}
+        while parent_conversation_id and parent_conversation_id not in seen:
+            seen.add(parent_conversation_id)
+            segments.append((parent_conversation_id, parent_message_id))
+            parent = self.find_by_id(parent_conversation_id)
+            if not parent:
+                break
+            parent_conversation_id, parent_message_id = parent.parent_conversation_id, parent.parent_message_id
+        segments.reverse()
+        return segments
+    
+    def _find_lineage_message_docs(self, conversation_id: str, parent_conversation_id: Optional[str],
+                                   parent_message_id: Optional[str]) -> List[Dict]:
+        """Raw message documents of a fork: each ancestor's up to the fork point, then its own"""
+        msg_docs = []
+        for segment_id, last_message_id in self._lineage(conversation_id, parent_conversation_id, parent_message_id):
+            if last_message_id is None:
+                msg_docs.extend(self._find_message_docs(segment_id))
+            else:
+                msg_docs.extend(self._find_message_docs_until(segment_id, last_message_id))
+        return msg_docs
+    
+    def _find_message_doc(self, conversation_id: str, message_id: str, projection: Optional[Dict] = None) -> Optional[Dict]:
+        """One of a conversation's own messages, stored or still buffered"""
+        msg_doc = self.messages_collection.find_one({"_id": message_id, "conversation_id": conversation_id}, projection)
+        if not msg_doc and self.message_buffer:
+            msg_doc = next((doc for doc in self.message_buffer.pending_for(conversation_id)
+                            if doc["_id"] == message_id), None)
+        return msg_doc
+    
+    def _find_message_docs_until(self, conversation_id: str, last_message_id: str) -> List[Dict]:
+        """A conversation's own messages up to and including ``last_message_id``, oldest first"""
+        last_doc = self._find_message_doc(conversation_id, last_message_id, {"created_at": 1})
+        if not last_doc:
+            return []
+        msg_docs = list(self.messages_collection.find(
+            {"conversation_id": conversation_id, "created_at": {"$lte": _naive_utc(last_doc["created_at"])}}
+        ).sort(_MESSAGE_SORT))
+        if self.message_buffer:
+            msg_docs = self._merge_buffered(conversation_id, msg_docs)
+        return _trim_at(msg_docs, last_message_id)
+    
+    def resolve_fork_point(self, conversation_id: str, message_id: str) -> Optional[str]:
+        """Id of the conversation that owns ``message_id`` if the message is in ``conversation_id``'s history.
+
+        Only looks up the message and walks the lineage, so it does not depend
+        on how many messages the conversation has.
+        """
+        conversation = self.find_by_id(conversation_id)
+        if not conversation:
+            return None
+        for segment_id, last_message_id in self._lineage(
+            conversation_id, conversation.parent_conversation_id, conversation.parent_message_id
+        ):
+            msg_doc = self._find_message_doc(segment_id, message_id, {"created_at": 1})
+            if not msg_doc:
+                continue
+            if last_message_id is None or last_message_id == message_id:
+                return segment_id
+            # A message of an ancestor is shared only if it is not after the fork point
+            last_doc = self._find_message_doc(segment_id, last_message_id, {"created_at": 1})
+            if last_doc and _naive_utc(msg_doc["created_at"]) <= _naive_utc(last_doc["created_at"]):
+                return segment_id
+            return None
+        return None
+    
+    def _find_message_docs(self, conversation_id: str) -> List[Dict]:
+        """Raw message documents for a conversation, including buffered ones, oldest first"""
+        msg_docs = list(self.messages_collection.find({"conversation_id": conversation_id}).sort(_MESSAGE_SORT))
+        if self.message_buffer:
+            msg_docs = self._merge_buffered(conversation_id, msg_docs)
+        return msg_docs
+    
+    def _merge_buffered(self, conversation_id: str, msg_docs: List[Dict]) -> List[Dict]:
+        """Append buffered (not yet flushed) messages to stored ones, keeping message order"""
+        buffered = self.message_buffer.pending_for(conversation_id)
+        if not buffered:
+            return msg_docs
+        # A flush can land between the find and the buffer read, so skip duplicates.
+        stored_ids = {doc["_id"] for doc in msg_docs}
+        merged = msg_docs + [doc for doc in buffered if doc["_id"] not in stored_ids]
+        merged.sort(key=_message_order)
+        return merged
+    
+    def get_message_docs_since(self, conversation_id: str, since_message_id: str) -> Optional[List[Dict]]:
+        """Raw message documents created after ``since_message_id``, oldest first.
+
+        Returns None when that message is unknown, so the caller can fall back to a full fetch.
+        """
+        conversation = self.find_by_id(conversation_id)
+        if conversation and conversation.parent_conversation_id:
+            # The anchor may be a shared message from an ancestor, so slice the combined history
+            msg_docs = self._find_lineage_message_docs(
+                conversation_id, conversation.parent_conversation_id, conversation.parent_message_id
+            )
+            for index, doc in enumerate(msg_docs):
+                if doc["_id"] == since_message_id:
+                    return msg_docs[index + 1:]
+            return None
+        
+        since_doc = self._find_message_doc(conversation_id, since_message_id, {"created_at": 1})
+        if not since_doc:
+            return None
+        
+        # Strictly after the anchor in (created_at, _id) order, so nothing already seen comes back
+        cursor = _message_order(since_doc)
+        since_at = cursor[0]
+        msg_docs = list(self.messages_collection.find({
+            "conversation_id": conversation_id,
+            "$or": [
+                {"created_at": {"$gt": since_at}},
+                {"created_at": since_at, "_id": {"$gt": since_message_id}}
+            ]
+        }).sort(_MESSAGE_SORT))
+        if self.message_buffer:
+            msg_docs = self._merge_buffered(conversation_id, msg_docs)
+        return [doc for doc in msg_docs if _message_order(doc) > cursor]
+    
+    def get_conversation_with_messages_since(self, conversation_id: str, since_message_id: str) -> Optional[Dict]:
+        """Like get_conversation_with_messages but only with messages after ``since_message_id``.
+
+        Falls back to all messages (``since`` set to None) when the message is unknown.
+        """
+        conv_doc = self.conversations_collection.find_one({"_id": conversation_id})
+        if not conv_doc:
+            return None
+        
+        msg_docs = self.get_message_docs_since(conversation_id, since_message_id)
+        if msg_docs is None:
+            since_message_id = None
+            msg_docs = self._find_lineage_message_docs(
+                conversation_id, conv_doc.get("parent_conversation_id"), conv_doc.get("parent_message_id")
+            )
+        
+        conv_response = Conversation.response_from_db_document(conv_doc)
+        conv_response['messages'] = [Message.response_from_db_document(msg_doc) for msg_doc in msg_docs]
+        conv_response['since'] = since_message_id
+        return conv_response
     
     def add_message(self, message: Message) -> bool:
         """Add a new message to a conversation"""
         try:
+            if self.message_buffer:
+                if self.message_buffer.add(message.to_db_document()):
+                    return True
+                # Full (flushes are failing or falling behind): write through instead of growing without bound
+                MESSAGE_BUFFER_OVERFLOWS.inc()
             result = self.messages_collection.insert_one(message.to_db_document())
             return result.inserted_id is not None
         except Exception:
             return False
     
     def get_conversation_with_messages(self, conversation_id: str) -> Optional[Dict]:
-        """Get conversation with all its messages"""
+        """Get conversation with all its messages, built directly from the stored documents"""
         conv_doc = self.conversations_collection.find_one({"_id": conversation_id})
         if not conv_doc:
             return None
         
-        conversation = Conversation.from_db_document(conv_doc)
-        messages = self.get_messages(conversation_id)
+        msg_docs = self._find_lineage_message_docs(
+            conversation_id, conv_doc.get("parent_conversation_id"), conv_doc.get("parent_message_id")
+        )
         
-        conv_response = conversation.model_dump(mode='json')
-        conv_response['messages'] = [msg.model_dump(mode='json') for msg in messages]
-        return conv_response 
\ No newline at end of file
+        conv_response = Conversation.response_from_db_document(conv_doc)
+        conv_response['messages'] = [Message.response_from_db_document(msg_doc) for msg_doc in msg_docs]
+        return conv_response
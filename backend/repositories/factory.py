@@ -0,0 +1,48 @@
+from typing import Optional, Tuple
+from config import config
+from database.connection import DatabaseConnection
+from cache_invalidation import CacheInvalidationBus, CONVERSATION
+from repositories.message_buffer import MessageWriteBuffer
+from repositories.user_repository import UserRepository
+from repositories.conversation_repository import ConversationRepository
+
+def create_repositories(connection: DatabaseConnection,
+                        message_buffer: Optional[MessageWriteBuffer] = None,
+                        invalidation_bus: Optional[CacheInvalidationBus] = None,
+                        cache_enabled: bool = True) -> Tuple[UserRepository, ConversationRepository]:
+    """Build the (user, conversation) repository pair with the configured caches and message buffer.
+
+    With ``invalidation_bus`` the conversation cache is kept coherent with other workers;
+    ``cache_enabled=False`` turns it off (several workers and no bus).
+    """
+    db = connection.db
+    conversation_repository = ConversationRepository(
+        db,
+        message_buffer=message_buffer,
+        cache_size=config.CONVERSATION_CACHE_SIZE if cache_enabled else 0,
+        cache_ttl=config.CONVERSATION_CACHE_TTL,
+        invalidation_hook=(lambda conversation_id: invalidation_bus.publish(CONVERSATION, conversation_id))
+        if invalidation_bus else None
+    )
+    if invalidation_bus:
+        invalidation_bus.subscribe(
+            CONVERSATION, conversation_repository.invalidate_cached_conversation,
+            conversation_repository.conversation_cache.clear
+        )
+    return UserRepository(db), conversation_repository
+
+def create_async_repositories(connection: DatabaseConnection, conversation_repository: ConversationRepository) -> Tuple:
+    """Motor-backed (user, conversation) repositories for DB_DRIVER=async.
+
+    The conversation repository shares ``conversation_repository``'s cache,
+    message buffer and invalidation hook, so both drivers read the same state.
+    """
+    from repositories.async_user_repository import AsyncUserRepository
+    from repositories.async_conversation_repository import AsyncConversationRepository
+    db = connection.async_db
+    return AsyncUserRepository(db), AsyncConversationRepository(
+        db,
+        message_buffer=conversation_repository.message_buffer,
+        conversation_cache=conversation_repository.conversation_cache,
+        invalidation_hook=conversation_repository.invalidation_hook
+    )
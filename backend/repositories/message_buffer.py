@@ -0,0 +1,174 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError
+from metrics import MESSAGE_BUFFER_PENDING, MESSAGE_BUFFER_FLUSH_FAILURES, MESSAGE_BUFFER_DEAD_LETTERS
+
+logger = logging.getLogger(__name__)
+
+# Duplicate key: the document was written by an earlier attempt
+_DUPLICATE_KEY = 11000
+
+class MessageWriteBuffer:
+    """Write-behind buffer that groups message documents into bulk inserts.
+
+    Documents are flushed with a single ``insert_many`` once ``max_size``
+    documents are pending or ``flush_interval`` seconds have passed since the
+    oldest pending document was added. Pending documents, including those of a
+    flush still in progress, stay readable through ``pending_for`` so callers
+    can merge them with what is already stored.
+
+    At most ``max_pending`` documents are held; ``add`` refuses more so the
+    caller can write directly. A document that still fails after
+    ``max_attempts`` flushes is moved to ``dead_letter`` (or only logged when
+    there is none) instead of being retried forever.
+    """
+
+    def __init__(self, collection: Collection, max_size: int = 50, flush_interval: float = 1.0,
+                 max_pending: int = 1000, max_attempts: int = 5, dead_letter: Optional[Collection] = None):
+        self.collection = collection
+        self.max_size = max(1, max_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max(self.max_size, max_pending)
+        self.max_attempts = max(1, max_attempts)
+        self.dead_letter = dead_letter
+        self._pending: List[Dict] = []
+        # The batch being inserted; written outside the lock, so add and pending_for never wait on Mongo
+        self._in_flight: List[Dict] = []
+        self._attempts: Dict[str, int] = {}
+        self._oldest_pending_at: Optional[float] = None
+        self._lock = threading.RLock()
+        # Serializes flushes, and lets discard wait for a flush of the conversation it drops
+        self._flush_lock = threading.Lock()
+        self._closed = threading.Event()
+        # Set when max_size is reached, so the flusher starts right away instead of on its next poll
+        self._wake = threading.Event()
+        self._flusher = threading.Thread(target=self._run, name="message-write-buffer", daemon=True)
+        self._flusher.start()
+
+    def add(self, doc: Dict) -> bool:
+        """Queue a message document for the next bulk insert; False when the buffer is full"""
+        with self._lock:
+            if len(self._pending) + len(self._in_flight) >= self.max_pending:
+                return False
+            self._pending.append(doc)
+            if self._oldest_pending_at is None:
+                self._oldest_pending_at = time.monotonic()
+            should_flush = len(self._pending) >= self.max_size
+            MESSAGE_BUFFER_PENDING.set(len(self._pending) + len(self._in_flight))
+
+        if should_flush:
+            self._wake.set()
+        return True
+
+    def pending_for(self, conversation_id: str) -> List[Dict]:
+        """Return copies of the buffered documents for a conversation, oldest first"""
+        with self._lock:
+            return [dict(doc) for doc in self._in_flight + self._pending if doc.get("conversation_id") == conversation_id]
+
+    def pending_count(self, conversation_id: str) -> int:
+        """Number of buffered documents for a conversation"""
+        with self._lock:
+            return sum(1 for doc in self._in_flight + self._pending if doc.get("conversation_id") == conversation_id)
+
+    def discard(self, conversation_id: str) -> None:
+        """Drop buffered documents for a conversation that is being deleted.
+
+        Waits for a flush in progress, so the caller's delete also removes what it wrote.
+        """
+        with self._flush_lock, self._lock:
+            for doc in self._pending:
+                if doc.get("conversation_id") == conversation_id:
+                    self._attempts.pop(doc["_id"], None)
+            self._pending = [doc for doc in self._pending if doc.get("conversation_id") != conversation_id]
+            if not self._pending:
+                self._oldest_pending_at = None
+            MESSAGE_BUFFER_PENDING.set(len(self._pending) + len(self._in_flight))
+
+    def flush(self) -> int:
+        """Write all pending documents; returns the number now stored (including any an earlier attempt wrote)"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch = self._in_flight = self._pending
+                self._pending = []
+                self._oldest_pending_at = None
+
+            # Unordered, so one bad document does not hold back the rest
+            failed: List[Dict] = []
+            try:
+                self.collection.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                errors = [error for error in e.details.get("writeErrors", []) if error.get("code") != _DUPLICATE_KEY]
+                failed = [batch[error["index"]] for error in errors]
+                if errors:
+                    logger.error(f"Bulk insert of buffered messages failed for {len(failed)} of {len(batch)} documents: "
+                                 f"{[error.get('errmsg') for error in errors]}")
+            except Exception as e:
+                # Nothing is known to be written; a retry skips whatever was (duplicate keys)
+                failed = batch
+                logger.error(f"Bulk insert of {len(batch)} buffered messages failed: {e}")
+
+            retry = self._retry_or_dead_letter(batch, failed)
+            with self._lock:
+                self._in_flight = []
+                if retry:
+                    self._pending = retry + self._pending
+                    self._oldest_pending_at = time.monotonic()
+                MESSAGE_BUFFER_PENDING.set(len(self._pending))
+            return len(batch) - len(failed)
+
+    def _retry_or_dead_letter(self, batch: List[Dict], failed: List[Dict]) -> List[Dict]:
+        """Documents to retry; those out of attempts go to the dead-letter collection"""
+        if failed:
+            MESSAGE_BUFFER_FLUSH_FAILURES.inc()
+        failed_ids = {doc["_id"] for doc in failed}
+        retry, dead = [], []
+        with self._lock:
+            for doc in batch:
+                if doc["_id"] not in failed_ids:
+                    self._attempts.pop(doc["_id"], None)
+            for doc in failed:
+                attempts = self._attempts.get(doc["_id"], 0) + 1
+                if attempts >= self.max_attempts:
+                    self._attempts.pop(doc["_id"], None)
+                    dead.append(doc)
+                else:
+                    self._attempts[doc["_id"]] = attempts
+                    retry.append(doc)
+        if dead:
+            MESSAGE_BUFFER_DEAD_LETTERS.inc(len(dead))
+            logger.error(f"Giving up on {len(dead)} buffered messages after {self.max_attempts} attempts: "
+                         f"{[doc['_id'] for doc in dead]}")
+            if self.dead_letter is not None:
+                try:
+                    self.dead_letter.insert_many(dead, ordered=False)
+                except Exception as e:
+                    logger.error(f"Writing {len(dead)} messages to the dead-letter collection failed: {e}")
+        return retry
+
+    def close(self) -> None:
+        """Stop the background flusher and write whatever is still pending"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._wake.set()
+        self.flush()
+
+    def _run(self):
+        poll_interval = min(self.flush_interval, 0.25) if self.flush_interval > 0 else 0.25
+        while True:
+            self._wake.wait(poll_interval)
+            self._wake.clear()
+            if self._closed.is_set():
+                return
+            with self._lock:
+                due = len(self._pending) >= self.max_size or (
+                    self._oldest_pending_at is not None
+                    and time.monotonic() - self._oldest_pending_at >= self.flush_interval
+                )
+            if due:
+                self.flush()
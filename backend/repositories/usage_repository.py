@@ -0,0 +1,80 @@
+from datetime import datetime, timezone
+from typing import Optional, List, Dict
+from pymongo.database import Database
+from metrics import instrument_repository
+from tracing import trace_repository
+
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cached_tokens", "cost_usd")
+
+@trace_repository
+@instrument_repository
+class UsageRepository:
+    """Token and cost totals, kept as $inc rollups next to the messages they come from.
+
+    Conversations and users carry a running ``usage`` subdocument; ``usage_daily``
+    holds one document per user, UTC day and provider with ``_id``
+    ``"<user_id>:<YYYY-MM-DD>:<provider>"`` so a user's days are a range scan on
+    the primary key.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.conversations = db.conversations
+        self.users = db.users
+        self.daily = db.usage_daily
+
+    def record_usage(self, user_id: str, conversation_id: str, provider: str, usage: Dict,
+                     at: Optional[datetime] = None, message_count: int = 1) -> None:
+        """Add one LLM message's usage to the daily, user and conversation totals.
+
+        ``message_count`` is 0 for replies that were paid for but never saved (unused speculations).
+
+        The three updates are not atomic. The daily row is written first because
+        it is the ledger the others can be rebuilt from: if a later update fails,
+        the user total is the sum of the user's daily rows and the conversation
+        total that of its messages (plus unsaved replies, which only the daily
+        rows record).
+        """
+        at = at or datetime.now(timezone.utc)
+        amounts = {field: usage.get(field) or 0 for field in USAGE_FIELDS}
+        amounts["message_count"] = message_count
+
+        day = at.strftime("%Y-%m-%d")
+        self.daily.update_one(
+            {"_id": f"{user_id}:{day}:{provider}"},
+            {"$setOnInsert": {"user_id": user_id, "date": day, "provider": provider}, "$inc": amounts},
+            upsert=True
+        )
+
+        increments = {f"usage.{field}": amount for field, amount in amounts.items()}
+        self.users.update_one({"_id": user_id}, {"$inc": increments})
+        # updated_at moves with the totals so the conversation list's ETag changes too
+        self.conversations.update_one(
+            {"_id": conversation_id},
+            {"$inc": increments, "$set": {"updated_at": datetime.now(timezone.utc)}}
+        )
+
+    def get_user_totals(self, user_id: str) -> Dict:
+        """Lifetime totals for a user"""
+        user_doc = self.users.find_one({"_id": user_id}, {"usage": 1})
+        return (user_doc or {}).get("usage") or {}
+
+    def get_daily_usage(self, user_id: str, since_day: str) -> List[Dict]:
+        """Per-day, per-provider totals from ``since_day`` (YYYY-MM-DD) on, oldest first"""
+        # ':' sorts just before ';', so this range covers every "<user_id>:..." key
+        cursor = self.daily.find(
+            {"_id": {"$gte": f"{user_id}:{since_day}", "$lt": f"{user_id};"}},
+            {"_id": 0, "user_id": 0}
+        ).sort("_id", 1)
+        return list(cursor)
+
+    def get_top_conversations(self, user_id: str, limit: int = 10) -> List[Dict]:
+        """The user's conversations with the highest cost"""
+        cursor = self.conversations.find(
+            {"user_id": user_id, "usage.cost_usd": {"$gt": 0}},
+            {"name": 1, "title": 1, "usage": 1}
+        ).sort("usage.cost_usd", -1).limit(limit)
+        return [
+            {"id": doc["_id"], "name": doc.get("name"), "title": doc.get("title"), "usage": doc.get("usage", {})}
+            for doc in cursor
+        ]
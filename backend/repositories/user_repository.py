@@ -1,7 +1,12 @@
+from datetime import datetime, timezone
 from typing import Optional, Dict
 from pymongo.database import Database
 from models.user import User
+from metrics import instrument_repository
+from tracing import trace_repository
 
+@trace_repository
+@instrument_repository
 class UserRepository:
     def __init__(self, db: Database):
         self.db = db
@@ -41,6 +46,14 @@ class UserRepository:
         )
         return result.modified_count > 0
     
+    def update_password_hash(self, user_id: str, password_hash: str) -> bool:
+        """Replace a user's password hash (used when rehashing with a new cost)"""
+        result = self.collection.update_one(
+            {"_id": user_id},
+            {"$set": {"password_hash": password_hash, "updated_at": datetime.now(timezone.utc)}}
+        )
+        return result.modified_count > 0
+    
     def get_api_key(self, user_id: str, model_name: str) -> Optional[str]:
         """Get encrypted API key for a specific model"""
         user_doc = self.collection.find_one(
@@ -1,35 +1,109 @@
-from typing import Optional, List, Dict, Tuple
+import uuid
+import time
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional, List, Dict, Tuple, Callable, NamedTuple
 from pydantic import ValidationError
 from repositories.conversation_repository import ConversationRepository
 from services.user_service import UserService
+from services.usage_service import UsageService
 from models import Conversation, Message
-from llm_clients import get_claude_response, get_gemini_response, get_chatgpt_response, get_deepseek_response
+from metrics import timed_llm_call, timed_llm_stream, estimate_tokens, is_error_reply, LLM_SPECULATIONS, REPETITIONS_DETECTED
+from tracing import tracer
+from repetition import RepetitionDetector
+from llm_clients import (
+    get_claude_response, get_gemini_response, get_chatgpt_response, get_deepseek_response,
+    stream_claude_response, stream_gemini_response, stream_chatgpt_response, stream_deepseek_response,
+    get_mock_response, stream_mock_response
+)
+from config import config
+
+logger = logging.getLogger(__name__)
 
 ALL_LLMS = {
-    "claude": get_claude_response,
-    "gemini": get_gemini_response,
-    "openai": get_chatgpt_response,
-    "deepseek": get_deepseek_response
+    "claude": timed_llm_call("claude", get_claude_response),
+    "gemini": timed_llm_call("gemini", get_gemini_response),
+    "openai": timed_llm_call("openai", get_chatgpt_response),
+    "deepseek": timed_llm_call("deepseek", get_deepseek_response)
+}
+
+# Streaming variants, used when the caller wants text deltas as they arrive
+ALL_LLM_STREAMS = {
+    "claude": timed_llm_stream("claude", stream_claude_response),
+    "gemini": timed_llm_stream("gemini", stream_gemini_response),
+    "openai": timed_llm_stream("openai", stream_chatgpt_response),
+    "deepseek": timed_llm_stream("deepseek", stream_deepseek_response)
 }
 
+if config.LLM_MOCK_MODE:
+    # Load tests: every provider answers from the local mock, still under its own name
+    ALL_LLMS = {name: timed_llm_call(name, get_mock_response) for name in ALL_LLMS}
+    ALL_LLM_STREAMS = {name: timed_llm_stream(name, stream_mock_response) for name in ALL_LLM_STREAMS}
+
+# on_delta(message_id, llm_name, delta)
+DeltaCallback = Callable[[str, str, str], None]
+
+class PreparedTurn(NamedTuple):
+    """Everything needed to ask the next LLM for its reply, and to save that reply"""
+    conversation_id: str
+    user_id: str
+    llm_name: str
+    message_id: str
+    api_key: str
+    prompt: str
+    system_prompt: str
+    chat_history: List[Dict]
+    prompt_tokens_estimate: int
+
+def _history_text(entry: Dict) -> str:
+    """Message text of a chat history entry in either provider format"""
+    if "parts" in entry:
+        return "".join(part.get("text", "") for part in entry["parts"])
+    return entry.get("content") or ""
+
 class ConversationService:
-    def __init__(self, conversation_repository: ConversationRepository, user_service: UserService):
+    def __init__(self, conversation_repository: ConversationRepository, user_service: UserService,
+                 usage_service: Optional[UsageService] = None,
+                 llms: Optional[Dict[str, Callable]] = None, llm_streams: Optional[Dict[str, Callable]] = None,
+                 speculative_generation: bool = False, speculation_ttl: float = 300, speculation_workers: int = 8,
+                 repetition_detection: str = "off", repetition_detector: Optional[RepetitionDetector] = None):
         self.conversation_repository = conversation_repository
         self.user_service = user_service
+        self.usage_service = usage_service
+        # Provider clients by name; callers such as the batch runner pass wrapped ones (e.g. rate-limited)
+        self.llms = llms if llms is not None else ALL_LLMS
+        self.llm_streams = llm_streams if llm_streams is not None else ALL_LLM_STREAMS
+        # Streamed replies still being generated on this worker, by conversation id
+        self._partial_generations: Dict[str, Dict] = {}
+        self._partial_lock = threading.Lock()
+        # Next replies generated ahead of the request, by conversation id (this worker only)
+        self.speculative_generation = speculative_generation
+        self.speculation_ttl = speculation_ttl
+        self._speculations: Dict[str, Dict] = {}
+        self._speculation_lock = threading.Lock()
+        self._speculation_pool = ThreadPoolExecutor(
+            max_workers=speculation_workers, thread_name_prefix="speculation"
+        ) if speculative_generation else None
+        # Loop detection on every saved reply: 'off', 'flag' or 'stop'
+        self.repetition_detection = repetition_detection
+        self.repetition_detector = (repetition_detector or RepetitionDetector()) if repetition_detection != "off" else None
     
     def create_conversation(self, user_id: str, conversation_data: dict) -> Tuple[bool, str, Optional[str]]:
         """Create a new conversation"""
         try:
             conversation_data["user_id"] = user_id
+            # Lineage is only set through fork_conversation, which checks the parent's owner
+            conversation_data.pop("parent_conversation_id", None)
+            conversation_data.pop("parent_message_id", None)
+            conversation_data.pop("flagged_reason", None)
+            conversation_data.pop("halted_reason", None)
+            conversation_data.pop("usage", None)
             new_conv = Conversation(**conversation_data)
             
-            # Validate that user has API keys for all LLM participants
-            available_models = self.user_service.get_available_models(user_id)
-            for llm_name in new_conv.llm_participants:
-                if llm_name not in ALL_LLMS:
-                    return False, f"Unsupported LLM: {llm_name}", None
-                if not available_models.get(llm_name):
-                    return False, f"No API key provided for {llm_name}", None
+            error = self._check_participants(user_id, new_conv.llm_participants)
+            if error:
+                return False, error, None
             
             conversation_id = self.conversation_repository.create_conversation(new_conv)
             
@@ -45,78 +119,389 @@ class ConversationService:
         except Exception as e:
             return False, f"Failed to create conversation: {str(e)}", None
     
+    def _check_participants(self, user_id: str, llm_participants: List[str]) -> Optional[str]:
+        """Error message if a participant is unsupported or the user has no API key for it"""
+        available_models = self.user_service.get_available_models(user_id)
+        for llm_name in llm_participants:
+            if llm_name not in self.llms:
+                return f"Unsupported LLM: {llm_name}"
+            if not available_models.get(llm_name):
+                return f"No API key provided for {llm_name}"
+        return None
+    
+    def fork_conversation(self, conversation_id: str, user_id: str, fork_data: dict) -> Tuple[bool, str, Optional[str]]:
+        """Create a conversation that continues ``conversation_id`` from ``fork_data['message_id']``.
+
+        The fork only points at its parent; the shared history is read from the
+        parent, so forking costs the same whatever the conversation's length.
+        ``name``, ``system_prompt`` and ``llm_participants`` may be overridden.
+        """
+        try:
+            message_id = fork_data.get("message_id")
+            if not message_id or not isinstance(message_id, str):
+                return False, "message_id is required to fork a conversation", None
+            
+            parent = self.conversation_repository.find_by_id(conversation_id)
+            if not parent or parent.user_id != user_id:
+                return False, f"Conversation {conversation_id} not found", None
+            
+            owner_id = self.conversation_repository.resolve_fork_point(conversation_id, message_id)
+            if not owner_id:
+                return False, f"Message {message_id} is not part of conversation {conversation_id}", None
+            
+            fork = Conversation(
+                name=fork_data.get("name") or f"{parent.name} (fork)",
+                title=parent.title,
+                user_id=user_id,
+                system_prompt=fork_data.get("system_prompt") or parent.system_prompt,
+                llm_participants=fork_data.get("llm_participants") or parent.llm_participants,
+                auditor_id=parent.auditor_id,
+                parent_conversation_id=owner_id,
+                parent_message_id=message_id
+            )
+            error = self._check_participants(user_id, fork.llm_participants)
+            if error:
+                return False, error, None
+            
+            fork_id = self.conversation_repository.create_conversation(fork)
+            return True, "Conversation forked successfully", fork_id
+            
+        except ValidationError as e:
+            return False, f"Invalid data for fork: {e.errors()}", None
+        except Exception as e:
+            return False, f"Failed to fork conversation: {str(e)}", None
+    
     def get_conversations(self, user_id: str) -> List[Dict]:
         """Get all conversations for a user"""
         conversations = self.conversation_repository.find_by_user_id(user_id)
         return [conv.model_dump(mode='json') for conv in conversations]
     
+    def get_conversations_version(self, user_id: str) -> Dict:
+        """Count and latest update time of a user's conversations"""
+        return self.conversation_repository.get_user_conversations_version(user_id)
+    
+    def get_conversation_version(self, conversation_id: str) -> Optional[Dict]:
+        """Update time and message count of a conversation, or None if it does not exist"""
+        return self.conversation_repository.get_conversation_version(conversation_id)
+    
+    def get_conversation(self, conversation_id: str) -> Optional[Conversation]:
+        """Get conversation metadata without its messages"""
+        return self.conversation_repository.find_by_id(conversation_id)
+    
     def get_conversation_details(self, conversation_id: str) -> Optional[Dict]:
         """Get conversation with all messages"""
         return self.conversation_repository.get_conversation_with_messages(conversation_id)
     
+    def get_conversation_details_since(self, conversation_id: str, since_message_id: str) -> Optional[Dict]:
+        """Get conversation with only the messages after ``since_message_id`` and any in-progress reply"""
+        conversation_data = self.conversation_repository.get_conversation_with_messages_since(
+            conversation_id, since_message_id
+        )
+        if conversation_data is not None:
+            conversation_data['partial'] = self.get_partial_generation(conversation_id)
+        return conversation_data
+    
+    def get_partial_generation(self, conversation_id: str) -> Optional[Dict]:
+        """The reply currently being streamed for a conversation, if any"""
+        with self._partial_lock:
+            partial = self._partial_generations.get(conversation_id)
+            if not partial:
+                return None
+            return {
+                "id": partial["id"],
+                "conversation_id": conversation_id,
+                "llm_name": partial["llm_name"],
+                "content": "".join(partial["chunks"])
+            }
+    
     def delete_conversation(self, conversation_id: str) -> bool:
         """Delete a conversation"""
+        self.discard_speculation(conversation_id)
+        if self.repetition_detector:
+            self.repetition_detector.reset(conversation_id)
         return self.conversation_repository.delete_conversation(conversation_id)
     
     def update_system_prompt(self, conversation_id: str, new_prompt: str) -> bool:
-        """Update system prompt for a conversation"""
+        """Update system prompt for a conversation; this also lifts a repetition halt"""
+        self.discard_speculation(conversation_id)
+        if self.repetition_detector:
+            self.repetition_detector.reset(conversation_id)
         return self.conversation_repository.update_system_prompt(conversation_id, new_prompt)
     
-    def trigger_next_llm(self, conversation_id: str, user_id: str) -> Tuple[bool, str, Optional[Message]]:
-        """Trigger the next LLM in the conversation"""
+    def trigger_next_llm(self, conversation_id: str, user_id: str,
+                         on_delta: Optional[DeltaCallback] = None) -> Tuple[bool, str, Optional[Message]]:
+        """Trigger the next LLM in the conversation.
+
+        When ``on_delta`` is given the reply is streamed and each text delta is
+        passed to it along with the id the saved message will have.
+        """
+        with tracer.start_span("ConversationService.trigger_next_llm", conversation_id=conversation_id) as span:
+            success, message, llm_msg = self._trigger_next_llm(conversation_id, user_id, on_delta)
+            span.set_attributes(success=success, llm_name=llm_msg.llm_name if llm_msg else None)
+            return success, message, llm_msg
+    
+    def _trigger_next_llm(self, conversation_id: str, user_id: str,
+                          on_delta: Optional[DeltaCallback]) -> Tuple[bool, str, Optional[Message]]:
+        try:
+            success, message, turn = self.prepare_next_turn(conversation_id, user_id)
+            if not success:
+                return False, message, None
+            
+            llm_to_call = self.llms.get(turn.llm_name)
+            if not llm_to_call:
+                return False, f"LLM client for {turn.llm_name} not found or not implemented.", None
+            
+            speculated = self._take_speculation(turn) if self.speculative_generation else None
+            llm_stream = self.llm_streams.get(turn.llm_name) if on_delta else None
+            usage = {}
+            with tracer.start_span(
+                f"llm.{turn.llm_name}",
+                provider=turn.llm_name,
+                mode="speculative" if speculated else "stream" if llm_stream else "call",
+                prompt_tokens_estimate=turn.prompt_tokens_estimate
+            ) as llm_span:
+                if speculated:
+                    # Already generated in the background for exactly this state; deliver it in one piece
+                    turn, llm_response_text, usage = speculated
+                    if on_delta:
+                        on_delta(turn.message_id, turn.llm_name, llm_response_text)
+                elif llm_stream:
+                    chunks = []
+                    with self._partial_lock:
+                        self._partial_generations[conversation_id] = {
+                            "id": turn.message_id, "llm_name": turn.llm_name, "chunks": chunks
+                        }
+                    try:
+                        for delta in llm_stream(
+                            api_key=turn.api_key,
+                            prompt=turn.prompt,
+                            system_prompt=turn.system_prompt,
+                            chat_history=turn.chat_history,
+                            usage=usage
+                        ):
+                            with self._partial_lock:
+                                chunks.append(delta)
+                            on_delta(turn.message_id, turn.llm_name, delta)
+                    except Exception:
+                        self._clear_partial_generation(conversation_id, turn.message_id)
+                        raise
+                    llm_response_text = "".join(chunks)
+                else:
+                    llm_response_text = llm_to_call(
+                        api_key=turn.api_key,
+                        prompt=turn.prompt,
+                        system_prompt=turn.system_prompt,
+                        chat_history=turn.chat_history,
+                        usage=usage
+                    )
+                llm_span.set_attribute("output_tokens_estimate", estimate_tokens(llm_response_text))
+                llm_span.set_attributes(**usage)
+            
+            result = self.complete_turn(turn, llm_response_text, usage)
+            if result[0] and self.speculative_generation:
+                self._start_speculation(conversation_id, user_id)
+            return result
+                
+        except Exception as e:
+            return False, f"Error triggering next LLM: {str(e)}", None
+    
+    def _start_speculation(self, conversation_id: str, user_id: str) -> None:
+        """Start generating the next speaker's reply in the background, replacing any earlier one"""
+        future = self._speculation_pool.submit(self._speculate, conversation_id, user_id)
+        with self._speculation_lock:
+            previous = self._speculations.get(conversation_id)
+            self._speculations[conversation_id] = {"future": future, "started_at": time.monotonic()}
+        if previous:
+            self._drop_speculation(previous)
+    
+    def _speculate(self, conversation_id: str, user_id: str) -> Optional[Tuple[PreparedTurn, str, Dict]]:
+        success, _, turn = self.prepare_next_turn(conversation_id, user_id)
+        llm_to_call = self.llms.get(turn.llm_name) if success else None
+        if not llm_to_call:
+            return None
+        usage = {}
+        llm_response_text = llm_to_call(
+            api_key=turn.api_key,
+            prompt=turn.prompt,
+            system_prompt=turn.system_prompt,
+            chat_history=turn.chat_history,
+            usage=usage
+        )
+        return turn, llm_response_text, usage
+    
+    def _take_speculation(self, turn: PreparedTurn) -> Optional[Tuple[PreparedTurn, str, Dict]]:
+        """The pre-generated reply for ``turn``, if one was started from exactly the same history and prompt.
+
+        Waits for it while it is still running, but not past its TTL; after that the caller generates afresh.
+        """
+        with self._speculation_lock:
+            entry = self._speculations.pop(turn.conversation_id, None)
+        if not entry:
+            return None
+        remaining = self.speculation_ttl - (time.monotonic() - entry["started_at"])
+        if remaining <= 0:
+            self._drop_speculation(entry)
+            LLM_SPECULATIONS.inc(outcome="expired")
+            return None
+        try:
+            speculated = entry["future"].result(timeout=remaining)
+        except FutureTimeoutError:
+            logger.warning(f"Speculative generation for conversation {turn.conversation_id} still running after its TTL")
+            self._drop_speculation(entry)
+            LLM_SPECULATIONS.inc(outcome="expired")
+            return None
+        except Exception as e:
+            logger.warning(f"Speculative generation for conversation {turn.conversation_id} failed: {e}")
+            speculated = None
+        if speculated is None or is_error_reply(speculated[1]):
+            if speculated:
+                self._record_speculation_usage(speculated)
+            LLM_SPECULATIONS.inc(outcome="failed")
+            return None
+        
+        speculated_turn = speculated[0]
+        if (speculated_turn.user_id, speculated_turn.llm_name, speculated_turn.prompt,
+                speculated_turn.system_prompt, speculated_turn.chat_history) != (
+                turn.user_id, turn.llm_name, turn.prompt, turn.system_prompt, turn.chat_history):
+            self._record_speculation_usage(speculated)
+            LLM_SPECULATIONS.inc(outcome="discarded")
+            return None
+        LLM_SPECULATIONS.inc(outcome="used")
+        return speculated
+    
+    def discard_speculation(self, conversation_id: str) -> None:
+        """Drop a pre-generated reply, e.g. because the system prompt or the history changed"""
+        with self._speculation_lock:
+            entry = self._speculations.pop(conversation_id, None)
+        if entry:
+            self._drop_speculation(entry)
+            LLM_SPECULATIONS.inc(outcome="discarded")
+    
+    def _drop_speculation(self, entry: Dict) -> None:
+        """Cancel a speculation nobody will use; one that already started is still billed once it finishes"""
+        future = entry["future"]
+        if not future.cancel():
+            future.add_done_callback(self._record_dropped_speculation)
+    
+    def _record_dropped_speculation(self, future: Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        if future.result():
+            self._record_speculation_usage(future.result())
+    
+    def _record_speculation_usage(self, speculated: Tuple[PreparedTurn, str, Dict]) -> None:
+        """Roll up the tokens of a generated reply that will not be saved, so usage totals match the provider bill"""
+        turn, _, usage = speculated
+        if self.usage_service and usage:
+            self.usage_service.record(turn.user_id, turn.conversation_id, turn.llm_name,
+                                      self.usage_service.price(turn.llm_name, usage), message_count=0)
+    
+    def prepare_next_turn(self, conversation_id: str, user_id: str) -> Tuple[bool, str, Optional[PreparedTurn]]:
+        """Work out who speaks next and build their request, without calling the provider.
+
+        Together with complete_turn this lets callers such as provider batch
+        submission run the LLM call themselves.
+        """
         try:
             conversation = self.conversation_repository.find_by_id(conversation_id)
             if not conversation:
                 return False, f"Conversation {conversation_id} not found", None
             
+            if conversation.halted_reason:
+                return False, f"Conversation halted ({conversation.halted_reason}); change the system prompt to resume", None
+            
             if not conversation.llm_participants:
                 return False, "No LLM participants in this conversation to respond.", None
             
             messages = self.conversation_repository.get_messages(conversation_id)
             
-            next_llm_name, current_prompt_text, history_messages = self._determine_next_llm(
-                conversation.llm_participants, messages
-            )
+            with tracer.start_span("ConversationService.determine_next_llm", message_count=len(messages)):
+                next_llm_name, current_prompt_text, history_messages = self._determine_next_llm(
+                    conversation.llm_participants, messages
+                )
             
-            llm_to_call = ALL_LLMS.get(next_llm_name)
-            if not llm_to_call:
-                return False, f"LLM client for {next_llm_name} not found or not implemented.", None
-            
-            api_key = self.user_service.get_api_key_decrypted(user_id, next_llm_name)
+            with tracer.start_span("UserService.get_api_key_decrypted", provider=next_llm_name):
+                api_key = self.user_service.get_api_key_decrypted(user_id, next_llm_name)
             if not api_key:
                 return False, f"API key for {next_llm_name} not found.", None
             
-            chat_history = self._prepare_chat_history(history_messages, next_llm_name)
+            with tracer.start_span("ConversationService.prepare_chat_history", history_length=len(history_messages)):
+                chat_history = self._prepare_chat_history(history_messages, next_llm_name)
             
-            llm_response_text = llm_to_call(
+            return True, "Turn prepared", PreparedTurn(
+                conversation_id=conversation_id,
+                user_id=user_id,
+                llm_name=next_llm_name,
+                message_id=str(uuid.uuid4()),
                 api_key=api_key,
                 prompt=current_prompt_text,
                 system_prompt=conversation.system_prompt,
-                chat_history=chat_history
+                chat_history=chat_history,
+                prompt_tokens_estimate=estimate_tokens(current_prompt_text) + sum(
+                    estimate_tokens(msg.content) for msg in history_messages
+                )
             )
-            
-            llm_msg_data = {
-                "conversation_id": conversation_id,
-                "sender_type": 'llm',
-                "sender_id": next_llm_name,
-                "llm_name": next_llm_name,
-                "content": llm_response_text
-            }
-            llm_msg = Message(**llm_msg_data)
-            
-            if self.conversation_repository.add_message(llm_msg):
-                return True, "LLM response generated successfully", llm_msg
-            else:
-                return False, "Failed to save LLM response", None
-                
         except Exception as e:
-            return False, f"Error triggering next LLM: {str(e)}", None
+            return False, f"Error preparing next LLM turn: {str(e)}", None
+    
+    def complete_turn(self, turn: PreparedTurn, llm_response_text: str, usage: Optional[Dict] = None,
+                      batch: bool = False) -> Tuple[bool, str, Optional[Message]]:
+        """Save the reply to a prepared turn and roll up its usage; ``batch`` prices it at batch rates"""
+        message_usage = self.usage_service.price(turn.llm_name, usage, batch=batch) if self.usage_service else {}
+        llm_msg = Message(
+            id=turn.message_id,
+            conversation_id=turn.conversation_id,
+            sender_type='llm',
+            sender_id=turn.llm_name,
+            llm_name=turn.llm_name,
+            content=llm_response_text,
+            **message_usage
+        )
+        
+        saved = self.conversation_repository.add_message(llm_msg)
+        # Keep the partial visible to sync requests until the message itself is readable
+        self._clear_partial_generation(turn.conversation_id, turn.message_id)
+        if not saved:
+            return False, "Failed to save LLM response", None
+        if self.usage_service:
+            self.usage_service.record(turn.user_id, turn.conversation_id, turn.llm_name, message_usage)
+        reason = self._check_repetition(turn, llm_response_text) if self.repetition_detector else None
+        if reason and self.repetition_detection == "stop":
+            return True, f"LLM response generated; conversation halted ({reason})", llm_msg
+        return True, "LLM response generated successfully", llm_msg
+    
+    def _check_repetition(self, turn: PreparedTurn, llm_response_text: str) -> Optional[str]:
+        """Score a saved reply for looping and flag or halt the conversation when it crosses the limit"""
+        try:
+            with tracer.start_span("ConversationService.check_repetition") as span:
+                result = self.repetition_detector.observe(
+                    turn.conversation_id, turn.prompt, llm_response_text,
+                    lambda: [_history_text(entry) for entry in turn.chat_history] + [turn.prompt]
+                )
+                span.set_attributes(score=result.score, consecutive=result.consecutive)
+            if not result.reason:
+                return None
+            halt = self.repetition_detection == "stop"
+            self.conversation_repository.mark_repetition(turn.conversation_id, result.reason, halt=halt)
+            REPETITIONS_DETECTED.inc(action=self.repetition_detection)
+            logger.info(f"Conversation {turn.conversation_id} {'halted' if halt else 'flagged'}: {result.reason}")
+            return result.reason
+        except Exception as e:
+            # Detection is advisory; never fail a turn that was already saved
+            logger.warning(f"Repetition check for conversation {turn.conversation_id} failed: {e}")
+            return None
+    
+    def _clear_partial_generation(self, conversation_id: str, message_id: str) -> None:
+        with self._partial_lock:
+            partial = self._partial_generations.get(conversation_id)
+            if partial and partial["id"] == message_id:
+                del self._partial_generations[conversation_id]
     
     def _start_conversation(self, conversation_id: str, conversation: Conversation) -> Tuple[bool, str]:
         """Start a conversation with the first LLM"""
         try:
             first_llm_name = conversation.llm_participants[0]
-            llm_to_call = ALL_LLMS.get(first_llm_name)
+            llm_to_call = self.llms.get(first_llm_name)
             if not llm_to_call:
                 return False, f"LLM client for {first_llm_name} not found"
             
@@ -125,23 +510,29 @@ class ConversationService:
                 return False, f"API key for {first_llm_name} not found"
             
             initial_prompt = "Hello! Please introduce yourself based on the system prompt and start the conversation."
+            usage = {}
             llm_response_text = llm_to_call(
                 api_key=api_key,
                 prompt=initial_prompt,
                 system_prompt=conversation.system_prompt,
-                chat_history=[]
+                chat_history=[],
+                usage=usage
             )
             
+            message_usage = self.usage_service.price(first_llm_name, usage) if self.usage_service else {}
             llm_start_msg_data = {
                 "conversation_id": conversation_id,
                 "sender_type": 'llm',
                 "sender_id": first_llm_name,
                 "llm_name": first_llm_name,
-                "content": llm_response_text
+                "content": llm_response_text,
+                **message_usage
             }
             llm_start_msg = Message(**llm_start_msg_data)
             
             if self.conversation_repository.add_message(llm_start_msg):
+                if self.usage_service:
+                    self.usage_service.record(conversation.user_id, conversation_id, first_llm_name, message_usage)
                 return True, "Conversation started successfully"
             else:
                 return False, "Failed to save initial LLM message"
@@ -0,0 +1,124 @@
+"""
+bcrypt hashing off the request path.
+
+bcrypt spends ~100+ ms of CPU per call. Under gunicorn's eventlet worker that
+would freeze every greenlet (HTTP requests and live sockets alike), so the work
+runs on real OS threads: eventlet's tpool when eventlet has patched threading,
+a ThreadPoolExecutor otherwise. bcrypt releases the GIL while hashing.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+import bcrypt
+from metrics import PASSWORD_HASH_QUEUE_DEPTH, PASSWORD_HASH_DURATION, PASSWORD_HASH_REJECTED
+
+logger = logging.getLogger(__name__)
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash operations are already waiting"""
+
+def _eventlet_patched() -> bool:
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return False
+    return patcher.is_monkey_patched('thread')
+
+def hash_rounds(password_hash: str) -> Optional[int]:
+    """Cost factor stored in a bcrypt hash ("$2b$12$..." -> 12)"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded worker pool and keeps simple timing stats.
+
+    At most ``max_workers`` hashes run at once and at most ``max_pending``
+    callers may be queued or running; a caller that cannot get a slot within
+    ``queue_timeout`` seconds gets PasswordHasherBusy instead of piling up.
+    """
+
+    def __init__(self, rounds: int = 12, max_workers: int = 4, max_pending: int = 64, queue_timeout: float = 5.0):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._workers = threading.BoundedSemaphore(max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "hash_count": 0,
+            "verify_count": 0,
+            "rehash_count": 0,
+            "rejected_count": 0,
+            "in_flight": 0,
+            "total_seconds": 0.0,
+            "max_seconds": 0.0,
+            "total_wait_seconds": 0.0,
+        }
+
+    def hash(self, password: str) -> str:
+        """Hash a password with the configured cost"""
+        hashed = self._run("hash", lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(self.rounds)))
+        return hashed.decode('utf-8')
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        return self._run("verify", lambda: bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8')))
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """True when the hash was made with a different cost than the configured one"""
+        return hash_rounds(password_hash) != self.rounds
+
+    def record_rehash(self) -> None:
+        with self._stats_lock:
+            self._stats["rehash_count"] += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _run(self, operation: str, fn: Callable):
+        queued_at = time.monotonic()
+        if not self._pending.acquire(timeout=self.queue_timeout):
+            PASSWORD_HASH_REJECTED.inc()
+            with self._stats_lock:
+                self._stats["rejected_count"] += 1
+            logger.warning(f"Password hashing queue is full ({self.max_pending} pending), rejecting request")
+            raise PasswordHasherBusy("Too many logins in progress, please try again shortly")
+        PASSWORD_HASH_QUEUE_DEPTH.inc()
+        try:
+            with self._workers:
+                started_at = time.monotonic()
+                with self._stats_lock:
+                    self._stats["in_flight"] += 1
+                    self._stats["total_wait_seconds"] += started_at - queued_at
+                try:
+                    return self._execute(fn)
+                finally:
+                    elapsed = time.monotonic() - started_at
+                    PASSWORD_HASH_DURATION.observe(elapsed, operation=operation)
+                    with self._stats_lock:
+                        self._stats["in_flight"] -= 1
+                        self._stats[f"{operation}_count"] += 1
+                        self._stats["total_seconds"] += elapsed
+                        self._stats["max_seconds"] = max(self._stats["max_seconds"], elapsed)
+        finally:
+            PASSWORD_HASH_QUEUE_DEPTH.dec()
+            self._pending.release()
+
+    def _execute(self, fn: Callable):
+        if _eventlet_patched():
+            from eventlet import tpool
+            return tpool.execute(fn)
+        return self._get_executor().submit(fn).result()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='bcrypt')
+            return self._executor
@@ -0,0 +1,59 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+from repositories.usage_repository import UsageRepository, USAGE_FIELDS
+from llm_clients import compute_cost
+from metrics import LLM_TOKENS, LLM_COST
+
+logger = logging.getLogger(__name__)
+
+class UsageService:
+    def __init__(self, usage_repository: UsageRepository):
+        self.usage_repository = usage_repository
+    
+    def price(self, provider: str, usage: Dict, batch: bool = False) -> Dict:
+        """Message fields for a provider-reported usage dict, with the computed cost (at batch rates if ``batch``)"""
+        if not usage:
+            return {}
+        fields = {
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+            "cached_tokens": usage.get("cached_tokens", 0)
+        }
+        fields["cost_usd"] = compute_cost(provider, **fields, batch=batch)
+        return fields
+    
+    def record(self, user_id: str, conversation_id: str, provider: str, message_usage: Dict,
+               message_count: int = 1) -> None:
+        """Roll a saved message's usage up into conversation, user and daily totals; ``message_count`` 0 for unsaved replies"""
+        if not message_usage:
+            return
+        for kind in ("input", "output", "cached"):
+            LLM_TOKENS.inc(message_usage.get(f"{kind}_tokens") or 0, provider=provider, kind=kind)
+        LLM_COST.inc(message_usage.get("cost_usd") or 0, provider=provider)
+        try:
+            self.usage_repository.record_usage(
+                user_id, conversation_id, provider, message_usage, message_count=message_count
+            )
+        except Exception as e:
+            # The message is already saved; losing one rollup beats failing the turn
+            logger.error(f"Failed to record usage for conversation {conversation_id}: {e}")
+    
+    def get_usage_report(self, user_id: str, days: int = 30, top: int = 10) -> Dict:
+        """Lifetime totals, per-day aggregates and the most expensive conversations"""
+        since = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        daily = {}
+        for row in self.usage_repository.get_daily_usage(user_id, since):
+            day = daily.setdefault(row["date"], {"date": row["date"], "message_count": 0, "providers": {},
+                                                 **{field: 0 for field in USAGE_FIELDS}})
+            for field in USAGE_FIELDS + ("message_count",):
+                day[field] += row.get(field) or 0
+            day["providers"][row["provider"]] = {
+                field: row.get(field) or 0 for field in USAGE_FIELDS + ("message_count",)
+            }
+        return {
+            "since": since,
+            "totals": self.usage_repository.get_user_totals(user_id),
+            "daily": list(daily.values()),
+            "top_conversations": self.usage_repository.get_top_conversations(user_id, limit=top)
+        }
@@ -1,11 +1,25 @@
-from typing import Optional, Dict, Tuple
+from typing import Optional, Dict, Tuple, Callable
 from repositories.user_repository import UserRepository
 from models.user import User
-import bcrypt
+from services.password_hasher import PasswordHasher
+from cache import TTLCache
+import logging
+
+logger = logging.getLogger(__name__)
 
 class UserService:
-    def __init__(self, user_repository: UserRepository):
+    def __init__(self, user_repository: UserRepository, cache_size: int = 0, cache_ttl: float = 0,
+                 api_key_cache_size: int = 0, api_key_cache_ttl: float = 0,
+                 password_hasher: Optional[PasswordHasher] = None,
+                 invalidation_hook: Optional[Callable[[str], None]] = None):
         self.user_repository = user_repository
+        self.password_hasher = password_hasher or PasswordHasher()
+        # Users loaded for Flask-Login and socket auth
+        self.user_cache = TTLCache(cache_size, cache_ttl)
+        # Decrypted API keys by (user_id, model_name); dropped with their user on every worker when keys change
+        self.api_key_cache = TTLCache(api_key_cache_size, api_key_cache_ttl)
+        # Called with the user id after a local change so other workers can drop their copy
+        self.invalidation_hook = invalidation_hook
     
     def register_user(self, email: str, password: str) -> Tuple[bool, str]:
         """Register a new user"""
@@ -13,7 +27,7 @@ class UserService:
         if existing_user:
             return False, "Email already registered"
         
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        password_hash = self.password_hasher.hash(password)
         
         new_user = User(email=email, password_hash=password_hash)
         success = self.user_repository.create(new_user)
@@ -29,14 +43,51 @@ class UserService:
         if not user:
             return None, "Invalid email or password"
         
-        if not bcrypt.checkpw(password.encode('utf-8'), user.password_hash.encode('utf-8')):
+        if not self.password_hasher.verify(password, user.password_hash):
             return None, "Invalid email or password"
         
+        if self.password_hasher.needs_rehash(user.password_hash):
+            self._rehash_password(user, password)
+        
         return user, "Authentication successful"
     
+    def _rehash_password(self, user: User, password: str) -> None:
+        """Upgrade a stored hash to the configured bcrypt cost after a successful login"""
+        try:
+            new_hash = self.password_hasher.hash(password)
+            if self.user_repository.update_password_hash(user.id, new_hash):
+                user.password_hash = new_hash
+                self.password_hasher.record_rehash()
+                self._user_changed(user.id)
+        except Exception as e:
+            # The login already succeeded; the old hash keeps working until the next attempt
+            logger.warning(f"Failed to rehash password for user {user.id}: {e}")
+    
     def get_user_by_id(self, user_id: str) -> Optional[User]:
-        """Get user by ID"""
-        return self.user_repository.find_by_id(user_id)
+        """Get user by ID, served from the user cache when possible"""
+        cached = self.user_cache.get(user_id)
+        if cached is not None:
+            return cached.model_copy(deep=True)
+        
+        user = self.user_repository.find_by_id(user_id)
+        if user:
+            self.user_cache.set(user_id, user.model_copy(deep=True))
+        return user
+    
+    def invalidate_cached_user(self, user_id: str) -> None:
+        """Drop a user and their decrypted keys from the caches, e.g. when another worker reports a change"""
+        self.user_cache.pop(user_id)
+        self.api_key_cache.pop_matching(lambda key: key[0] == user_id)
+    
+    def clear_cached_users(self) -> None:
+        """Drop every cached user and key, e.g. after missing invalidations from other workers"""
+        self.user_cache.clear()
+        self.api_key_cache.clear()
+    
+    def _user_changed(self, user_id: str) -> None:
+        self.invalidate_cached_user(user_id)
+        if self.invalidation_hook:
+            self.invalidation_hook(user_id)
     
     def update_api_keys(self, user_id: str, api_keys: Dict[str, str]) -> Tuple[bool, str]:
         """Update API keys for a user"""
@@ -44,6 +95,7 @@ class UserService:
             return False, "No valid API keys provided"
         
         success = self.user_repository.update_api_keys(user_id, api_keys)
+        self._user_changed(user_id)
         if success:
             return True, "API keys updated successfully"
         else:
@@ -51,11 +103,21 @@ class UserService:
     
     def get_api_key_decrypted(self, user_id: str, model_name: str) -> Optional[str]:
         """Get decrypted API key for a specific model"""
-        encrypted_key = self.user_repository.get_api_key(user_id, model_name)
-        if encrypted_key:
-            return User.decrypt_api_key(encrypted_key)
-        return None
+        cache_key = (user_id, model_name)
+        api_key = self.api_key_cache.get(cache_key)
+        if api_key is not None:
+            return api_key
+        
+        # The (cached) user document carries every encrypted key, so no per-key query is needed
+        user = self.get_user_by_id(user_id)
+        if not user:
+            return None
+        api_key = User.decrypt_api_key(user.get_encrypted_api_key(model_name))
+        if api_key is not None:
+            self.api_key_cache.set(cache_key, api_key)
+        return api_key
     
     def get_available_models(self, user_id: str) -> Dict[str, bool]:
         """Get available models for a user"""
-        return self.user_repository.get_available_models(user_id) 
\ No newline at end of file
+        user = self.get_user_by_id(user_id)
+        return user.get_available_models() if user else {}
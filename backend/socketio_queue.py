@@ -0,0 +1,73 @@
+"""
+Socket.IO message queue selection for multi-worker deployments.
+
+With a message queue every worker publishes its emits to a shared channel and
+delivers the ones addressed to its own clients, so an emit from any worker
+reaches clients connected to any other worker.
+"""
+import pickle
+import queue
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+import socketio
+
+LOCAL_QUEUE_URL = 'local://'
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """In-process stand-in for a Redis message queue.
+
+    Every manager created with the same channel in this process shares one bus,
+    so tests can run several Socket.IO servers side by side and check that an
+    emit made through one reaches clients of another. Messages are pickled the
+    same way the Redis manager does to catch payloads that would not survive a
+    real queue.
+    """
+    name = 'local'
+
+    _subscribers: Dict[str, List[queue.Queue]] = defaultdict(list)
+    _subscribers_lock = threading.Lock()
+
+    def __init__(self, channel: str = 'socketio', write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self._inbox: Optional[queue.Queue] = None
+        if not write_only:
+            self._inbox = queue.Queue()
+            with self._subscribers_lock:
+                self._subscribers[channel].append(self._inbox)
+
+    def _publish(self, data):
+        payload = pickle.dumps(data)
+        with self._subscribers_lock:
+            inboxes = list(self._subscribers[self.channel])
+        for inbox in inboxes:
+            inbox.put(payload)
+
+    def _listen(self):
+        while True:
+            yield self._inbox.get()
+
+
+def socketio_queue_options(message_queue: Optional[str], channel: str) -> dict:
+    """Keyword arguments for ``SocketIO(...)`` for the configured message queue.
+
+    ``None`` keeps the single-worker in-memory manager, ``local://`` selects the
+    in-process stand-in and anything else (``redis://``, ``rediss://``,
+    ``amqp://``, ``kafka://``) is handed to Flask-SocketIO as a message queue URL.
+    """
+    if not message_queue:
+        return {}
+    if message_queue == LOCAL_QUEUE_URL:
+        return {'client_manager': LocalPubSubManager(channel=channel)}
+    return {'message_queue': message_queue, 'channel': channel}
+
+
+def async_client_manager(message_queue: Optional[str], channel: str):
+    """Client manager for the asyncio Socket.IO server used by the ASGI entry point"""
+    if not message_queue:
+        return None
+    if message_queue.startswith(('redis://', 'rediss://')):
+        return socketio.AsyncRedisManager(message_queue, channel=channel)
+    if message_queue.startswith(('amqp://', 'amqps://')):
+        return socketio.AsyncAioPikaManager(message_queue, channel=channel)
+    raise ValueError(f"SOCKETIO_MESSAGE_QUEUE '{message_queue}' is not supported in ASGI mode; use a redis:// or amqp:// URL")
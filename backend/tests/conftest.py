@@ -0,0 +1,24 @@
+"""
+Test setup: the backend directory on sys.path and a configuration that needs
+no external services (mongomock, the mock LLM, no log file), set before any
+module reads ``config``.
+"""
+import os
+import sys
+
+from cryptography.fernet import Fernet
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault("FLASK_ENV", "development")
+os.environ.setdefault("MONGODB_URI", "mongomock://")
+os.environ.setdefault("FLASK_SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+os.environ.setdefault("LLM_MOCK_MODE", "true")
+os.environ.setdefault("LLM_MOCK_TTFT_MS", "0")
+os.environ.setdefault("LLM_MOCK_DURATION_MS", "0")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("LOG_FILE", "")
+os.environ.setdefault("TRACE_EXPORTER", "none")
@@ -0,0 +1,208 @@
+"""
+Local HTTP server speaking the OpenAI and Anthropic batch APIs.
+
+Serves the endpoints and payload shapes the real SDKs use, so tests can point
+``OPENAI_BASE_URL`` / ``ANTHROPIC_BASE_URL`` at it and run the batch backends
+unchanged:
+
+    OpenAI     POST /v1/files (multipart JSONL upload), POST /v1/batches,
+               GET /v1/batches/{id}, GET /v1/files/{id}/content
+    Anthropic  POST /v1/messages/batches, GET /v1/messages/batches/{id},
+               GET /v1/messages/batches/{id}/results (JSONL)
+
+A batch stays in progress for ``polls_until_done`` status reads, then every
+request is answered by ``respond(provider, params)``, which returns the reply
+text or raises ``FakeRequestError`` to fail that request. Results come back
+in reverse order, as the real APIs do not keep request order either.
+"""
+import email
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+
+class FakeRequestError(Exception):
+    """Raised by a responder to fail one request of a batch"""
+
+
+def _words(text: str) -> int:
+    return len(text.split())
+
+
+class FakeBatchAPI:
+    def __init__(self, respond: Callable[[str, Dict], str], polls_until_done: int = 1):
+        self.respond = respond
+        self.polls_until_done = polls_until_done
+        # What the SDKs sent, for assertions
+        self.uploads: List[List[Dict]] = []
+        self.anthropic_requests: List[List[Dict]] = []
+        self._files: Dict[str, bytes] = {}
+        self._openai_batches: Dict[str, Dict] = {}
+        self._anthropic_batches: Dict[str, Dict] = {}
+        self._polls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _id(self, prefix: str) -> str:
+        with self._lock:
+            self._next_id += 1
+            return f"{prefix}_{self._next_id}"
+
+    def _done(self, batch_id: str) -> bool:
+        with self._lock:
+            self._polls[batch_id] = self._polls.get(batch_id, 0) + 1
+            return self._polls[batch_id] > self.polls_until_done
+
+    # OpenAI
+
+    def _upload(self, content_type: str, body: bytes) -> Dict:
+        message = email.message_from_bytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        parts = {part.get_param("name", header="content-disposition"): part for part in message.get_payload()}
+        content = parts["file"].get_payload(decode=True)
+        file_id = self._id("file")
+        self._files[file_id] = content
+        self.uploads.append([json.loads(line) for line in content.decode().splitlines() if line.strip()])
+        return {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": parts["file"].get_filename(), "purpose": parts["purpose"].get_payload(), "status": "processed"}
+
+    def _create_openai_batch(self, request: Dict) -> Dict:
+        batch = {"id": self._id("batch"), "object": "batch", "endpoint": request["endpoint"],
+                 "input_file_id": request["input_file_id"], "completion_window": request["completion_window"],
+                 "status": "validating", "created_at": int(time.time()),
+                 "output_file_id": None, "error_file_id": None, "errors": None}
+        self._openai_batches[batch["id"]] = batch
+        return batch
+
+    def _retrieve_openai_batch(self, batch_id: str) -> Dict:
+        batch = self._openai_batches[batch_id]
+        if batch["status"] == "completed" or not self._done(batch_id):
+            if batch["status"] == "validating":
+                batch["status"] = "in_progress"
+            return batch
+        output, errors = [], []
+        for line in self.uploads_by_file(batch["input_file_id"]):
+            body = line["body"]
+            base = {"id": self._id("batch_req"), "custom_id": line["custom_id"], "error": None}
+            try:
+                text = self.respond("openai", body)
+            except FakeRequestError as e:
+                errors.append({**base, "response": {"status_code": 400, "request_id": self._id("req"), "body": {
+                    "error": {"message": str(e), "type": "invalid_request_error", "param": None, "code": None}
+                }}})
+                continue
+            prompt_tokens = sum(_words(message["content"]) for message in body["messages"])
+            output.append({**base, "response": {"status_code": 200, "request_id": self._id("req"), "body": {
+                "id": self._id("chatcmpl"), "object": "chat.completion", "created": int(time.time()),
+                "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop", "logprobs": None,
+                             "message": {"role": "assistant", "content": text, "refusal": None}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": _words(text),
+                          "total_tokens": prompt_tokens + _words(text),
+                          "prompt_tokens_details": {"cached_tokens": 0}},
+            }}})
+        batch["status"] = "completed"
+        batch["output_file_id"] = self._store_jsonl(output)
+        batch["error_file_id"] = self._store_jsonl(errors)
+        return batch
+
+    def uploads_by_file(self, file_id: str) -> List[Dict]:
+        return [json.loads(line) for line in self._files[file_id].decode().splitlines() if line.strip()]
+
+    def _store_jsonl(self, lines: List[Dict]) -> Optional[str]:
+        if not lines:
+            return None
+        file_id = self._id("file")
+        self._files[file_id] = "\n".join(json.dumps(line) for line in reversed(lines)).encode()
+        return file_id
+
+    # Anthropic
+
+    def _create_anthropic_batch(self, request: Dict) -> Dict:
+        self.anthropic_requests.append(request["requests"])
+        batch = {"id": self._id("msgbatch"), "type": "message_batch", "processing_status": "in_progress",
+                 "request_counts": {"processing": len(request["requests"]), "succeeded": 0, "errored": 0,
+                                    "canceled": 0, "expired": 0},
+                 "created_at": "2026-01-01T00:00:00Z", "expires_at": "2026-01-02T00:00:00Z",
+                 "ended_at": None, "cancel_initiated_at": None, "archived_at": None, "results_url": None,
+                 "_requests": request["requests"]}
+        self._anthropic_batches[batch["id"]] = batch
+        return batch
+
+    def _retrieve_anthropic_batch(self, batch_id: str) -> Dict:
+        batch = self._anthropic_batches[batch_id]
+        if batch["processing_status"] != "ended" and self._done(batch_id):
+            batch["processing_status"] = "ended"
+            batch["ended_at"] = "2026-01-01T00:05:00Z"
+            batch["results_url"] = f"{self.url}/v1/messages/batches/{batch_id}/results"
+        return {key: value for key, value in batch.items() if not key.startswith("_")}
+
+    def _anthropic_results(self, batch_id: str) -> bytes:
+        lines = []
+        for request in self._anthropic_batches[batch_id]["_requests"]:
+            params = request["params"]
+            try:
+                text = self.respond("claude", params)
+            except FakeRequestError as e:
+                lines.append({"custom_id": request["custom_id"], "result": {"type": "errored", "error": {
+                    "type": "error", "error": {"type": "invalid_request_error", "message": str(e)}
+                }}})
+                continue
+            input_tokens = sum(_words(message["content"]) for message in params["messages"])
+            lines.append({"custom_id": request["custom_id"], "result": {"type": "succeeded", "message": {
+                "id": self._id("msg"), "type": "message", "role": "assistant", "model": params["model"],
+                "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None,
+                "usage": {"input_tokens": input_tokens, "output_tokens": _words(text),
+                          "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0},
+            }}})
+        return "\n".join(json.dumps(line) for line in reversed(lines)).encode()
+
+    # HTTP
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, body, content_type: str = "application/json", status: int = 200):
+                payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path == "/v1/files":
+                    return self._reply(api._upload(self.headers["Content-Type"], body))
+                if self.path == "/v1/batches":
+                    return self._reply(api._create_openai_batch(json.loads(body)))
+                if self.path == "/v1/messages/batches":
+                    return self._reply({key: value for key, value in api._create_anthropic_batch(json.loads(body)).items()
+                                        if not key.startswith("_")})
+                self._reply({"error": {"message": f"No route {self.path}"}}, status=404)
+
+            def do_GET(self):
+                parts = self.path.strip("/").split("/")
+                if parts[:2] == ["v1", "batches"]:
+                    return self._reply(api._retrieve_openai_batch(parts[2]))
+                if parts[:2] == ["v1", "files"] and parts[-1] == "content":
+                    return self._reply(api._files[parts[2]], "application/octet-stream")
+                if parts[:3] == ["v1", "messages", "batches"] and parts[-1] == "results":
+                    return self._reply(api._anthropic_results(parts[3]), "application/binary")
+                if parts[:3] == ["v1", "messages", "batches"]:
+                    return self._reply(api._retrieve_anthropic_batch(parts[3]))
+                self._reply({"error": {"message": f"No route {self.path}"}}, status=404)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
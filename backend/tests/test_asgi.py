@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+from flask import Flask
+from flask_login import LoginManager, UserMixin, login_user
+
+from asgi import _session_user
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class _User(UserMixin):
+    def __init__(self, user_id: str):
+        self.id = user_id
+
+
+def _flask_app() -> Flask:
+    flask_app = Flask(__name__)
+    flask_app.secret_key = "test"
+    login_manager = LoginManager(flask_app)
+    login_manager.session_protection = "strong"
+    login_manager.user_loader(_User)
+
+    @flask_app.route("/login")
+    def login():
+        login_user(_User("u1"))
+        return "ok"
+
+    return flask_app
+
+
+def _handshake(cookie: str, client_address: str) -> dict:
+    """The parts of python-socketio's ASGI environ that the session lookup reads"""
+    return {
+        "PATH_INFO": "/socket.io/",
+        "REMOTE_ADDR": "127.0.0.1",
+        "HTTP_COOKIE": f"session={cookie}",
+        "HTTP_USER_AGENT": "test-agent",
+        "asgi.scope": {"client": (client_address, 50000)},
+    }
+
+
+def test_handshake_session_cookie_logs_the_socket_in():
+    flask_app = _flask_app()
+    client = flask_app.test_client()
+    client.get("/login", headers={"User-Agent": "test-agent"}, environ_base={"REMOTE_ADDR": "10.0.0.1"})
+    cookie = client.get_cookie("session").value
+
+    assert _session_user(flask_app, _handshake(cookie, "10.0.0.1")).id == "u1"
+    # Strong session protection still rejects the cookie from another address
+    assert _session_user(flask_app, _handshake(cookie, "10.0.0.2")) is None
+    assert _session_user(flask_app, {"PATH_INFO": "/socket.io/"}) is None
+
+
+def test_importing_asgi_does_not_import_app():
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, asgi; assert 'app' not in sys.modules"],
+        cwd=BACKEND_DIR, env={**os.environ, "PYTHONPATH": BACKEND_DIR}, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
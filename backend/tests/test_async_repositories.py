@@ -0,0 +1,142 @@
+import asyncio
+from datetime import datetime, timezone
+
+import mongomock
+
+from controllers.async_socket_controller import AsyncSocketController
+from controllers.socket_controller import conversation_room
+from metrics import DB_OPERATION_LATENCY
+from models import Conversation, Message
+from repositories.async_conversation_repository import AsyncConversationRepository
+from repositories.conversation_repository import ConversationRepository
+from repositories.message_buffer import MessageWriteBuffer
+from test_socket_controller import FakeTransport
+
+
+class _AsyncCursor:
+    """The parts of motor's cursor the repositories use, over a mongomock cursor"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    async def to_list(self, length=None):
+        docs = list(self._cursor)
+        return docs if length is None else docs[:length]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self._cursor:
+            yield doc
+
+
+class _AsyncCollection:
+    """A motor-style collection: the mongomock methods, awaitable"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs):
+        return _AsyncCursor(self._collection.find(*args, **kwargs))
+
+    def aggregate(self, pipeline):
+        return _AsyncCursor(self._collection.aggregate(pipeline))
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+class _AsyncDatabase:
+    def __init__(self, db):
+        self._db = db
+
+    def __getattr__(self, name):
+        return _AsyncCollection(self._db[name])
+
+
+class _FakeServer:
+    """Records what AsyncSocketController sends through the AsyncServer"""
+
+    def __init__(self):
+        self.emitted = []
+        self.rooms = set()
+
+    async def emit(self, event, data, to=None):
+        self.emitted.append((event, data))
+
+    async def enter_room(self, sid, room):
+        self.rooms.add(room)
+
+
+def _message(conversation_id: str, message_id: str, microsecond: int) -> Message:
+    return Message(id=message_id, conversation_id=conversation_id, sender_type="user", sender_id="user-1",
+                   content=message_id, created_at=datetime(2026, 1, 1, 12, 0, 0, microsecond, tzinfo=timezone.utc))
+
+
+def _repositories():
+    db = mongomock.MongoClient().db
+    buffer = MessageWriteBuffer(db.messages, max_size=100, flush_interval=3600)
+    repository = ConversationRepository(db, message_buffer=buffer)
+    async_repository = AsyncConversationRepository(_AsyncDatabase(db), message_buffer=buffer)
+    return repository, async_repository, buffer
+
+
+def test_async_repository_reads_what_the_sync_repository_reads():
+    repository, async_repository, buffer = _repositories()
+    conversation_id = asyncio.run(async_repository.create_conversation(
+        Conversation(name="c", system_prompt="", llm_participants=["claude"], user_id="user-1")
+    ))
+    asyncio.run(async_repository.add_message(_message(conversation_id, "m-b", 100)))
+    buffer.flush()
+    repository.add_message(_message(conversation_id, "m-a", 400))
+    repository.add_message(_message(conversation_id, "m-c", 700))
+
+    expected = repository.get_conversation_with_messages(conversation_id)
+    assert asyncio.run(async_repository.get_conversation_with_messages(conversation_id)) == expected
+    assert (asyncio.run(async_repository.get_conversation_with_messages_since(conversation_id, "m-a"))
+            == repository.get_conversation_with_messages_since(conversation_id, "m-a"))
+    assert ([c.id for c in asyncio.run(async_repository.find_by_user_id("user-1"))]
+            == [c.id for c in repository.find_by_user_id("user-1")])
+    buffer.close()
+
+
+def test_async_repository_methods_are_timed():
+    _, async_repository, buffer = _repositories()
+    before = DB_OPERATION_LATENCY.count(repository="AsyncConversationRepository", method="find_by_id")
+
+    asyncio.run(async_repository.find_by_id("missing"))
+
+    assert DB_OPERATION_LATENCY.count(repository="AsyncConversationRepository", method="find_by_id") == before + 1
+    buffer.close()
+
+
+def test_sync_conversation_sends_the_missed_messages_from_the_async_repository():
+    repository, async_repository, buffer = _repositories()
+    conversation_id = repository.create_conversation(
+        Conversation(name="c", system_prompt="", llm_participants=["claude"], user_id="user-1")
+    )
+    for message_id, microsecond in (("m-a", 100), ("m-b", 400)):
+        repository.add_message(_message(conversation_id, message_id, microsecond))
+    sio = _FakeServer()
+    conversation_service = type("Service", (), {"get_partial_generation": lambda self, _: None})()
+    controller = AsyncSocketController(async_repository, None, conversation_service, sio, FakeTransport())
+
+    asyncio.run(controller.handle_sync_conversation({"conversation_id": conversation_id, "last_message_id": "m-a"}))
+
+    event, data = sio.emitted[-1]
+    assert event == "conversation_sync"
+    assert [message["id"] for message in data["messages"]] == ["m-b"]
+    assert conversation_room(conversation_id) in sio.rooms
+
+    asyncio.run(controller.handle_join_conversation({"conversation_id": "someone-elses"}))
+    assert sio.emitted[-1] == ("error", {"message": "Conversation someone-elses not found"})
+    buffer.close()
@@ -0,0 +1,133 @@
+import json
+from types import SimpleNamespace
+
+import mongomock
+import pytest
+
+from batch.runner import ProviderBatchRunner
+from batch.spec import BatchJob
+from fake_batch_api import FakeBatchAPI, FakeRequestError
+from llm_clients import chatgpt_client, claude_client
+from llm_clients.batch_api import (
+    AnthropicBatchBackend, BatchRequest, OpenAIBatchBackend, COMPLETED, PENDING
+)
+from repositories.conversation_repository import ConversationRepository
+from repositories.usage_repository import UsageRepository
+from services.conversation_service import ConversationService
+from services.usage_service import UsageService
+
+
+def _system_prompt(params: dict) -> str:
+    if "system" in params:
+        return params["system"]
+    return next(message["content"] for message in params["messages"] if message["role"] == "system")
+
+
+def _respond(provider: str, params: dict) -> str:
+    if "fail" in _system_prompt(params):
+        raise FakeRequestError("rejected")
+    return f"{provider} answers ({params['messages'][-1]['content'][:30]})"
+
+
+@pytest.fixture
+def api(monkeypatch):
+    server = FakeBatchAPI(_respond)
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{server.url}/v1")
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", server.url)
+    yield server
+    server.close()
+
+
+def _requests() -> list:
+    return [
+        BatchRequest("ok-1", "first", "be brief", []),
+        BatchRequest("ok-2", "second", "be brief", [{"role": "user", "content": "earlier"}]),
+        BatchRequest("bad", "third", "fail this one", []),
+    ]
+
+
+@pytest.mark.parametrize("backend, max_tokens", [
+    (OpenAIBatchBackend(), chatgpt_client.MAX_TOKENS),
+    (AnthropicBatchBackend(), claude_client.MAX_TOKENS),
+])
+def test_backend_round_trip(api, backend, max_tokens):
+    batch_id = backend.submit("key", _requests())
+
+    if backend.provider == "openai":
+        [lines] = api.uploads
+        assert [line["custom_id"] for line in lines] == ["ok-1", "ok-2", "bad"]
+        assert {line["url"] for line in lines} == {"/v1/chat/completions"}
+        bodies = [line["body"] for line in lines]
+        assert bodies[1]["messages"][-2:] == [{"role": "user", "content": "earlier"}, {"role": "user", "content": "second"}]
+    else:
+        [requests] = api.anthropic_requests
+        assert [request["custom_id"] for request in requests] == ["ok-1", "ok-2", "bad"]
+        bodies = [request["params"] for request in requests]
+        assert bodies[0]["system"] == "be brief"
+    # Same reply length cap as the interactive client
+    assert {body["max_tokens"] for body in bodies} == {max_tokens}
+
+    assert backend.status("key", batch_id) == PENDING
+    assert backend.status("key", batch_id) == COMPLETED
+    results = {result.custom_id: result for result in backend.results("key", batch_id)}
+
+    assert results["ok-1"].text == f"{backend.provider} answers (first)"
+    assert results["ok-1"].error is None
+    assert results["ok-2"].usage["input_tokens"] >= 2 and results["ok-2"].usage["output_tokens"] == 3
+    assert results["bad"].text is None and "rejected" in results["bad"].error
+
+
+def test_openai_line_parsing():
+    ok = OpenAIBatchBackend._parse_line({"custom_id": "a", "error": None, "response": {"status_code": 200, "body": {
+        "choices": [{"message": {"content": "hi"}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 2, "prompt_tokens_details": {"cached_tokens": 4}},
+    }}})
+    assert ok.text == "hi" and ok.usage["cached_tokens"] == 4
+
+    expired = OpenAIBatchBackend._parse_line({"custom_id": "b", "response": None,
+                                              "error": {"code": "batch_expired", "message": "expired"}})
+    assert expired.text is None and "batch_expired" in expired.error
+
+
+def _runner(api, tmp_path, users_keys=("openai", "claude")):
+    db = mongomock.MongoClient().db
+    user_service = SimpleNamespace(
+        get_available_models=lambda user_id: {name: True for name in users_keys},
+        get_api_key_decrypted=lambda user_id, llm_name: f"{llm_name}-key",
+    )
+    service = ConversationService(
+        ConversationRepository(db), user_service, usage_service=UsageService(UsageRepository(db)),
+        llms={"openai": lambda **kwargs: "live call", "claude": lambda **kwargs: "live call"}, llm_streams={}
+    )
+    output = tmp_path / "batch.jsonl"
+    return ProviderBatchRunner(service, "user-1", str(output), batch_name="t", poll_interval=0.01), service, output
+
+
+def test_provider_batch_runner_writes_replies_back_in_order(api, tmp_path):
+    runner, service, output = _runner(api, tmp_path)
+    jobs = [BatchJob(f"job-{index}", "p", f"topic {index}", ("openai", "claude"), 3, 0) for index in range(3)]
+    jobs.append(BatchJob("job-fail", "p", "fail please", ("openai", "claude"), 3, 0))
+
+    stats = runner.run(jobs, resume=False)
+
+    assert stats["completed"] == 3 and stats["failed"] == 1 and stats["turns"] == 9
+    # One openai and one claude batch per round, three rounds
+    assert len(api.uploads) == 2 and len(api.anthropic_requests) == 1
+
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    started = {record["job_id"]: record["conversation_id"] for record in records if record["type"] == "job_started"}
+    for index in range(3):
+        messages = service.conversation_repository.get_messages(started[f"job-{index}"])
+        assert [message.llm_name for message in messages] == ["openai", "claude", "openai"]
+        # Each reply answers the one before it
+        assert messages[0].content.startswith("openai answers (Hello!")
+        assert messages[1].content == f"claude answers ({messages[0].content[:30]})"
+        assert messages[2].content == f"openai answers ({messages[1].content[:30]})"
+        assert all(message.input_tokens and message.cost_usd is not None for message in messages)
+        turns = [record for record in records if record["type"] == "turn" and record["job_id"] == f"job-{index}"]
+        assert [turn["turn"] for turn in turns] == [1, 2, 3]
+        assert [turn["content"] for turn in turns] == [message.content for message in messages]
+
+    failed = next(record for record in records if record["type"] == "job_finished" and record["job_id"] == "job-fail")
+    assert failed["status"] == "failed" and "rejected" in failed["error"]
+    assert service.conversation_repository.get_messages(started["job-fail"]) == []
@@ -0,0 +1,66 @@
+import mongomock
+
+from cache_invalidation import LocalInvalidationBus, CONVERSATION
+from models import Conversation
+from repositories.conversation_repository import ConversationRepository
+
+
+def _worker(db, channel: str):
+    """One worker's conversation repository, wired to the shared bus like create_repositories does"""
+    bus = LocalInvalidationBus(channel)
+    repository = ConversationRepository(
+        db, cache_size=16, cache_ttl=600,
+        invalidation_hook=lambda conversation_id: bus.publish(CONVERSATION, conversation_id)
+    )
+    bus.subscribe(CONVERSATION, repository.invalidate_cached_conversation, repository.conversation_cache.clear)
+    return bus, repository
+
+
+def test_change_on_one_worker_reaches_the_other_workers_cache():
+    db = mongomock.MongoClient().db
+    bus_a, worker_a = _worker(db, "test-invalidation")
+    bus_b, worker_b = _worker(db, "test-invalidation")
+    try:
+        conversation_id = worker_a.create_conversation(
+            Conversation(name="c", system_prompt="old", llm_participants=["claude"])
+        )
+        assert worker_b.find_by_id(conversation_id).system_prompt == "old"
+
+        worker_a.update_system_prompt(conversation_id, "new")
+
+        assert worker_b.find_by_id(conversation_id).system_prompt == "new"
+    finally:
+        bus_a.close()
+        bus_b.close()
+
+
+def test_user_change_on_one_worker_reaches_the_other_workers_cache():
+    from cache_invalidation import USER
+    from models.user import User
+    from repositories.user_repository import UserRepository
+    from services.user_service import UserService
+
+    db = mongomock.MongoClient().db
+    workers = []
+    for _ in range(2):
+        bus = LocalInvalidationBus("test-user-invalidation")
+        service = UserService(
+            UserRepository(db), cache_size=16, cache_ttl=600, api_key_cache_size=16, api_key_cache_ttl=600,
+            invalidation_hook=lambda user_id, bus=bus: bus.publish(USER, user_id)
+        )
+        bus.subscribe(USER, service.invalidate_cached_user, service.clear_cached_users)
+        workers.append((bus, service))
+    (bus_a, worker_a), (bus_b, worker_b) = workers
+    try:
+        user = User(email="user@example.com", password_hash="x")
+        UserRepository(db).create(user)
+        worker_a.update_api_keys(user.id, {"claude": "old-key"})
+        assert worker_b.get_api_key_decrypted(user.id, "claude") == "old-key"
+
+        worker_a.update_api_keys(user.id, {"claude": "new-key"})
+
+        assert worker_b.get_user_by_id(user.id).get_available_models()["claude"]
+        assert worker_b.get_api_key_decrypted(user.id, "claude") == "new-key"
+    finally:
+        bus_a.close()
+        bus_b.close()
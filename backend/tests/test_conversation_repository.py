@@ -0,0 +1,69 @@
+from datetime import datetime, timezone
+
+import mongomock
+
+from models import Conversation, Message
+from repositories.conversation_repository import ConversationRepository
+from repositories.message_buffer import MessageWriteBuffer
+from repositories.usage_repository import UsageRepository
+
+
+def _message(conversation_id: str, message_id: str, microsecond: int) -> Message:
+    # Messages in the same millisecond; Mongo keeps only the milliseconds
+    return Message(id=message_id, conversation_id=conversation_id, sender_type="user", sender_id="u",
+                   content=message_id, created_at=datetime(2026, 1, 1, 12, 0, 0, microsecond, tzinfo=timezone.utc))
+
+
+def _ids(msg_docs) -> list:
+    return [doc["_id"] for doc in msg_docs]
+
+
+def test_since_returns_exactly_the_messages_after_the_anchor():
+    repository = ConversationRepository(mongomock.MongoClient().db)
+    conversation_id = repository.create_conversation(Conversation(name="c", system_prompt="", llm_participants=["claude"]))
+    for message_id, microsecond in (("m-b", 100), ("m-a", 400), ("m-c", 700), ("m-d", 5000)):
+        repository.add_message(_message(conversation_id, message_id, microsecond))
+
+    ordered = _ids(repository._find_message_docs(conversation_id))
+    assert ordered == ["m-a", "m-b", "m-c", "m-d"]
+    for index, message_id in enumerate(ordered):
+        assert _ids(repository.get_message_docs_since(conversation_id, message_id)) == ordered[index + 1:]
+
+
+def test_since_uses_the_same_order_for_buffered_messages():
+    db = mongomock.MongoClient().db
+    buffer = MessageWriteBuffer(db.messages, max_size=100, flush_interval=3600)
+    repository = ConversationRepository(db, message_buffer=buffer)
+    conversation_id = repository.create_conversation(Conversation(name="c", system_prompt="", llm_participants=["claude"]))
+    repository.add_message(_message(conversation_id, "m-b", 100))
+    buffer.flush()
+    repository.add_message(_message(conversation_id, "m-a", 400))
+    repository.add_message(_message(conversation_id, "m-c", 700))
+
+    assert _ids(repository._find_message_docs(conversation_id)) == ["m-a", "m-b", "m-c"]
+    assert _ids(repository.get_message_docs_since(conversation_id, "m-a")) == ["m-b", "m-c"]
+    assert _ids(repository.get_message_docs_since(conversation_id, "m-b")) == ["m-c"]
+    assert repository.get_message_docs_since(conversation_id, "m-c") == []
+    buffer.close()
+
+
+def test_conversation_carries_its_usage_rollup():
+    db = mongomock.MongoClient().db
+    repository = ConversationRepository(db)
+    conversation_id = repository.create_conversation(
+        Conversation(name="c", system_prompt="", llm_participants=["claude"], user_id="u",
+                     updated_at=datetime(2026, 1, 1, tzinfo=timezone.utc))
+    )
+    usage_repository = UsageRepository(db)
+    version = repository.get_user_conversations_version("u")
+    for cost in (0.25, 0.5):
+        usage_repository.record_usage("u", conversation_id, "claude",
+                                      {"input_tokens": 10, "output_tokens": 5, "cached_tokens": 2, "cost_usd": cost})
+
+    expected = {"input_tokens": 20, "output_tokens": 10, "cached_tokens": 4, "cost_usd": 0.75, "message_count": 2}
+    assert repository.get_conversation_with_messages(conversation_id)["usage"] == expected
+    repository.invalidate_cached_conversation(conversation_id)
+    usage = repository.find_by_id(conversation_id).usage
+    assert usage.model_dump() == expected and isinstance(usage.input_tokens, int)
+    # The totals are part of the list response, so its version has to move with them
+    assert repository.get_user_conversations_version("u")["last_modified"] > version["last_modified"]
@@ -0,0 +1,148 @@
+import time
+
+from flask import Flask, request
+from flask_socketio import SocketIO
+
+from controllers.emission_buffer import (
+    LEVEL_COARSE, LEVEL_FINAL_ONLY, LEVEL_STREAM, StreamEmissionBuffer
+)
+from controllers.socket_transport import FlaskSocketTransport
+
+
+class _Client:
+    """Records emitted frames and keeps their ack callbacks for the test to call"""
+
+    def __init__(self):
+        self.frames = []
+        self.acks = []
+
+    def emit(self, event, data, to=None, callback=None):
+        self.frames.append(data)
+        self.acks.append(callback)
+
+    def text(self) -> str:
+        return "".join(frame["delta"] for frame in self.frames)
+
+
+def _push(buffer, delta, message_id="m1"):
+    buffer.push("s1", "c1", message_id, "gpt", delta)
+
+
+def test_background_flush_sends_deltas_when_the_provider_pauses():
+    client = _Client()
+    buffer = StreamEmissionBuffer(client.emit, frame_interval=0.02)
+    _push(buffer, "Hello")
+    _push(buffer, " world")
+
+    deadline = time.monotonic() + 2
+    while client.text() != "Hello world" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert client.text() == "Hello world"
+    buffer.remove_client("s1")
+
+
+def test_flush_due_only_sends_streams_whose_window_has_passed():
+    client = _Client()
+    buffer = StreamEmissionBuffer(client.emit, frame_interval=3600, background_flush=False)
+    _push(buffer, "Hello")
+    buffer.flush_due()
+    assert client.frames == []
+
+    buffer.frame_interval = 0
+    buffer.flush_due()
+    assert client.text() == "Hello"
+
+
+def test_final_only_client_steps_back_up_on_its_next_ack():
+    client = _Client()
+    buffer = StreamEmissionBuffer(client.emit, frame_interval=0, max_frame_bytes=1, soft_limit_bytes=4,
+                                  hard_limit_bytes=8, background_flush=False)
+    _push(buffer, "0123456789")
+    assert buffer.level("s1") == LEVEL_FINAL_ONLY
+    _push(buffer, "dropped")
+    assert len(client.frames) == 1
+
+    client.acks[0]()
+    assert buffer.level("s1") == LEVEL_STREAM
+    # The message that lost deltas waits for its final update; the next one streams again
+    _push(buffer, "more")
+    buffer.finish("s1", "m1")
+    _push(buffer, "next", message_id="m2")
+    assert [frame["delta"] for frame in client.frames] == ["0123456789", "next"]
+
+
+def test_final_only_times_out_for_a_client_that_never_acks():
+    client = _Client()
+    buffer = StreamEmissionBuffer(client.emit, frame_interval=0, max_frame_bytes=1, soft_limit_bytes=4,
+                                  hard_limit_bytes=8, final_only_timeout=0.05, background_flush=False)
+    _push(buffer, "0123456789")
+    assert buffer.level("s1") == LEVEL_FINAL_ONLY
+
+    time.sleep(0.06)
+    assert buffer.level("s1") == LEVEL_COARSE
+    assert buffer.unacked_bytes("s1") == 0
+    _push(buffer, "next", message_id="m2")
+    buffer.finish("s1", "m2")
+    assert client.frames[-1]["delta"] == "next"
+
+
+def _flask_socketio():
+    """Flask-SocketIO server with one connected test client; returns (socketio, client, client sid)"""
+    flask_app = Flask(__name__)
+    socketio = SocketIO(flask_app, async_mode="threading")
+    sids = []
+
+    @socketio.on("connect")
+    def connect():
+        sids.append(request.sid)
+
+    client = socketio.test_client(flask_app)
+    return socketio, client, sids[0]
+
+
+def _wait_for_deltas(client, expected: str) -> str:
+    text, deadline = "", time.monotonic() + 2
+    while text != expected and time.monotonic() < deadline:
+        text += "".join(event["args"][0]["delta"] for event in client.get_received() if event["name"] == "message_delta")
+        time.sleep(0.01)
+    return text
+
+
+def test_background_flush_emits_through_the_flask_socketio_transport():
+    socketio, client, sid = _flask_socketio()
+    # The flusher thread has no app context, so the transport must not need one
+    buffer = StreamEmissionBuffer(FlaskSocketTransport(socketio).emit_to_client, frame_interval=0.02)
+    buffer.push(sid, "c1", "m1", "gpt", "Hello")
+    buffer.push(sid, "c1", "m1", "gpt", " world")
+
+    assert _wait_for_deltas(client, "Hello world") == "Hello world"
+    buffer.push(sid, "c1", "m2", "gpt", "again")
+    assert _wait_for_deltas(client, "again") == "again"
+    assert buffer._flusher.is_alive()
+
+
+def test_failed_background_emit_keeps_the_flusher_running():
+    failures = []
+
+    def failing_emit(event, data, to=None, callback=None):
+        failures.append(data["delta"])
+        raise RuntimeError("Working outside of application context.")
+
+    buffer = StreamEmissionBuffer(failing_emit, frame_interval=0.02)
+    _push(buffer, "lost")
+    deadline = time.monotonic() + 2
+    # The emit records the frame before it raises, so also wait for the failure to be handled
+    while (not failures or buffer.unacked_bytes("s1")) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert failures == ["lost"]
+    # The frame never left, so it does not count against the client, and the rest of the message is not sent
+    assert buffer.unacked_bytes("s1") == 0
+    _push(buffer, " more")
+    time.sleep(0.1)
+    assert failures == ["lost"]
+    _push(buffer, "next", message_id="m2")
+    deadline = time.monotonic() + 2
+    while len(failures) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert failures == ["lost", "next"] and buffer._flusher.is_alive()
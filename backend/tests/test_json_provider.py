@@ -0,0 +1,15 @@
+from datetime import datetime, timezone
+
+import json_provider
+from json_provider import to_jsonable
+
+
+def test_naive_and_aware_datetimes_encode_alike(monkeypatch):
+    aware = datetime(2024, 5, 1, 12, 30, 0, 123000, tzinfo=timezone.utc)
+    naive = aware.replace(tzinfo=None)
+    expected = ["2024-05-01T12:30:00.123000Z"] * 2
+
+    assert to_jsonable([aware, naive]) == expected
+    # The standard library fallback matches orjson
+    monkeypatch.setattr(json_provider, "orjson", None)
+    assert to_jsonable([aware, naive]) == expected
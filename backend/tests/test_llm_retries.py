@@ -0,0 +1,102 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from config import Config
+from llm_clients import claude_client, deepseek_client
+from llm_clients.chatgpt_client import get_chatgpt_response
+from metrics import LLM_RETRIES
+
+OPENAI_REPLY = {
+    "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "hi"}}],
+    "usage": {"prompt_tokens": 3, "completion_tokens": 1, "total_tokens": 4}
+}
+CLAUDE_REPLY = {
+    "id": "msg_1", "type": "message", "role": "assistant", "model": "claude", "stop_reason": "end_turn",
+    "content": [{"type": "text", "text": "hi"}], "usage": {"input_tokens": 3, "output_tokens": 1}
+}
+
+
+class _FlakyProvider:
+    """Local HTTP server that answers 503 ``failures`` times, then ``reply``"""
+
+    def __init__(self, reply: dict, failures: int = 1):
+        provider = self
+        self.failures = failures
+        self.requests = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                provider.requests += 1
+                if provider.failures:
+                    provider.failures -= 1
+                    status, body = 503, {"error": {"message": "overloaded", "type": "overloaded_error"}}
+                else:
+                    status, body = 200, reply
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                # Keeps the SDK's backoff short
+                self.send_header("Retry-After", "0")
+                self.send_header("retry-after-ms", "10")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def provider(request):
+    server = _FlakyProvider(request.param)
+    yield server
+    server.close()
+
+
+@pytest.mark.parametrize("provider", [OPENAI_REPLY], indirect=True)
+def test_openai_sdk_retries_are_counted(provider, monkeypatch):
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{provider.url}/v1")
+    retries = LLM_RETRIES.value(provider="openai")
+
+    assert get_chatgpt_response("key", "hello") == "hi"
+    assert provider.requests == 2
+    assert LLM_RETRIES.value(provider="openai") == retries + 1
+
+
+@pytest.mark.parametrize("provider", [CLAUDE_REPLY], indirect=True)
+def test_anthropic_sdk_retries_are_counted(provider, monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", provider.url)
+    retries = LLM_RETRIES.value(provider="claude")
+
+    assert claude_client.get_claude_response("key", "hello") == "hi"
+    assert LLM_RETRIES.value(provider="claude") == retries + 1
+
+
+@pytest.mark.parametrize("provider", [OPENAI_REPLY], indirect=True)
+def test_deepseek_retries_unavailable_responses(provider, monkeypatch):
+    monkeypatch.setattr(deepseek_client, "DEEPSEEK_API_URL", f"{provider.url}/v1/chat/completions")
+    retries = LLM_RETRIES.value(provider="deepseek")
+
+    assert deepseek_client.get_deepseek_response("key", "hello") == "hi"
+    assert provider.requests == 2
+    assert LLM_RETRIES.value(provider="deepseek") == retries + 1
+
+
+def test_metrics_need_a_token_when_enabled(monkeypatch):
+    monkeypatch.setattr(Config, "METRICS_ENABLED", True)
+    monkeypatch.setattr(Config, "METRICS_TOKEN", None)
+    with pytest.raises(ValueError, match="METRICS_TOKEN"):
+        Config.validate()
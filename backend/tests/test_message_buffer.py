@@ -0,0 +1,87 @@
+import mongomock
+
+from metrics import MESSAGE_BUFFER_PENDING
+from repositories.message_buffer import MessageWriteBuffer
+
+
+class _FailingCollection:
+    """Delegates to a mongomock collection, failing the next ``failures`` insert_many calls"""
+
+    def __init__(self, collection, failures: int):
+        self.collection = collection
+        self.failures = failures
+
+    def insert_many(self, docs, ordered=True):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("network error")
+        return self.collection.insert_many(docs, ordered=ordered)
+
+
+def _doc(n: int, conversation_id: str = "c1") -> dict:
+    return {"_id": f"m{n}", "conversation_id": conversation_id, "content": str(n)}
+
+
+def _buffer(collection, **kwargs) -> MessageWriteBuffer:
+    # A long interval keeps the background flusher out of the way; tests flush explicitly
+    return MessageWriteBuffer(collection, max_size=100, flush_interval=3600, **kwargs)
+
+
+def test_already_written_documents_do_not_block_a_retry():
+    messages = mongomock.MongoClient().db.messages
+    messages.insert_one(_doc(1))
+    buffer = _buffer(messages)
+    for n in (1, 2, 3):
+        buffer.add(_doc(n))
+
+    assert buffer.flush() == 3
+    assert buffer.pending_count("c1") == 0
+    assert sorted(doc["_id"] for doc in messages.find()) == ["m1", "m2", "m3"]
+    buffer.close()
+
+
+def test_failed_flush_is_retried_then_dead_lettered():
+    db = mongomock.MongoClient().db
+    collection = _FailingCollection(db.messages, failures=2)
+    buffer = _buffer(collection, max_attempts=2, dead_letter=db.messages_dead_letter)
+    buffer.add(_doc(1))
+
+    assert buffer.flush() == 0
+    assert buffer.pending_count("c1") == 1
+    assert buffer.flush() == 0
+    assert buffer.pending_count("c1") == 0
+    assert [doc["_id"] for doc in db.messages_dead_letter.find()] == ["m1"]
+    buffer.close()
+
+
+def test_pending_documents_stay_readable_until_written():
+    messages = mongomock.MongoClient().db.messages
+    buffer = _buffer(messages)
+    buffer.add(_doc(1))
+    buffer.add(_doc(2, "c2"))
+
+    assert [doc["_id"] for doc in buffer.pending_for("c1")] == ["m1"]
+    buffer.flush()
+    assert buffer.pending_for("c1") == []
+    assert messages.count_documents({}) == 2
+    buffer.close()
+
+
+def test_discard_keeps_the_pending_gauge_in_step():
+    buffer = _buffer(mongomock.MongoClient().db.messages)
+    buffer.add(_doc(1))
+    buffer.add(_doc(2, "c2"))
+
+    buffer.discard("c1")
+    assert MESSAGE_BUFFER_PENDING.value() == 1 == buffer.pending_count("c2")
+    buffer.close()
+
+
+def test_full_buffer_refuses_new_documents():
+    # Every flush fails, so nothing ever leaves the buffer
+    collection = _FailingCollection(None, failures=1000)
+    buffer = MessageWriteBuffer(collection, max_size=2, flush_interval=3600, max_pending=2, max_attempts=1000)
+
+    assert buffer.add(_doc(1))
+    assert buffer.add(_doc(2))
+    assert not buffer.add(_doc(3))
@@ -0,0 +1,40 @@
+import threading
+
+import pytest
+
+from metrics import PASSWORD_HASH_DURATION, PASSWORD_HASH_QUEUE_DEPTH, PASSWORD_HASH_REJECTED
+from services.password_hasher import PasswordHasher, PasswordHasherBusy
+
+
+def test_hash_and_verify_are_timed():
+    hasher = PasswordHasher(rounds=4)
+    hashes, verifies = PASSWORD_HASH_DURATION.count(operation="hash"), PASSWORD_HASH_DURATION.count(operation="verify")
+
+    assert hasher.verify("secret", hasher.hash("secret"))
+
+    assert PASSWORD_HASH_DURATION.count(operation="hash") == hashes + 1
+    assert PASSWORD_HASH_DURATION.count(operation="verify") == verifies + 1
+    assert PASSWORD_HASH_QUEUE_DEPTH.value() == 0
+
+
+def test_full_queue_is_counted_as_rejected():
+    hasher = PasswordHasher(rounds=4, max_workers=1, max_pending=1, queue_timeout=0.05)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_hash():
+        started.set()
+        release.wait(5)
+
+    holder = threading.Thread(target=hasher._run, args=("hash", slow_hash))
+    holder.start()
+    try:
+        assert started.wait(5)
+        assert PASSWORD_HASH_QUEUE_DEPTH.value() == 1
+        rejected = PASSWORD_HASH_REJECTED.value()
+        with pytest.raises(PasswordHasherBusy):
+            hasher.hash("secret")
+        assert PASSWORD_HASH_REJECTED.value() == rejected + 1
+    finally:
+        release.set()
+        holder.join()
+    assert PASSWORD_HASH_QUEUE_DEPTH.value() == 0
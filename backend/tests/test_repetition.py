@@ -0,0 +1,33 @@
+import threading
+
+from repetition import RepetitionDetector
+
+TEXT = "the same reply about the weather and nothing else, over and over again"
+
+
+def test_concurrent_replies_share_one_window():
+    detector = RepetitionDetector(consecutive=3)
+    start = threading.Barrier(16)
+    results = []
+
+    def observe():
+        start.wait()
+        results.append(detector.observe("c1", TEXT, TEXT, lambda: [TEXT]))
+
+    threads = [threading.Thread(target=observe) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every reply extended the same run, and the conversation was reported exactly once
+    assert sorted(result.consecutive for result in results) == list(range(1, 17))
+    assert sum(1 for result in results if result.reason) == 1
+
+
+def test_reset_forgets_the_window():
+    detector = RepetitionDetector(consecutive=2)
+    detector.observe("c1", TEXT, TEXT, lambda: [TEXT])
+    detector.reset("c1")
+
+    assert detector.observe("c1", "hello", "something new entirely", lambda: ["hello"]).consecutive == 0
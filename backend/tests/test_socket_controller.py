@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+import pytest
+
+from controllers.socket_controller import SocketController, conversation_room
+
+
+class FakeTransport:
+    """Records what the controller sends instead of talking to a Socket.IO server"""
+
+    sid = "sid-1"
+
+    def __init__(self, user_id: str = "user-1"):
+        self.current_user = SimpleNamespace(is_authenticated=True, id=user_id, email="user@example.com")
+        self.emitted = []
+        self.rooms = set()
+
+    def auth_token(self):
+        return None
+
+    def login(self, user):
+        self.current_user = user
+
+    def emit(self, event, data, to=None):
+        self.emitted.append((event, data))
+
+    def emit_to_client(self, event, data, to, callback=None):
+        self.emitted.append((event, data))
+
+    def join_room(self, room):
+        self.rooms.add(room)
+
+    def leave_room(self, room):
+        self.rooms.discard(room)
+
+    def room_members(self, room):
+        return [self.sid] if room in self.rooms else []
+
+
+@pytest.mark.parametrize("handler", [
+    "handle_join_conversation", "handle_sync_conversation", "handle_leave_conversation",
+    "handle_trigger_next_llm", "handle_set_system_prompt",
+])
+@pytest.mark.parametrize("payload", [None, "conversation-1", ["conversation-1"]])
+def test_malformed_payload_is_reported_not_raised(handler, payload):
+    transport = FakeTransport()
+    controller = SocketController(conversation_service=None, user_service=None, transport=transport)
+
+    getattr(controller, handler)(payload)
+
+    assert transport.emitted[-1][0] == "error"
+    assert "Invalid payload" in transport.emitted[-1][1]["message"]
+
+
+def test_leave_conversation_leaves_the_room():
+    transport = FakeTransport()
+    transport.rooms.add(conversation_room("conversation-1"))
+    controller = SocketController(conversation_service=None, user_service=None, transport=transport)
+
+    controller.handle_leave_conversation({"conversation_id": "conversation-1"})
+
+    assert transport.rooms == set()
+    assert transport.emitted == []
@@ -0,0 +1,57 @@
+import socket
+import threading
+
+import socketio as socketio_client
+from flask import Flask
+from flask_socketio import SocketIO, join_room
+from werkzeug.serving import make_server
+
+from socketio_queue import socketio_queue_options, LOCAL_QUEUE_URL
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class _Worker:
+    """One worker: a Flask-SocketIO server on the shared in-process queue, served over HTTP"""
+
+    def __init__(self, channel: str):
+        self.app = Flask(__name__)
+        self.socketio = SocketIO(self.app, async_mode="threading", **socketio_queue_options(LOCAL_QUEUE_URL, channel))
+        self.socketio.on_event("join", lambda data: join_room(data["room"]))
+        self.port = _free_port()
+        self.server = make_server("127.0.0.1", self.port, self.app, threaded=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+
+def test_emit_on_one_worker_reaches_room_member_on_another():
+    worker_a = _Worker("test-socketio-queue")
+    worker_b = _Worker("test-socketio-queue")
+    received = []
+    arrived = threading.Event()
+    client = socketio_client.Client()
+
+    @client.on("message_update")
+    def on_message_update(data):
+        received.append(data)
+        arrived.set()
+
+    try:
+        client.connect(f"http://127.0.0.1:{worker_b.port}", transports=["polling"])
+        client.call("join", {"room": "conversation-1"}, timeout=5)
+
+        # Worker A has no clients of its own; the emit only reaches the room through the queue
+        worker_a.socketio.emit("message_update", {"content": "hello"}, to="conversation-1")
+
+        assert arrived.wait(5)
+        assert received == [{"content": "hello"}]
+    finally:
+        client.disconnect()
+        worker_a.stop()
+        worker_b.stop()
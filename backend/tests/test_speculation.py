@@ -0,0 +1,78 @@
+import threading
+from types import SimpleNamespace
+
+import mongomock
+
+from models import Conversation
+from repositories.conversation_repository import ConversationRepository
+from repositories.usage_repository import UsageRepository
+from services.conversation_service import ConversationService
+from services.usage_service import UsageService
+
+
+class _Provider:
+    """Stub LLM reporting 10 input and 5 output tokens per call; ``block_calls`` wait for ``release``"""
+
+    def __init__(self, block_calls=()):
+        self.calls = 0
+        self.block_calls = set(block_calls)
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, usage, **kwargs):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if call in self.block_calls:
+            self.release.wait(5)
+        usage.update(input_tokens=10, output_tokens=5)
+        return f"reply {call}"
+
+
+def _service(provider, speculation_ttl=300):
+    db = mongomock.MongoClient().db
+    repository = ConversationRepository(db)
+    conversation_id = repository.create_conversation(
+        Conversation(name="c", system_prompt="s", llm_participants=["claude"], user_id="user-1")
+    )
+    service = ConversationService(
+        repository, SimpleNamespace(get_api_key_decrypted=lambda user_id, llm_name: "key"),
+        usage_service=UsageService(UsageRepository(db)), llms={"claude": provider}, llm_streams={},
+        speculative_generation=True, speculation_ttl=speculation_ttl
+    )
+    return service, UsageRepository(db), conversation_id
+
+
+def _usage(usage_repository, conversation_id):
+    return usage_repository.conversations.find_one({"_id": conversation_id})["usage"]
+
+
+def test_discarded_speculation_is_billed_without_a_message():
+    provider = _Provider()
+    service, usage_repository, conversation_id = _service(provider)
+
+    assert service.trigger_next_llm(conversation_id, "user-1")[0]
+    service._speculations[conversation_id]["future"].result(5)
+    service.discard_speculation(conversation_id)
+
+    usage = _usage(usage_repository, conversation_id)
+    assert provider.calls == 2
+    assert usage["message_count"] == 1
+    assert usage["input_tokens"] == 20 and usage["output_tokens"] == 10
+
+
+def test_slow_speculation_falls_back_after_its_ttl():
+    # Call 2 is the speculation started after the first turn
+    provider = _Provider(block_calls={2})
+    service, usage_repository, conversation_id = _service(provider, speculation_ttl=0.2)
+
+    assert service.trigger_next_llm(conversation_id, "user-1")[0]
+    success, _, message = service.trigger_next_llm(conversation_id, "user-1")
+
+    assert success and message.content == "reply 3"
+    provider.release.set()
+    service._speculation_pool.shutdown(wait=True)
+    # Both saved replies plus the abandoned one; the speculation started after turn 2 is still unused
+    usage = _usage(usage_repository, conversation_id)
+    assert usage["message_count"] == 2
+    assert usage["input_tokens"] == 30
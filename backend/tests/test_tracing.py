@@ -0,0 +1,101 @@
+import json
+from types import SimpleNamespace
+
+import mongomock
+import pytest
+
+from controllers.socket_controller import SocketController
+from models import Conversation
+from repositories.conversation_repository import ConversationRepository
+from services.conversation_service import ConversationService
+from test_socket_controller import FakeTransport
+from tracing import FileSpanExporter, InMemorySpanExporter, Span, tracer
+
+
+@pytest.fixture
+def spans(monkeypatch):
+    exporter = InMemorySpanExporter()
+    monkeypatch.setattr(tracer, "exporter", exporter)
+    monkeypatch.setattr(tracer, "sample_rate", 1.0)
+    return exporter.spans
+
+
+def _trigger_turn(llm) -> FakeTransport:
+    """Run one trigger_next_llm socket event against mongomock with a stub provider"""
+    repository = ConversationRepository(mongomock.MongoClient().db)
+    conversation_id = repository.create_conversation(
+        Conversation(name="c", system_prompt="s", llm_participants=["claude"], user_id="user-1")
+    )
+    service = ConversationService(
+        repository, SimpleNamespace(get_api_key_decrypted=lambda user_id, llm_name: "key"),
+        llms={"claude": llm}, llm_streams={}
+    )
+    transport = FakeTransport()
+    SocketController(service, None, transport=transport).handle_trigger_next_llm({"conversation_id": conversation_id})
+    return transport
+
+
+def _children(spans, parent) -> list:
+    return [span.name for span in spans if span.parent_id == parent.span_id]
+
+
+def test_turn_spans_nest_under_the_socket_event(spans):
+    transport = _trigger_turn(lambda **kwargs: "hello")
+    assert transport.emitted[-1][0] == "message_update"
+
+    roots = [span for span in spans if span.parent_id is None]
+    assert [root.name for root in roots] == ["SocketController.handle_trigger_next_llm"]
+    root = roots[0]
+    assert {span.trace_id for span in spans} == {root.trace_id}
+
+    # Ownership check, then the service call
+    assert _children(spans, root) == [
+        "ConversationRepository.find_by_id", "ConversationService.trigger_next_llm", "ConversationRepository.find_by_id"
+    ]
+    service_span = next(span for span in spans if span.name == "ConversationService.trigger_next_llm")
+    assert _children(spans, service_span) == [
+        "ConversationRepository.find_by_id",
+        "ConversationRepository.get_messages",
+        "ConversationService.determine_next_llm",
+        "UserService.get_api_key_decrypted",
+        "ConversationService.prepare_chat_history",
+        "llm.claude",
+        "ConversationRepository.add_message",
+    ]
+    llm_span = next(span for span in spans if span.name == "llm.claude")
+    assert llm_span.attributes["provider"] == "claude" and llm_span.attributes["mode"] == "call"
+    db_spans = [span for span in spans if span.name.startswith("ConversationRepository.")]
+    assert all(span.attributes == {"component": "mongodb"} for span in db_spans)
+    # Children finish inside their parent
+    assert all(span.duration_ms <= service_span.duration_ms for span in spans if span.parent_id == service_span.span_id)
+
+
+def test_failing_llm_call_marks_its_span(spans):
+    def failing_llm(**kwargs):
+        raise RuntimeError("provider down")
+
+    transport = _trigger_turn(failing_llm)
+
+    assert transport.emitted[-1][0] == "error"
+    llm_span = next(span for span in spans if span.name == "llm.claude")
+    assert llm_span.status == "error" and llm_span.error == "RuntimeError: provider down"
+
+
+def test_unsampled_trace_exports_nothing(spans, monkeypatch):
+    monkeypatch.setattr(tracer, "sample_rate", 0.0)
+    _trigger_turn(lambda **kwargs: "hello")
+    assert spans == []
+
+
+def test_file_exporter_writes_queued_spans_on_shutdown(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = FileSpanExporter(str(path))
+    for index in range(3):
+        span = Span(f"span-{index}", "trace", None, {"index": index})
+        span.finish()
+        exporter.export(span)
+    exporter.shutdown()
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["name"] for line in lines] == ["span-0", "span-1", "span-2"]
+    assert exporter.dropped == 0
@@ -0,0 +1,289 @@
+"""
+Lightweight request tracing.
+
+A trace starts at an entry point (``tracer.start_trace``), e.g. a socket event,
+and every ``tracer.start_span`` opened while it is active becomes a child
+span. Spans opened with no active trace are free no-ops, so repository and
+service code can be instrumented unconditionally. Whether a trace is recorded
+is decided once at its root by the sample rate; finished spans go to the
+configured exporter.
+"""
+import atexit
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start_time', 'end_time',
+                 '_started_at', 'duration_ms', 'attributes', 'status', 'error')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_time = time.time()
+        self._started_at = time.perf_counter()
+        self.end_time: Optional[float] = None
+        self.duration_ms: Optional[float] = None
+        self.attributes = dict(attributes)
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def record_error(self, error: BaseException) -> None:
+        self.status = "error"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def finish(self) -> None:
+        self.end_time = time.time()
+        self.duration_ms = round((time.perf_counter() - self._started_at) * 1000, 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span when nothing is being recorded"""
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, **attributes) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+# Current span, or NOOP_SPAN inside an unsampled trace, or None outside any trace
+_current_span: contextvars.ContextVar[Optional[Any]] = contextvars.ContextVar('current_span', default=None)
+
+
+class SpanExporter:
+    """Receives finished spans; subclasses send them somewhere"""
+
+    def export(self, span: Span) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class ConsoleSpanExporter(SpanExporter):
+    """Logs each finished span as one JSON line"""
+
+    def export(self, span: Span) -> None:
+        logger.info(json.dumps(span.to_dict(), default=str))
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends finished spans to a JSON Lines file.
+
+    Like the log handlers in logging_config, ``export`` only puts the span on a
+    bounded queue; a writer thread serializes, writes and flushes in batches.
+    Spans are dropped (and counted) rather than blocking when the queue is full.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path: str, queue_size: int = 10000):
+        self.path = path
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._writer = threading.Thread(target=self._run, name="span-file-exporter", daemon=True)
+        self._writer.start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def shutdown(self) -> None:
+        """Write what is still queued and close the file"""
+        if not self._writer.is_alive():
+            return
+        self._queue.put(self._STOP)
+        self._writer.join()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = self._STOP in batch
+            lines = [json.dumps(span.to_dict(), default=str) + "\n" for span in batch if span is not self._STOP]
+            try:
+                self._file.writelines(lines)
+                self._file.flush()
+            except Exception as e:
+                logger.warning(f"Failed to write {len(lines)} spans to {self.path}: {e}")
+            if stop:
+                self._file.close()
+                return
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Keeps finished spans in a list, for tests"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+
+class Tracer:
+    def __init__(self, exporter: Optional[SpanExporter] = None, sample_rate: float = 0.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None and self.sample_rate > 0
+
+    @contextmanager
+    def start_trace(self, name: str, **attributes) -> Iterator[Any]:
+        """Open a root span; sampled traces are exported, others cost almost nothing"""
+        if _current_span.get() is not None:
+            # Already inside a trace (e.g. a controller called from another entry point)
+            with self.start_span(name, **attributes) as span:
+                yield span
+            return
+        sampled = self.enabled and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+        if not sampled:
+            token = _current_span.set(NOOP_SPAN)
+            try:
+                yield NOOP_SPAN
+            finally:
+                _current_span.reset(token)
+            return
+        with self._record(Span(name, os.urandom(16).hex(), None, attributes)) as span:
+            yield span
+
+    @contextmanager
+    def start_span(self, name: str, **attributes) -> Iterator[Any]:
+        """Open a child of the current span; a no-op outside a sampled trace"""
+        parent = _current_span.get()
+        if parent is None or parent is NOOP_SPAN:
+            yield NOOP_SPAN
+            return
+        with self._record(Span(name, parent.trace_id, parent.span_id, attributes)) as span:
+            yield span
+
+    @contextmanager
+    def _record(self, span: Span) -> Iterator[Span]:
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finish()
+            try:
+                self.exporter.export(span)
+            except Exception as e:
+                logger.warning(f"Failed to export span {span.name}: {e}")
+
+    def shutdown(self) -> None:
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+
+tracer = Tracer()
+_shutdown_registered = False
+
+def current_span() -> Any:
+    return _current_span.get() or NOOP_SPAN
+
+def configure_tracing(exporter: str = 'none', sample_rate: float = 0.0, file_path: str = 'traces.jsonl') -> Tracer:
+    """Point the module tracer at ``console``, ``file`` or ``none``"""
+    global _shutdown_registered
+    tracer.shutdown()
+    if exporter == 'console':
+        tracer.exporter = ConsoleSpanExporter()
+    elif exporter == 'file':
+        tracer.exporter = FileSpanExporter(file_path)
+    elif exporter == 'none':
+        tracer.exporter = None
+    else:
+        raise ValueError(f"Unknown trace exporter '{exporter}'")
+    tracer.sample_rate = sample_rate
+    if not _shutdown_registered:
+        # Drain what the file exporter still has queued when the worker exits
+        atexit.register(tracer.shutdown)
+        _shutdown_registered = True
+    return tracer
+
+
+def trace_repository(cls):
+    """Class decorator that opens a child span around every public repository method"""
+    repository = cls.__name__
+    for name, method in list(vars(cls).items()):
+        if name.startswith('_') or not inspect.isfunction(method):
+            continue
+        setattr(cls, name, _traced_method(f"{repository}.{name}", method))
+    return cls
+
+def _traced_method(span_name: str, method: Callable) -> Callable:
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return await method(*args, **kwargs)
+            with tracer.start_span(span_name, component="mongodb"):
+                return await method(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if _current_span.get() is None:
+            return method(*args, **kwargs)
+        with tracer.start_span(span_name, component="mongodb"):
+            return method(*args, **kwargs)
+    return wrapper
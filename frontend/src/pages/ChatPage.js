@@ -57,6 +57,7 @@ const ChatPage = () => {
     const [mobileOpen, setMobileOpen] = useState(false);
     
     const socket = useRef(null);
+    const messagesRef = useRef([]);
     const theme = useTheme();
     const colorMode = React.useContext(ColorModeContext);
 
@@ -119,6 +120,10 @@ const ChatPage = () => {
         }
     }, [paramConvId, fetchConversationDetails]);
 
+    useEffect(() => {
+        messagesRef.current = messages;
+    }, [messages]);
+
     useEffect(() => {
         socket.current = getAuthenticatedSocket();
 
@@ -129,14 +134,53 @@ const ChatPage = () => {
 
         const handleMessageUpdate = (newMessage) => {
             if (currentConversation && newMessage.conversation_id === currentConversation.id) {
-                setMessages((prevMessages) => [...prevMessages, newMessage]);
+                // Replace the streamed draft of this message, if there is one
+                setMessages((prevMessages) => {
+                    const index = prevMessages.findIndex(msg => msg.id === newMessage.id);
+                    if (index === -1) return [...prevMessages, newMessage];
+                    const updated = [...prevMessages];
+                    updated[index] = newMessage;
+                    return updated;
+                });
             }
         };
 
+        const handleMessageDelta = (frame, ack) => {
+            // Acks let the server slow down or pause streaming when we fall behind
+            if (typeof ack === 'function') ack();
+            if (!currentConversation || frame.conversation_id !== currentConversation.id) return;
+            setMessages((prevMessages) => {
+                const index = prevMessages.findIndex(msg => msg.id === frame.message_id);
+                if (index === -1) {
+                    return [...prevMessages, {
+                        id: frame.message_id,
+                        conversation_id: frame.conversation_id,
+                        sender_type: 'llm',
+                        sender_id: frame.llm_name,
+                        llm_name: frame.llm_name,
+                        content: frame.delta,
+                        created_at: new Date().toISOString(),
+                        streaming: true
+                    }];
+                }
+                if (!prevMessages[index].streaming) return prevMessages;
+                const updated = [...prevMessages];
+                updated[index] = { ...updated[index], content: updated[index].content + frame.delta };
+                return updated;
+            });
+        };
+
         const handleSystemPromptUpdated = (data) => {
             if (currentConversation && data.conversation_id === currentConversation.id && data.prompt !== undefined) { 
                 setSystemPrompt(data.prompt);
-                setCurrentConversation(prev => (prev ? {...prev, system_prompt: data.prompt} : null));
+                // A new prompt also lifts a repetition flag or halt
+                setCurrentConversation(prev => (prev ? {...prev, system_prompt: data.prompt, flagged_reason: null, halted_reason: null} : null));
+            }
+        };
+
+        const handleConversationHalted = (data) => {
+            if (currentConversation && data.conversation_id === currentConversation.id) {
+                setCurrentConversation(prev => (prev ? {...prev, halted_reason: data.reason} : null));
             }
         };
 
@@ -148,15 +192,70 @@ const ChatPage = () => {
             }
         };
 
+        const handleConversationSync = (data) => {
+            if (!currentConversation || data.id !== currentConversation.id) return;
+            setMessages((prevMessages) => {
+                // A sync without 'since' carries the whole conversation
+                const base = data.since ? prevMessages.filter(msg => !msg.streaming) : [];
+                const seen = new Set(base.map(msg => msg.id));
+                const merged = [...base, ...(data.messages || []).filter(msg => !seen.has(msg.id))];
+                if (data.partial && !merged.some(msg => msg.id === data.partial.id)) {
+                    merged.push({
+                        ...data.partial,
+                        sender_type: 'llm',
+                        sender_id: data.partial.llm_name,
+                        created_at: new Date().toISOString(),
+                        streaming: true
+                    });
+                }
+                return merged;
+            });
+            if (data.system_prompt !== undefined) {
+                setSystemPrompt(data.system_prompt);
+            }
+        };
+
+        // Updates are only sent to the conversation's room. Rooms are lost on reconnect,
+        // so after one we rejoin and ask only for the messages we missed.
+        const conversationId = currentConversation?.id;
+        const joinConversation = () => {
+            if (conversationId) {
+                socket.current.emit('join_conversation', { conversation_id: conversationId });
+            }
+        };
+        const syncConversation = () => {
+            if (conversationId) {
+                const lastSaved = [...messagesRef.current].reverse().find(msg => !msg.streaming);
+                socket.current.emit('sync_conversation', {
+                    conversation_id: conversationId,
+                    last_message_id: lastSaved?.id
+                });
+            }
+        };
+
         socket.current.on('message_update', handleMessageUpdate);
+        socket.current.on('message_delta', handleMessageDelta);
         socket.current.on('system_prompt_updated', handleSystemPromptUpdated);
+        socket.current.on('conversation_halted', handleConversationHalted);
         socket.current.on('error', handleError);
+        socket.current.on('conversation_sync', handleConversationSync);
+        socket.current.on('connect', syncConversation);
+        if (socket.current.connected) {
+            joinConversation();
+        }
 
         return () => {
             if (socket.current) {
                 socket.current.off('message_update', handleMessageUpdate);
+                socket.current.off('message_delta', handleMessageDelta);
                 socket.current.off('system_prompt_updated', handleSystemPromptUpdated);
+                socket.current.off('conversation_halted', handleConversationHalted);
                 socket.current.off('error', handleError);
+                socket.current.off('conversation_sync', handleConversationSync);
+                socket.current.off('connect', syncConversation);
+                if (conversationId) {
+                    socket.current.emit('leave_conversation', { conversation_id: conversationId });
+                }
             }
         };
     }, [currentConversation, navigate]);
@@ -339,13 +438,18 @@ const ChatPage = () => {
                 {currentConversation ? (
                     <Paper elevation={0} sx={{ flexGrow: 1, display: 'flex', flexDirection: 'column', height: 'calc(100vh - 64px - 48px)', p:0}}>
                         <ChatView messages={messages} currentUser="auditor" />
+                        {currentConversation.halted_reason && (
+                            <Alert severity="warning" sx={{ mx: 2 }}>
+                                Conversation halted ({currentConversation.halted_reason}). Change the system prompt to resume.
+                            </Alert>
+                        )}
                         <Box sx={{ p: 2, borderTop: '1px solid divider', display: 'flex', justifyContent: 'flex-end', alignItems: 'center' }}>
                             <Button 
                                 variant="contained" 
                                 onClick={handleTriggerNextLLM}
                                 startIcon={<PlayArrowIcon />}
                                 sx={{mr: 2}}
-                                disabled={loading || !currentConversation?.llm_participants?.length}
+                                disabled={loading || !currentConversation?.llm_participants?.length || !!currentConversation?.halted_reason}
                             >
                                 Next LLM
                             </Button>
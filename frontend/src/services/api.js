@@ -35,7 +35,12 @@ apiClient.interceptors.response.use(
 
 export const createConversation = (data) => apiClient.post('/conversations', data);
 export const getConversations = () => apiClient.get('/conversations');
-export const getConversationDetails = (conversationId) => apiClient.get(`/conversations/${conversationId}`);
+// Pass the last message id you have as `since` to get only newer messages
+export const getConversationDetails = (conversationId, since) =>
+    apiClient.get(`/conversations/${conversationId}`, { params: since ? { since } : {} });
 export const deleteConversation = (conversationId) => apiClient.delete(`/conversations/${conversationId}`);
+export const forkConversation = (conversationId, messageId, overrides = {}) =>
+    apiClient.post(`/conversations/${conversationId}/fork`, { message_id: messageId, ...overrides });
+export const getUsage = (days) => apiClient.get('/usage', { params: days ? { days } : {} });
 
 export default apiClient; 
\ No newline at end of file
@@ -2,6 +2,8 @@ import io from 'socket.io-client';
 import authService from './authService';
 
 const SOCKET_URL = process.env.REACT_APP_SOCKET_URL || 'http://localhost:5001';
+// Multi-worker backends without sticky sessions need 'websocket' only (see DEPLOYMENT.md)
+const SOCKET_TRANSPORTS = (process.env.REACT_APP_SOCKET_TRANSPORTS || 'websocket,polling').split(',');
 
 let socket;
 
@@ -25,7 +27,7 @@ export const getSocket = () => {
         token: accessToken
       },
       autoConnect: true,
-      transports: ['websocket', 'polling']
+      transports: SOCKET_TRANSPORTS
     });
 
     socket.on('connect', () => {